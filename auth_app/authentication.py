@@ -8,6 +8,28 @@ User = get_user_model()
 
 class CookieJWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
+        token = self.read_token(request)
+        if token is None:
+            return None
+        user_id, validated_token = token
+        try:
+            return User.objects.get(id=user_id), validated_token
+        except Exception as e:
+            raise NotAuthenticated(f'Invalid token: {e}')
+
+    async def aauthenticate(self, request):
+        # authenticate() for async views, with the department loaded for role scoping
+        token = self.read_token(request)
+        if token is None:
+            return None
+        user_id, validated_token = token
+        try:
+            return await User.objects.select_related('department').aget(id=user_id), validated_token
+        except Exception as e:
+            raise NotAuthenticated(f'Invalid token: {e}')
+
+    def read_token(self, request):
+        """(user id, validated token) of the access token cookie, None without one."""
         cookie_name = getattr(settings, 'SIMPLE_JWT', {}).get('AUTH_COOKIE', None)
         if cookie_name is None:
             raise NotAuthenticated('No AUTH_COOKIE defined.')
@@ -18,8 +40,6 @@ class CookieJWTAuthentication(BaseAuthentication):
 
         try:
             validated_token = AccessToken(raw_token)
-            user_id = validated_token['user_id']
-            user = User.objects.get(id=user_id)
-            return user, validated_token
+            return validated_token['user_id'], validated_token
         except Exception as e:
             raise NotAuthenticated(f'Invalid token: {e}')
@@ -1,7 +1,11 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import NotAuthenticated
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from auth_app.authentication import CookieJWTAuthentication
 from auth_app.models import CustomUser
 from complaints.models import Department
 from auth_app.serializers import UserSerializer
@@ -184,4 +188,31 @@ class AuthViewsTest(TestCase):
         # self.client.force_authenticate(user=self.staff_user)
         # url = reverse('user-list')
         # response = self.client.get(url, format='json')
-        # self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN
\ No newline at end of file
+        # self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN
+class CookieJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="user@example.com", username="user@example.com", password="password123",
+            department=Department.objects.create(department_code="ITS", department_name="IT"),
+        )
+
+    def request(self, token=None):
+        request = RequestFactory().get('/')
+        if token is not None:
+            request.COOKIES['access_token'] = token
+        return request
+
+    def test_sync_and_async_agree(self):
+        authentication = CookieJWTAuthentication()
+        token = str(AccessToken.for_user(self.user))
+        for method in (authentication.authenticate, async_to_sync(authentication.aauthenticate)):
+            self.assertIsNone(method(self.request()))
+            user, validated_token = method(self.request(token))
+            self.assertEqual((user, str(validated_token)), (self.user, token))
+            with self.assertRaises(NotAuthenticated):
+                method(self.request('not-a-token'))
+
+        self.user.delete()
+        for method in (authentication.authenticate, async_to_sync(authentication.aauthenticate)):
+            with self.assertRaises(NotAuthenticated):
+                method(self.request(token))
@@ -1,3 +1,4 @@
+import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -10,8 +11,10 @@ from django.contrib.auth import get_user_model # Import get_user_model
 from .permissions import IsMasterAdminOrDeptAdmin
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from complaintsystem.instrumentation import TimedSerializerMixin
 
 User = get_user_model() # Get the custom user model
+logger = logging.getLogger(__name__)
 
 class CookieTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
@@ -66,14 +69,15 @@ class UserDetailView(APIView):
     def get(self, request):
         return Response(UserSerializer(request.user).data)
 
-class DepartmentStaffListView(generics.ListAPIView):
+class DepartmentStaffListView(TimedSerializerMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     queryset = User.objects.all() # Define a base queryset
     permission_classes = [IsAuthenticated, IsMasterAdminOrDeptAdmin]
 
     def get_queryset(self):
         department_name = self.kwargs['department_name']
-        print(f"DEBUG: Filtering for department: {department_name}")
         queryset = User.objects.filter(department__department_name__iexact=department_name, role='staff')
-        print(f"DEBUG: Queryset count: {queryset.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # count() is an extra query, only run it when it is going to be logged
+            logger.debug("Staff for department %s: %d", department_name, queryset.count())
         return queryset
@@ -12,6 +12,7 @@ class RoomAdmin(admin.ModelAdmin):
 class ComplaintImageInline(admin.TabularInline):
     model = ComplaintImage
     extra = 1
+    readonly_fields = ('thumbnail_small', 'thumbnail_medium')
 
 @admin.register(Complaint)
 class ComplaintAdmin(admin.ModelAdmin):
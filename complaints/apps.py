@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ComplaintsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'complaints'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from complaintsystem import instrumentation, slow_queries
+        instrumentation.install()
+        slow_queries.install()
@@ -0,0 +1,155 @@
+"""Async variants of the dashboard read endpoints, served under /api/async/.
+
+The complaint list, the department report stats and the TAT report poll the
+database for seconds at a time on a large hospital. Under ASGI these views wait
+for the database without holding a worker thread, so a dashboard that polls
+during morning rounds can't starve the pool that serves the QR submissions.
+Filtering, role scoping and the response bodies are the same as the DRF views:
+the querysets are built by the same filter backends and complaints.reports,
+and the reports share the response cache of complaints.report_cache.
+
+Under WSGI they still work, Django runs them in an event loop per request.
+"""
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from auth_app.authentication import CookieJWTAuthentication
+from .models import Complaint
+from .pagination import CustomLimitOffsetPagination
+from .report_cache import acached_report
+from .reports import (
+    AVERAGE_TAT, department_stats, filter_tat, format_timedelta, resolved_tickets, scope_to_user, tat_error,
+    tat_filters_applied,
+)
+from .serializers import ComplaintSerializer, TATserializer
+from .views import ComplaintViewSet
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def authenticate(request):
+    """The DRF request of an authenticated user, or a 401 response."""
+    try:
+        user_auth = await CookieJWTAuthentication().aauthenticate(request)
+    except NotAuthenticated as e:
+        return None, json_response({'detail': str(e)}, status=401)
+    if user_auth is None:
+        return None, json_response({'detail': NotAuthenticated.default_detail}, status=401)
+    # Query params, absolute URLs and the user, as the DRF filters and serializers expect them
+    drf_request = Request(request)
+    drf_request.user, drf_request.auth = user_auth
+    return drf_request, None
+
+
+async def paginate(paginator, queryset, request):
+    """LimitOffsetPagination.paginate_queryset() with the async ORM."""
+    paginator.request = request
+    paginator.limit = paginator.get_limit(request)
+    if paginator.limit is None:
+        return None
+    paginator.offset = paginator.get_offset(request)
+    paginator.count = await queryset.acount()
+    if paginator.count == 0 or paginator.offset > paginator.count:
+        return []
+    return [obj async for obj in queryset[paginator.offset:paginator.offset + paginator.limit]]
+
+
+def paginated_data(paginator, results):
+    return {
+        'count': paginator.count,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': results,
+    }
+
+
+@require_GET
+async def complaint_list(request):
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+
+    # The list endpoint's own filter backends (filterset, search, ordering) and role scoping
+    view = ComplaintViewSet(request=drf_request, action='list', format_kwarg=None, args=(), kwargs={})
+    try:
+        queryset = view.filter_queryset(view.get_queryset())
+    except ValidationError as e:
+        return json_response(e.detail, status=400)
+    # Everything the serializer touches is fetched up front, lazy loading isn't allowed here
+    queryset = queryset.select_related(
+        'room', 'assigned_department', 'assigned_staff',
+    ).prefetch_related('images')
+
+    paginator = CustomLimitOffsetPagination()
+    page = await paginate(paginator, queryset, drf_request)
+    context = {'request': drf_request}
+    if page is None:
+        complaints = [complaint async for complaint in queryset]
+        return json_response(ComplaintSerializer(complaints, many=True, context=context).data)
+    return json_response(paginated_data(paginator, ComplaintSerializer(page, many=True, context=context).data))
+
+
+@require_GET
+async def all_department_stats(request):
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+    return await acached_report(drf_request, 'all_department_stats', lambda: department_stats_response(drf_request))
+
+
+async def department_stats_response(drf_request):
+    queryset = scope_to_user(Complaint.objects.all(), drf_request.user)
+    try:
+        stats, filters_applied = department_stats(queryset, drf_request.query_params)
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+
+    if not await stats.aexists():
+        return json_response({
+            'message': 'No data found for the specified filters',
+            'filters_applied': filters_applied
+        })
+
+    paginator = CustomLimitOffsetPagination()
+    page = await paginate(paginator, stats, drf_request)
+    if page is None:
+        return json_response([row async for row in stats])
+    return json_response(paginated_data(paginator, page))
+
+
+@require_GET
+async def all_department_TATS(request):
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+    return await acached_report(drf_request, 'all_department_TATS', lambda: tat_response(drf_request))
+
+
+async def tat_response(drf_request):
+    queryset = scope_to_user(Complaint.objects.select_related('assigned_department').all(), drf_request.user)
+    try:
+        queryset = filter_tat(queryset, drf_request.query_params)
+    except ValueError as e:
+        return json_response(tat_error(str(e)), status=400)
+
+    avg_tat = (await resolved_tickets(queryset).aaggregate(avg_tat=AVERAGE_TAT))['avg_tat']
+    total_tickets = await queryset.acount()
+
+    response_data = {
+        'total_tickets': total_tickets,
+        'average_tat': format_timedelta(avg_tat) if avg_tat else '-',
+        'filters_applied': tat_filters_applied(drf_request.query_params),
+    }
+    paginator = CustomLimitOffsetPagination()
+    page = await paginate(paginator, queryset, drf_request)
+    if page is None:
+        tickets = [ticket async for ticket in queryset]
+        response_data['results'] = TATserializer(tickets, many=True).data
+        return json_response(response_data)
+    response_data.update(paginated_data(paginator, TATserializer(page, many=True).data))
+    return json_response(response_data)
@@ -0,0 +1,259 @@
+"""Endpoint benchmarks, run with ``manage.py run_benchmarks``.
+
+``seed_dataset`` bulk-inserts a deterministic dataset of any size, and
+``run_benchmarks`` times each scenario through the full middleware/DRF stack
+with the test client, counting its queries. The results are plain dicts so they
+can be saved as a JSON baseline and checked with ``compare``.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Complaint, Department, Issue_Category, Room
+from .bulk_writes import bulk_write
+from .generations import NAMESPACES
+from .seeding import explicit_submitted_at
+
+DEPARTMENTS = [
+    ('NUR', 'Nursing Department'),
+    ('MAI', 'Maintenance'),
+    ('HOU', 'Housekeeping'),
+    ('IT', 'IT Support'),
+    ('PHA', 'Pharmacy'),
+    ('LAB', 'Laboratory'),
+]
+ISSUE_NAMES = [
+    "Broken Bed", "Leaky Faucet", "Clogged Toilet", "HVAC Malfunction",
+    "Light Out", "Power Outage", "Network Down", "Software Glitch",
+    "Printer Jam", "Dirty Room", "Biohazard Spill", "Trash Overflow",
+    "Pest Sighting", "Missing Supplies", "Equipment Malfunction", "Patient Fall Hazard",
+    "Noise Complaint", "Temperature Issue", "Water Leak", "Security Concern",
+]
+WARDS = ['General Ward', 'Pediatrics', 'Cardiology', 'Oncology', 'Maternity']
+ROOM_TYPES = ['Single', 'Double', 'ICU', 'ER', 'OR']
+BLOCKS = ['A', 'B', 'C']
+DESCRIPTION_WORDS = [
+    'leak', 'broken', 'noise', 'dirty', 'cold', 'hot', 'light', 'door', 'window', 'bed',
+    'water', 'smell', 'urgent', 'patient', 'nurse', 'call', 'button', 'power', 'network', 'spill',
+]
+# status -> weight, most tickets in a real system are finished
+STATUS_WEIGHTS = {'open': 15, 'in_progress': 10, 'on_hold': 5, 'resolved': 40, 'closed': 30}
+PRIORITIES = ['low', 'medium', 'high']
+
+BENCHMARK_ADMIN = 'benchmark_admin'
+BENCHMARK_DEPT_ADMIN = 'benchmark_dept_admin'
+
+
+def seed_dataset(rooms=10000, complaints=1000000, seed=0, batch_size=5000, log=None):
+    """Insert departments, issue categories, rooms, two users and complaints.
+
+    Rooms are inserted without rendering their QR codes, which only the room
+    endpoints need and which would dominate the seeding time.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    with bulk_write(*NAMESPACES) as write:
+        departments = Department.objects.bulk_create(
+            [Department(department_code=code, department_name=name, status='active') for code, name in DEPARTMENTS]
+        )
+        categories = Issue_Category.objects.bulk_create([
+            Issue_Category(
+                issue_category_code=f'ISC{i + 1:03d}', issue_category_name=name,
+                department=departments[i % len(departments)], status='active',
+            )
+            for i, name in enumerate(ISSUE_NAMES)
+        ])
+
+        User = get_user_model()
+        User.objects.create_superuser(email='benchmark_admin@example.com', username=BENCHMARK_ADMIN)
+        User.objects.create_user(
+            email='benchmark_dept_admin@example.com', username=BENCHMARK_DEPT_ADMIN,
+            role='dept_admin', department=departments[0],
+        )
+
+        room_ids = []
+        for start in range(0, rooms, batch_size):
+            batch = [
+                Room(
+                    room_no=str(100 + i // 2), bed_no=f'B{i % 2 + 1}', Block=rng.choice(BLOCKS),
+                    Floor_no=rng.randint(1, 10), ward=rng.choice(WARDS), speciality='General',
+                    room_type=rng.choice(ROOM_TYPES), status='active',
+                )
+                for i in range(start, min(start + batch_size, rooms))
+            ]
+            room_ids.extend(room.pk for room in Room.objects.bulk_create(batch))
+        if not room_ids[:1] or room_ids[0] is None:
+            # Backends without RETURNING on bulk inserts
+            room_ids = list(Room.objects.values_list('pk', flat=True))
+        if log:
+            log(f'Seeded {len(room_ids)} rooms.')
+
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        with explicit_submitted_at():
+            for start in range(0, complaints, batch_size):
+                batch = []
+                for i in range(start, min(start + batch_size, complaints)):
+                    category = rng.choice(categories)
+                    complaint_status = rng.choices(statuses, weights)[0]
+                    submitted_at = now - timedelta(minutes=rng.randint(60, 365 * 24 * 60))
+                    resolved_at = None
+                    if complaint_status in ('resolved', 'closed'):
+                        resolved_at = submitted_at + timedelta(minutes=rng.randint(5, 7 * 24 * 60))
+                    batch.append(Complaint(
+                        ticket_id=f'BEN{i:09d}',
+                        room_id=rng.choice(room_ids),
+                        issue_type=category.issue_category_name,
+                        description=' '.join(rng.choices(DESCRIPTION_WORDS, k=8)),
+                        priority=rng.choice(PRIORITIES),
+                        status=complaint_status,
+                        assigned_department_id=category.department_id,
+                        submitted_at=submitted_at,
+                        resolved_at=resolved_at,
+                    ))
+                with transaction.atomic():
+                    Complaint.objects.bulk_create(batch)
+                    write.record_events(batch, 'created')
+                if log and (start // batch_size) % 20 == 19:
+                    log(f'Seeded {start + len(batch)} complaints...')
+    if log:
+        log(f'Seeded {complaints} complaints.')
+
+
+class Scenario:
+    def __init__(self, name, path, method='get', user=BENCHMARK_ADMIN, data=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.user = user
+        # Callable returning the request body of the i-th run
+        self.data = data
+
+
+def default_scenarios(runs):
+    """The list, search, filter, report, TAT and create endpoints."""
+    department = Department.objects.order_by('department_code').first()
+    category = Issue_Category.objects.filter(department=department).first()
+
+    # Fresh rooms for the create runs, the serializer refuses a second open
+    # complaint of the same type in the same room
+    create_rooms = Room.objects.bulk_create([
+        Room(room_no=f'BM{i}', bed_no='B1', Block='Z', Floor_no=0, ward='Benchmark',
+             speciality='General', room_type='Single', status='active')
+        for i in range(runs)
+    ])
+    if create_rooms and create_rooms[0].pk is None:
+        create_rooms = list(Room.objects.filter(ward='Benchmark').order_by('pk'))
+
+    def complaint_data(i):
+        return {
+            'room': create_rooms[i].pk, 'issue_type': category.issue_category_name,
+            'description': 'Benchmark complaint', 'priority': 'medium',
+        }
+
+    return [
+        Scenario('complaint_list', '/api/complaints/'),
+        Scenario('complaint_list_dept_admin', '/api/complaints/', user=BENCHMARK_DEPT_ADMIN),
+        Scenario('complaint_list_deep_offset', '/api/complaints/?' + urlencode({'offset': 5000, 'limit': 50})),
+        Scenario('complaint_search', '/api/complaints/?' + urlencode({'search': 'leak'})),
+        Scenario('complaint_filter', '/api/complaints/?' + urlencode({
+            'status': 'open', 'priority': 'high', 'ward': 'Cardiology',
+        })),
+        Scenario('complaint_filter_department', '/api/complaints/?' + urlencode({
+            'assigned_department': department.department_name, 'ordering': '-priority',
+        })),
+        Scenario('report_all_department_stats', '/api/report/all_department_stats/'),
+        Scenario('report_department_priority_stats', '/api/report/department_priority_stats/?' + urlencode({
+            'department': department.department_code, 'priority': 'high',
+        })),
+        Scenario('tat_all_departments', '/api/TATView/all_department_TATS/'),
+        Scenario('tat_all_departments_dept_admin', '/api/TATView/all_department_TATS/', user=BENCHMARK_DEPT_ADMIN),
+        Scenario('complaint_create', '/api/complaints/', method='post', user=None, data=complaint_data),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(scenario, iterations, warmup):
+    client = APIClient()
+    if scenario.user:
+        client.force_authenticate(user=get_user_model().objects.get(username=scenario.user))
+
+    timings = []
+    queries = 0
+    for i in range(warmup + iterations):
+        kwargs = {'format': 'json'}
+        if scenario.data:
+            kwargs['data'] = scenario.data(i)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(scenario.path, **kwargs)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: {scenario.method.upper()} {scenario.path} returned {response.status_code}')
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured))
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': queries,
+    }
+
+
+def run_benchmarks(iterations=20, warmup=3, only=None, log=None):
+    results = {}
+    # Rolled back at the end, so the created complaints don't skew the next run
+    with transaction.atomic():
+        for scenario in default_scenarios(warmup + iterations):
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = run_scenario(scenario, iterations, warmup)
+            if log:
+                log(scenario.name, results[scenario.name])
+        transaction.set_rollback(True)
+    return {
+        'dataset': {
+            'rooms': Room.objects.count(),
+            'complaints': Complaint.objects.count(),
+            'vendor': connection.vendor,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Regressions of current against baseline as a list of messages.
+
+    Latency regresses when the p50 is more than ``tolerance`` slower, query
+    counts regress on any increase since they don't depend on the machine.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {previous['queries']}")
+        if result['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']} ms, baseline {previous['p50_ms']} ms "
+                f"(+{(result['p50_ms'] / previous['p50_ms'] - 1) * 100:.0f}%)"
+            )
+    return regressions
@@ -0,0 +1,40 @@
+"""Bulk writes that keep the caches and the changes feed in step.
+
+QuerySet.update(), bulk_create(), bulk_update() and raw SQL bypass the model
+signals (complaints.signals) that bump the cache generations and record the
+complaint events. Make such writes inside bulk_write(): it bumps the namespaces
+when the block ends, those given up front and those added with wrote() for
+writes that may change nothing, and its record_events() records the events of
+the complaints written.
+"""
+from contextlib import contextmanager
+
+from .events import record_events
+from .generations import bump
+
+
+class BulkWrite:
+    def __init__(self, namespaces):
+        self.namespaces = set(namespaces)
+
+    def wrote(self, *namespaces):
+        self.namespaces.update(namespaces)
+
+    def record_events(self, complaints, event_type):
+        self.wrote('complaints')
+        return record_events(complaints, event_type)
+
+
+@contextmanager
+def bulk_write(*namespaces):
+    """Bump the cache generations of the namespaces written in the block.
+
+    The bump waits for the block's transaction, if any, to commit. Without one it
+    also follows a block that fails halfway, the writes made until then stay.
+    """
+    write = BulkWrite(namespaces)
+    try:
+        yield write
+    finally:
+        if write.namespaces:
+            bump(*sorted(write.namespaces))
@@ -0,0 +1,35 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+def required_directories():
+    """Static and media directories the project expects on disk."""
+    media_root = str(settings.MEDIA_ROOT)
+    return [str(path) for path in settings.STATICFILES_DIRS] + [
+        media_root,
+        os.path.join(media_root, 'complaint_images'),
+    ]
+
+
+@register(Tags.files)
+def check_directories(app_configs, **kwargs):
+    # Run by manage.py (runserver, migrate, check ...) instead of on every import of the settings
+    errors = []
+    for path in required_directories():
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            errors.append(Error(
+                f'Could not create the directory {path}: {e}',
+                hint='Create it, or point MEDIA_ROOT/STATICFILES_DIRS at a writable location.',
+                id='complaints.E001',
+            ))
+            continue
+        if not os.access(path, os.W_OK):
+            errors.append(Error(
+                f'The directory {path} is not writable.',
+                id='complaints.E002',
+            ))
+    return errors
@@ -0,0 +1,184 @@
+"""Bulk removal of the sample data, used by clear_data --fast and populate_realistic_data.
+
+Deleting through the ORM loads every row into the collector and never removes
+the files of FileFields. Here the tables are truncated (or deleted in chunks of
+raw SQL where TRUNCATE isn't available) and the media directories of their file
+fields are removed as a whole. No deletion events are recorded either: the
+complaint events go too, and a new epoch sends the delta sync clients back to a
+full reload (complaints.events).
+"""
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from .bulk_writes import bulk_write
+from .events import start_epoch
+from .models import Complaint, ComplaintEvent, ComplaintImage, Department, Issue_Category, MediaBlob, Room
+from .generations import NAMESPACES
+
+SAMPLE_MODELS = [Department, Issue_Category, Room, Complaint, ComplaintImage, MediaBlob]
+
+
+def clear_order(models_to_clear):
+    """The models plus everything that cascades from them, children first.
+
+    Nullable references from other models (e.g. a user's department) are
+    returned separately, as (model, field name, referenced model) to set to NULL.
+    """
+    ordered = []
+    set_null = []
+
+    def visit(model, path):
+        if model in ordered:
+            return
+        if model in path:
+            raise ValueError(f'Circular cascade through {model.__name__}')
+        for relation in model._meta.related_objects:
+            if relation.many_to_many:
+                visit(relation.through, path + [model])
+            elif relation.on_delete is models.CASCADE:
+                visit(relation.related_model, path + [model])
+            elif relation.related_model not in models_to_clear:
+                if relation.on_delete is not models.SET_NULL:
+                    raise ValueError(
+                        f'{relation.related_model.__name__}.{relation.field.name} prevents clearing {model.__name__}'
+                    )
+                set_null.append((relation.related_model, relation.field.name, model))
+        ordered.append(model)
+
+    for model in models_to_clear:
+        visit(model, [])
+    return ordered, set_null
+
+
+def truncate(models_to_clear, reset_sequences=True, log=None):
+    """Empty the tables with TRUNCATE, returns False where the backend can't."""
+    if connection.vendor == 'sqlite' or not models_to_clear:
+        return False
+    tables = [model._meta.db_table for model in models_to_clear]
+    try:
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sql_flush(no_style(), tables, reset_sequences=reset_sequences):
+                cursor.execute(sql)
+    except DatabaseError as e:
+        if log:
+            log(f'TRUNCATE failed ({e}), deleting in chunks.')
+        return False
+    if log:
+        log(f"Truncated {', '.join(tables)}.")
+    return True
+
+
+def delete_in_chunks(models_to_clear, batch_size=10000, log=None):
+    """Empty the tables (in the given, children first, order) with short raw DELETEs."""
+    quote = connection.ops.quote_name
+    for model in models_to_clear:
+        table = quote(model._meta.db_table)
+        pk = quote(model._meta.pk.column)
+        # The derived table lets MySQL use LIMIT in the subquery as well
+        sql = (
+            f'DELETE FROM {table} WHERE {pk} IN '
+            f'(SELECT {pk} FROM (SELECT {pk} FROM {table} LIMIT %s) chunk)'
+        )
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [batch_size])
+                    count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                break
+        if log:
+            log(f'Deleted {deleted} rows from {model._meta.db_table}.')
+
+
+def media_directories(models_to_clear):
+    """Directories (relative to MEDIA_ROOT) the file fields of the models upload to."""
+    directories = set()
+    for model in models_to_clear:
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, FileSystemStorage):
+                if isinstance(field.upload_to, str) and field.upload_to.strip('/'):
+                    directories.add((field.storage.location, field.upload_to.strip('/').split('/')[0]))
+    return sorted(directories)
+
+
+def remove_media(directories, workers=8, log=None):
+    """Move each directory aside (so new uploads land in a fresh one) and remove it in parallel."""
+    trash = []
+    for location, directory in directories:
+        path = os.path.join(location, directory)
+        if not os.path.isdir(path):
+            continue
+        aside = os.path.join(location, f'.{directory}-deleted-{timezone.now():%Y%m%d%H%M%S%f}')
+        os.rename(path, aside)
+        os.makedirs(path, exist_ok=True)
+        trash.append(aside)
+
+    # One task per subdirectory: content-addressed storage shards the files into many
+    tasks = []
+    for aside in trash:
+        with os.scandir(aside) as entries:
+            tasks.extend(entry.path for entry in entries)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(_remove, tasks))
+    for aside in trash:
+        shutil.rmtree(aside, ignore_errors=True)
+    if log and trash:
+        log(f"Removed media directories {', '.join(directory for _, directory in directories)}.")
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+def clear_sample_data(batch_size=10000, workers=8, log=None):
+    """Remove the departments, categories, rooms, complaints, images and their files,
+    the complaint events, and all users except the superusers. Returns the seconds spent per step."""
+    User = get_user_model()
+    ordered, set_null = clear_order(SAMPLE_MODELS)
+    timings = {}
+
+    with bulk_write(*NAMESPACES):
+        started = time.monotonic()
+        for model, field_name, _ in set_null:
+            model._base_manager.filter(**{f'{field_name}__isnull': False}).update(**{field_name: None})
+        timings['references'] = time.monotonic() - started
+
+        started = time.monotonic()
+        # PostgreSQL refuses to truncate a table other tables (like the users) still reference
+        referenced = {target for _, _, target in set_null}
+        truncatable = [model for model in ordered if model not in referenced]
+        if not truncate(truncatable, log=log):
+            delete_in_chunks(truncatable, batch_size=batch_size, log=log)
+        delete_in_chunks([model for model in ordered if model in referenced], batch_size=batch_size, log=log)
+        # The event ids go on from the last one, so the buses of running workers don't skip new events
+        if not truncate([ComplaintEvent], reset_sequences=False, log=log):
+            delete_in_chunks([ComplaintEvent], batch_size=batch_size, log=log)
+        start_epoch()
+        timings['tables'] = time.monotonic() - started
+
+    started = time.monotonic()
+    # Few rows, but with cascades (tokens, admin log, groups): let the ORM handle them, in chunks
+    while True:
+        pks = list(User.objects.filter(is_superuser=False).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        User.objects.filter(pk__in=pks).delete()
+    timings['users'] = time.monotonic() - started
+
+    started = time.monotonic()
+    remove_media(media_directories(ordered), workers=workers, log=log)
+    timings['media'] = time.monotonic() - started
+    return timings
@@ -0,0 +1,379 @@
+"""Live feed of complaint writes for the department dashboards.
+
+Every complaint write is stored as a ComplaintEvent (see complaints.signals).
+Each worker process runs one ``EventBus``: a background thread polls the table
+for new events and hands them to the server-sent event streams open in that
+process, so a worker makes one query per poll interval however many dashboards
+are connected, and writes made by any worker reach every worker's streams
+without a message broker.
+
+The same events drive GET /api/complaints/changes/ (changes_since()), the
+delta sync of clients that poll instead of streaming. Clearing the sample data
+removes the events without recording the deletions, so it also starts a new
+epoch (start_epoch()): cursors of an older epoch have to reload the list.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from rest_framework.renderers import BaseRenderer
+
+from .models import CacheGeneration, ComplaintEvent
+
+logger = logging.getLogger(__name__)
+
+# Events whose id was skipped are looked for again for this long: ids are handed out
+# when a transaction inserts, but become visible when it commits, not always in order
+GAP_TIMEOUT = 10
+GAP_LIMIT = 1000
+# Undelivered events a stream may fall behind by before it is closed
+QUEUE_SIZE = 1000
+# The CacheGeneration row holding the epoch of the events
+EPOCH_NAMESPACE = 'complaint_events'
+
+
+def build_event(complaint, event_type, previous_department_code=None):
+    return ComplaintEvent(
+        ticket_id=complaint.ticket_id,
+        department_code=complaint.assigned_department_id,
+        previous_department_code=previous_department_code,
+        event_type=event_type,
+        status=complaint.status,
+        priority=complaint.priority,
+    )
+
+
+def record_event(complaint, event_type, previous_department_code=None):
+    event = build_event(complaint, event_type, previous_department_code)
+    event.save()
+    return event
+
+
+def record_events(complaints, event_type):
+    """record_event() for many complaints at once, see complaints.bulk_writes."""
+    return ComplaintEvent.objects.bulk_create([build_event(complaint, event_type) for complaint in complaints])
+
+
+def department_scope(user):
+    """(all departments, department code) the user sees, as ComplaintViewSet.get_queryset scopes it."""
+    if user.role == 'dept_admin' or user.role == 'staff':
+        return False, user.department_id
+    return True, None
+
+
+def scoped_events(all_departments, department_code):
+    events = ComplaintEvent.objects.all()
+    if not all_departments:
+        events = events.filter(Q(department_code=department_code) | Q(previous_department_code=department_code))
+    return events
+
+
+def latest_event_id():
+    return ComplaintEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def events_epoch():
+    return CacheGeneration.objects.filter(namespace=EPOCH_NAMESPACE).values_list('version', flat=True).first() or 0
+
+
+def start_epoch():
+    # After the events were removed wholesale, without recording the deletions
+    CacheGeneration.objects.update_or_create(namespace=EPOCH_NAMESPACE, defaults={'version': time.time_ns()})
+
+
+def encode_cursor(event_id, epoch):
+    # Opaque to clients, so what a cursor holds can change with its version
+    payload = json.dumps({'v': 1, 'id': event_id, 't': int(time.time()), 'e': epoch}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(event id, issued at, epoch) of a cursor from encode_cursor(). Raises ValueError if it isn't one."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['v'] != 1:
+            raise ValueError('Unsupported cursor version')
+        # Cursors issued before epochs existed belong to the first one
+        return int(payload['id']), int(payload['t']), int(payload.get('e', 0))
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def cursor_expired(issued_at, epoch, current_epoch):
+    # The events since an older cursor may have been pruned, or cleared with the data
+    return epoch != current_epoch or time.time() - issued_at > settings.COMPLAINT_EVENTS_RETENTION_HOURS * 3600
+
+
+def settled_event_id(events, default=0):
+    # Ids are handed out on insert but committed out of order, so a cursor only moves past
+    # events old enough that no transaction can still commit a lower id
+    cutoff = timezone.now() - timedelta(seconds=settings.COMPLAINT_CHANGES_SETTLE_SECONDS)
+    return max((event.id for event in events if event.created_at < cutoff), default=default)
+
+
+def changes_since(all_departments, department_code, since):
+    """Events of the scope after event id ``since``, at most COMPLAINT_CHANGES_LIMIT.
+
+    Returns (ticket ids in the order they last changed, event id of the next cursor, has more).
+    Events too recent to have settled are returned again with the next cursor.
+    """
+    limit = settings.COMPLAINT_CHANGES_LIMIT
+    events = list(
+        scoped_events(all_departments, department_code).filter(id__gt=since).order_by('id')[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+    if has_more:
+        # A full page moves on regardless, or a burst of new events would return it forever
+        next_id = events[-1].id
+    else:
+        next_id = settled_event_id(events, default=since)
+    ticket_ids = list(dict.fromkeys(event.ticket_id for event in reversed(events)))[::-1]
+    return ticket_ids, next_id, has_more
+
+
+def initial_cursor_id():
+    # The cursor of a client that is about to load the full list
+    cutoff = timezone.now() - timedelta(seconds=settings.COMPLAINT_CHANGES_SETTLE_SECONDS)
+    return ComplaintEvent.objects.filter(created_at__lt=cutoff).aggregate(latest=Max('id'))['latest'] or 0
+
+
+def prune_events():
+    cutoff = timezone.now() - timedelta(hours=settings.COMPLAINT_EVENTS_RETENTION_HOURS)
+    ComplaintEvent.objects.filter(created_at__lt=cutoff).delete()
+
+
+class Subscription:
+    """Events of one stream in a worker thread, filtered to its department scope."""
+
+    def __init__(self, all_departments, department_code):
+        self.all_departments = all_departments
+        self.department_code = department_code
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        return self.all_departments or self.department_code in (event['department'], event['previous_department'])
+
+    def deliver(self, event):
+        # Called from the bus thread
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A stalled client: end its stream, it resumes from its Last-Event-ID
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription read from the event loop, for streams served under ASGI."""
+
+    def __init__(self, all_departments, department_code):
+        super().__init__(all_departments, department_code)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self.put, event)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.stop = None
+        self.last_id = None
+        self.gaps = {}
+        self.last_pruned = 0
+
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.stop is None:
+                if self.last_id is None:
+                    self.last_id = latest_event_id()
+                self.stop = threading.Event()
+                threading.Thread(target=self.run, args=(self.stop,), name='complaint-events', daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+            if not self.subscribers and self.stop is not None:
+                # Nobody listens in this process, stop polling until the next stream
+                self.stop.set()
+                self.stop = None
+                self.last_id = None
+                self.gaps = {}
+
+    def run(self, stop):
+        try:
+            while not stop.wait(settings.COMPLAINT_EVENTS_POLL_INTERVAL):
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("Polling complaint events failed")
+        finally:
+            connections.close_all()
+
+    def poll(self):
+        with self.lock:
+            last_id = self.last_id
+            gaps = dict(self.gaps)
+            subscribers = list(self.subscribers)
+        if last_id is None:
+            return
+
+        now = time.monotonic()
+        gaps = {event_id: seen for event_id, seen in gaps.items() if now - seen < GAP_TIMEOUT}
+        condition = Q(id__gt=last_id)
+        if gaps:
+            condition |= Q(id__in=list(gaps))
+        events = [event.as_dict() for event in ComplaintEvent.objects.filter(condition).order_by('id')[:1000]]
+
+        for event in events:
+            gaps.pop(event['id'], None)
+            if event['id'] > last_id:
+                if event['id'] - last_id <= GAP_LIMIT:
+                    gaps.update((missing, now) for missing in range(last_id + 1, event['id']))
+                last_id = event['id']
+            for subscription in subscribers:
+                if subscription.matches(event):
+                    subscription.deliver(event)
+        with self.lock:
+            if self.last_id is not None:
+                self.last_id = max(self.last_id, last_id)
+                self.gaps = gaps
+
+        if now - self.last_pruned > 600:
+            self.last_pruned = now
+            prune_events()
+
+
+bus = EventBus()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept 'Accept: text/event-stream'. The events themselves are streamed,
+    only error responses (e.g. a 401) go through render()."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+
+def format_event(event, last_id):
+    # The SSE id is the highest event id sent so far, the id a reconnect resumes after
+    return f"id: {last_id}\ndata: {json.dumps(event)}\n\n"
+
+
+def release_connections():
+    # A stream doesn't need its database connection while it waits for events
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def stream(all_departments, department_code, since):
+    """Server-sent events of the scope after event id ``since``, for StreamingHttpResponse.
+
+    Events stored since then are replayed from the database first, at most
+    COMPLAINT_EVENTS_REPLAY_LIMIT: a stream that hits the limit ends after the replay
+    and the next one continues it. The stream ends after
+    COMPLAINT_EVENTS_STREAM_SECONDS; EventSource reconnects with the Last-Event-ID
+    header and the replay fills the gap.
+    """
+    subscription = bus.subscribe(Subscription(all_departments, department_code))
+    try:
+        yield f"retry: {settings.COMPLAINT_EVENTS_RETRY_MS}\n\n"
+        replayed = set()
+        events = scoped_events(all_departments, department_code).filter(id__gt=since).order_by('id')
+        for event in events[:settings.COMPLAINT_EVENTS_REPLAY_LIMIT]:
+            replayed.add(event.id)
+            since = max(since, event.id)
+            yield format_event(event.as_dict(), since)
+        if len(replayed) >= settings.COMPLAINT_EVENTS_REPLAY_LIMIT:
+            # More events may be pending: live events would move the id past them.
+            # End the stream, the client reconnects right away from the last one replayed
+            yield "retry: 0\n\n"
+            return
+        release_connections()
+
+        deadline = time.monotonic() + settings.COMPLAINT_EVENTS_STREAM_SECONDS
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscription.get(timeout=min(settings.COMPLAINT_EVENTS_HEARTBEAT, remaining))
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event['id'] not in replayed:
+                since = max(since, event['id'])
+                yield format_event(event, since)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+async def astream(all_departments, department_code, since):
+    """stream() for ASGI, waiting for events on the event loop instead of a thread."""
+    subscription = await sync_to_async(bus.subscribe)(AsyncSubscription(all_departments, department_code))
+    try:
+        yield f"retry: {settings.COMPLAINT_EVENTS_RETRY_MS}\n\n"
+        replayed = set()
+        events = scoped_events(all_departments, department_code).filter(id__gt=since).order_by('id')
+        async for event in events[:settings.COMPLAINT_EVENTS_REPLAY_LIMIT]:
+            replayed.add(event.id)
+            since = max(since, event.id)
+            yield format_event(event.as_dict(), since)
+        if len(replayed) >= settings.COMPLAINT_EVENTS_REPLAY_LIMIT:
+            # More events may be pending: live events would move the id past them.
+            # End the stream, the client reconnects right away from the last one replayed
+            yield "retry: 0\n\n"
+            return
+        # In the thread the replay queried from, whose connection it closes
+        await sync_to_async(release_connections, thread_sensitive=True)()
+
+        deadline = time.monotonic() + settings.COMPLAINT_EVENTS_STREAM_SECONDS
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = await subscription.get(timeout=min(settings.COMPLAINT_EVENTS_HEARTBEAT, remaining))
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event['id'] not in replayed:
+                since = max(since, event['id'])
+                yield format_event(event, since)
+    finally:
+        bus.unsubscribe(subscription)
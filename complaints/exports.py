@@ -0,0 +1,219 @@
+"""Streaming CSV and XLSX exports of the complaint list and the TAT report.
+
+Rows are read with ``values_list()`` and ``.iterator(chunk_size=...)``, so no
+model instances or serializers are built and only one chunk of rows is in
+memory, whatever the size of the export. The header is sent before the query
+runs, so the download starts right away.
+
+XLSX files are written without a spreadsheet library: a minimal workbook (one
+sheet, inline strings) zipped on the fly, the zip entries streamed as they are
+compressed.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FILE_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (header, values_list() field) of the complaint export
+COMPLAINT_COLUMNS = [
+    ('Ticket ID', 'ticket_id'),
+    ('Submitted at', 'submitted_at'),
+    ('Room', 'room__room_no'),
+    ('Bed', 'room__bed_no'),
+    ('Block', 'room__Block'),
+    ('Floor', 'room__Floor_no'),
+    ('Ward', 'room__ward'),
+    ('Issue type', 'issue_type'),
+    ('Description', 'description'),
+    ('Priority', 'priority'),
+    ('Status', 'status'),
+    ('Department', 'assigned_department__department_name'),
+    ('Assigned staff', 'assigned_staff__username'),
+    ('Submitted by', 'submitted_by'),
+    ('Resolved by', 'resolved_by'),
+    ('Resolved at', 'resolved_at'),
+    ('Remarks', 'remarks'),
+    ('Updated at', 'updated_at'),
+]
+
+TAT_COLUMNS = [
+    ('Ticket ID', 'ticket_id'),
+    ('Submitted at', 'submitted_at'),
+    ('Resolved at', 'resolved_at'),
+    ('Priority', 'priority'),
+    ('Status', 'status'),
+    ('TAT', None),
+    ('Department code', 'assigned_department__department_code'),
+    ('Department', 'assigned_department__department_name'),
+]
+
+
+# Control characters XML 1.0 doesn't allow, even escaped
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Echo:
+    """File-like object for csv.writer() that returns the line instead of writing it."""
+
+    def write(self, value):
+        return value
+
+
+class ZipStream:
+    """Write-only, unseekable file for ZipFile, emptied by the generator streaming it."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def csv_value(value):
+    value = format_value(value)
+    # Descriptions are typed by patients: keep spreadsheets from running them as formulas
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_stream(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    # One chunk of the response per chunk of rows, not one per line
+    for batch in batches(rows, settings.EXPORT_CHUNK_SIZE):
+        yield ''.join(writer.writerow([csv_value(value) for value in row]) for row in batch)
+
+
+def xlsx_cell(value):
+    value = format_value(value)
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(XML_INVALID.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def xlsx_stream(headers, rows):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        # Size unknown up front: force_zip64 lets the sheet grow past 2 GiB
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + xlsx_row(headers)
+            ).encode())
+            yield stream.pop()
+            for batch in batches(rows, settings.EXPORT_CHUNK_SIZE):
+                sheet.write(''.join(xlsx_row(row) for row in batch).encode())
+                yield stream.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield stream.pop()
+
+
+def export_response(file_type, name, headers, rows):
+    """StreamingHttpResponse downloading ``rows`` as ``name``-<date>.<file_type>."""
+    content = csv_stream(headers, rows) if file_type == 'csv' else xlsx_stream(headers, rows)
+    response = StreamingHttpResponse(content, content_type=FILE_TYPES[file_type])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{file_type}"'
+    # Don't let nginx buffer the file
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def complaint_rows(queryset):
+    fields = [field for _, field in COMPLAINT_COLUMNS]
+    return queryset.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def tat_rows(queryset, format_tat):
+    """TAT report rows, ``format_tat(resolved_at - submitted_at)`` for closed tickets."""
+    fields = [field for _, field in TAT_COLUMNS if field]
+    for ticket_id, submitted_at, resolved_at, priority, status, code, name in (
+        queryset.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    ):
+        tat = '-'
+        if status in ('resolved', 'closed') and resolved_at:
+            tat = format_tat(resolved_at - submitted_at)
+        yield ticket_id, submitted_at, resolved_at, priority, status, tat, code, name
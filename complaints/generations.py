@@ -0,0 +1,200 @@
+"""Coherent in-process caches across gunicorn workers, without a cache server.
+
+Cached data is grouped in namespaces (NAMESPACES), each with a version counter in
+the CacheGeneration table. Writes bump the counter of their namespace once their
+transaction commits (complaints.signals, and complaints.bulk_writes for the writes
+that bypass signals). Each worker reads the counters at the start of a request, at
+most once per CACHE_GENERATION_CHECK_INTERVAL seconds (CacheGenerationMiddleware),
+and keys its caches by the versions it saw, so a write served by any worker is
+picked up by all of them on their next check:
+
+* ``LocalCache`` is a dict in the worker, emptied when one of its namespaces changes;
+* ``versions()`` gives caches kept elsewhere (complaints.report_cache) the versions
+  to put in their keys.
+
+The bump is a short UPDATE of its own after the commit, so concurrent writes to a
+namespace don't wait on its counter row for the rest of each other's transactions.
+A request that reads between the commit and the bump caches the new data under
+the old versions, which the bump then retires.
+"""
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from rest_framework import status
+from rest_framework.response import Response
+
+from complaintsystem.metrics import record_cache
+from .models import CacheGeneration
+
+NAMESPACES = ('departments', 'issue_categories', 'rooms', 'users', 'complaints')
+
+
+class Generations:
+    """The namespace versions this process last read, and its local caches."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = {}
+        self.caches = []
+        self.last_check = None
+        self.reads = 0
+        self.applied = 0
+
+    def register(self, cache):
+        with self.lock:
+            self.caches.append(cache)
+
+    def due(self):
+        return self.last_check is None or time.monotonic() - self.last_check >= settings.CACHE_GENERATION_CHECK_INTERVAL
+
+    def check(self):
+        """Read the versions and drop the caches of the namespaces that changed."""
+        if not self.due():
+            return
+        with self.lock:
+            self.last_check = time.monotonic()
+            self.reads += 1
+            read_number = self.reads
+        read = dict(CacheGeneration.objects.values_list('namespace', 'version'))
+        with self.lock:
+            if read_number < self.applied:
+                # A thread that started reading later got there first, its versions are newer
+                return
+            self.applied = read_number
+            changed = {
+                namespace for namespace in read.keys() | self.current.keys()
+                if read.get(namespace) != self.current.get(namespace)
+            }
+            self.current = read
+        if changed:
+            self.clear(changed)
+
+    def versions(self, *namespaces):
+        return tuple(self.current.get(namespace, 0) for namespace in namespaces)
+
+    def written(self, namespaces):
+        # A write of this process: don't wait for the next check to see it
+        self.last_check = None
+        self.clear(namespaces)
+
+    def clear(self, namespaces):
+        for cache in self.caches:
+            if cache.namespaces & set(namespaces):
+                cache.clear()
+
+
+generations = Generations()
+
+
+def bump(*namespaces):
+    """Record a write to the namespaces once the write's transaction commits.
+
+    Call it from the write's transaction: a rolled back write bumps nothing.
+    """
+    transaction.on_commit(lambda: bump_now(namespaces), robust=True)
+
+
+def bump_now(namespaces):
+    # Clock based, so a version is never handed out twice, even after the table was
+    # emptied, and cached entries of an older version can't come back
+    version = time.time_ns()
+    updated = CacheGeneration.objects.filter(namespace__in=namespaces).update(
+        version=Greatest(F('version') + 1, Value(version))
+    )
+    if updated < len(namespaces):
+        # Rows missing from the table (removed by hand, or a namespace added later)
+        for namespace in namespaces:
+            CacheGeneration.objects.get_or_create(namespace=namespace, defaults={'version': version})
+    generations.written(namespaces)
+
+
+class LocalCache:
+    """A dict in this process for data of the given namespaces.
+
+    Keys carry the namespace versions seen by the request (versioned()), so an
+    entry computed before a write is never returned after it.
+    """
+
+    def __init__(self, name, namespaces, max_entries=500):
+        self.name = name
+        self.namespaces = frozenset(namespaces)
+        self.max_entries = max_entries
+        self.data = {}
+        self.lock = threading.Lock()
+        generations.register(self)
+
+    def versioned(self, key):
+        return generations.versions(*sorted(self.namespaces)), key
+
+    def get(self, key):
+        value = self.data.get(key)
+        record_cache(self.name, value is not None)
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            if len(self.data) >= self.max_entries:
+                # Few distinct keys are expected, start over instead of tracking usage
+                self.data.clear()
+            self.data[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+def request_key(request):
+    # The same query params in any order share an entry. The host and path are
+    # part of the pagination links
+    params = sorted(
+        (name, value) for name in request.query_params for value in request.query_params.getlist(name)
+    )
+    return request.get_host(), request.path, tuple(params)
+
+
+def cached_response(cache):
+    """Serve the successful responses of a view method from a LocalCache."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = cache.versioned(request_key(request))
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={'X-Cache': 'HIT'})
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+class CacheGenerationMiddleware:
+    """Brings the namespace versions of this process up to date before each request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        generations.check()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if generations.due():
+            await sync_to_async(generations.check)()
+        return await self.get_response(request)
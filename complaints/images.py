@@ -0,0 +1,83 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> ComplaintImage field that stores it
+VARIANT_FIELDS = {
+    'small': 'thumbnail_small',
+    'medium': 'thumbnail_medium',
+}
+
+
+def variant_name(image_name, variant):
+    # Variants live next to the original, e.g. complaint_images/abc.gif -> complaint_images/abc_small.jpg
+    root, _ = os.path.splitext(image_name)
+    return f"{root}_{variant}.jpg"
+
+
+def render_variants(source):
+    """Render every configured variant of an image file object, largest first.
+
+    Returns a dict of variant name -> JPEG bytes.
+    """
+    # Pillow is only imported once an image is processed, not at startup
+    from PIL import Image, ImageOps
+
+    sizes = settings.COMPLAINT_IMAGE_VARIANT_SIZES
+    rendered = {}
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        # Downscale from the previous (bigger) variant instead of the original each time
+        for variant in sorted(VARIANT_FIELDS, key=lambda v: sizes[v][0] * sizes[v][1], reverse=True):
+            img = img.copy()
+            img.thumbnail(sizes[variant], Image.LANCZOS)
+            buffer = BytesIO()
+            img.save(buffer, format='JPEG', quality=settings.COMPLAINT_IMAGE_VARIANT_QUALITY, optimize=True)
+            rendered[variant] = buffer.getvalue()
+    return rendered
+
+
+def generate_variants(complaint_image, force=False):
+    """Generate and store the missing thumbnails of a ComplaintImage.
+
+    Only assigns the field names; the caller is responsible for saving the instance.
+    Returns True if any field was changed.
+    """
+    if not complaint_image.image:
+        return False
+
+    missing = [
+        variant for variant, field_name in VARIANT_FIELDS.items()
+        if force or not getattr(complaint_image, field_name)
+    ]
+    if not missing:
+        return False
+
+    from PIL import UnidentifiedImageError
+
+    try:
+        with complaint_image.image.open('rb') as source:
+            rendered = render_variants(source)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning("Could not render variants for %s: %s", complaint_image.image.name, e)
+        return False
+
+    for variant in missing:
+        field = getattr(complaint_image, VARIANT_FIELDS[variant])
+        target = variant_name(complaint_image.image.name, variant)
+        if field.storage.exists(target):
+            if force:
+                field.storage.delete(target)
+            else:
+                # Already rendered (e.g. by an earlier interrupted backfill)
+                field.name = target
+                continue
+        field.name = field.storage.save(target, ContentFile(rendered[variant]))
+    return True
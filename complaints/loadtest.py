@@ -0,0 +1,238 @@
+"""Load generator replaying realistic traffic against a running server.
+
+Used by ``manage.py load_test``. Every virtual user loops over a weighted mix of
+actions: anonymous QR complaint submissions with a photo, catalog fetches of the
+complaint form, dashboard polling of the complaint list, report stats and TAT, and
+staff status updates. Requests are made with httpx over asyncio, so a single
+process can keep hundreds of connections busy.
+"""
+import asyncio
+import io
+import random
+import time
+from collections import Counter, defaultdict
+
+from .benchmarks import percentile
+
+DEFAULT_MIX = {
+    'qr_submit': 2,
+    'catalog': 3,
+    'dashboard_complaints': 3,
+    'dashboard_report': 1,
+    'dashboard_tat': 1,
+    'status_update': 1,
+}
+
+
+def sample_photos(count=20, seed=0):
+    """Small JPEGs of random noise, so content-addressed storage can't dedupe them all."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (64, 64), rng.randbytes(64 * 64 * 3)).save(buffer, format='JPEG', quality=80)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, status):
+        self.latencies[endpoint].append(seconds * 1000)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            statuses = self.statuses[endpoint]
+            # 4xx are the application refusing a request (e.g. a duplicate open complaint),
+            # errors are 5xx responses and failed connections/timeouts
+            rejected = sum(count for status, count in statuses.items() if isinstance(status, int) and 400 <= status < 500)
+            errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 500))
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'rps': round(len(latencies) / duration, 2),
+                'p50_ms': round(percentile(latencies, 0.5), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'rejected': rejected,
+                'errors': errors,
+                'statuses': {str(status): count for status, count in statuses.items()},
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {
+            'requests': total,
+            'rps': round(total / duration, 2),
+            'p50_ms': round(percentile(all_latencies, 0.5), 2) if all_latencies else None,
+            'p95_ms': round(percentile(all_latencies, 0.95), 2) if all_latencies else None,
+            'p99_ms': round(percentile(all_latencies, 0.99), 2) if all_latencies else None,
+            'rejected': sum(endpoint['rejected'] for endpoint in endpoints.values()),
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'endpoints': endpoints,
+        }
+
+
+class Session:
+    """An httpx client logged in through the JWT cookie, logging in again when the token expires."""
+
+    def __init__(self, httpx, base_url, credentials=None, timeout=30):
+        self.httpx = httpx
+        self.credentials = credentials
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=httpx.Limits(max_connections=None))
+        self.lock = asyncio.Lock()
+        self.generation = 0
+
+    async def login(self):
+        response = await self.client.post('/api/auth/login/', json=self.credentials)
+        if response.status_code != 200:
+            raise RuntimeError(f"Login as {self.credentials['username']} failed with {response.status_code}")
+        # The cookie may be marked Secure, which httpx wouldn't send back over plain http
+        for name in ('access_token', 'refresh_token'):
+            if name in response.cookies:
+                self.client.cookies.set(name, response.cookies[name])
+        self.generation += 1
+
+    async def request(self, method, url, **kwargs):
+        generation = self.generation
+        response = await self.client.request(method, url, **kwargs)
+        if response.status_code == 401 and self.credentials:
+            async with self.lock:
+                if self.generation == generation:
+                    await self.login()
+            response = await self.client.request(method, url, **kwargs)
+        return response
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class LoadTest:
+    def __init__(self, httpx, base_url, admin, staff=None, mix=None, think_time=0.0, seed=0, timeout=30,
+                 async_dashboards=False):
+        self.httpx = httpx
+        self.base_url = base_url
+        self.admin_credentials = admin
+        self.staff_credentials = staff or admin
+        self.mix = mix or DEFAULT_MIX
+        self.think_time = think_time
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.photos = sample_photos(seed=seed)
+        # The dashboard reads go to the async variants under /api/async/ (see complaints.async_views)
+        self.dashboard_prefix = '/api/async/' if async_dashboards else '/api/'
+
+    async def setup(self):
+        self.anonymous = Session(self.httpx, self.base_url, timeout=self.timeout)
+        self.admin = Session(self.httpx, self.base_url, self.admin_credentials, timeout=self.timeout)
+        self.staff = Session(self.httpx, self.base_url, self.staff_credentials, timeout=self.timeout)
+        await self.admin.login()
+        await self.staff.login()
+
+        # What a patient's QR code and the complaint form would point at
+        rooms = await self.admin.request('GET', '/api/rooms/', params={'status': 'active', 'limit': 100})
+        self.room_ids = [room['id'] for room in rooms.json().get('results', [])]
+        categories = await self.anonymous.request('GET', '/api/issue-category/', params={'status': 'active', 'limit': 100})
+        self.issue_types = [category['issue_category_name'] for category in categories.json().get('results', [])]
+        tickets = await self.staff.request('GET', '/api/complaints/', params={'status': 'open', 'limit': 100})
+        self.ticket_ids = [complaint['ticket_id'] for complaint in tickets.json().get('results', [])]
+
+        if not (self.room_ids and self.issue_types):
+            raise RuntimeError('The server has no active rooms or issue categories, run populate_realistic_data first.')
+        if not self.ticket_ids:
+            self.mix = {action: weight for action, weight in self.mix.items() if action != 'status_update'}
+
+    async def close(self):
+        for session in (self.anonymous, self.admin, self.staff):
+            await session.close()
+
+    # Actions, each returns (endpoint name, response)
+
+    async def qr_submit(self):
+        response = await self.anonymous.request('POST', '/api/complaints/', data={
+            'room': self.rng.choice(self.room_ids),
+            'issue_type': self.rng.choice(self.issue_types),
+            'description': 'Load test complaint',
+            'priority': self.rng.choice(['low', 'medium', 'high']),
+        }, files={'images': ('photo.jpg', self.rng.choice(self.photos), 'image/jpeg')})
+        return 'POST /api/complaints/', response
+
+    async def catalog(self):
+        if self.rng.random() < 0.5:
+            return 'GET /api/issue-category/', await self.anonymous.request(
+                'GET', '/api/issue-category/', params={'status': 'active', 'limit': 100},
+            )
+        return 'GET /api/departments/', await self.anonymous.request('GET', '/api/departments/', params={'limit': 100})
+
+    async def dashboard_complaints(self):
+        params = {'limit': 10, 'offset': self.rng.choice([0, 0, 0, 10, 20])}
+        if self.rng.random() < 0.5:
+            params['status'] = self.rng.choice(['open', 'in_progress'])
+        url = f'{self.dashboard_prefix}complaints/'
+        return f'GET {url}', await self.admin.request('GET', url, params=params)
+
+    async def dashboard_report(self):
+        url = f'{self.dashboard_prefix}report/all_department_stats/'
+        return f'GET {url}', await self.admin.request('GET', url)
+
+    async def dashboard_tat(self):
+        params = {'limit': 10}
+        if self.rng.random() < 0.5:
+            params['priority'] = self.rng.choice(['low', 'medium', 'high'])
+        url = f'{self.dashboard_prefix}TATView/all_department_TATS/'
+        return f'GET {url}', await self.admin.request('GET', url, params=params)
+
+    async def status_update(self):
+        ticket_id = self.rng.choice(self.ticket_ids)
+        response = await self.staff.request(
+            'PATCH', f'/api/complaints/{ticket_id}/', json={'status': self.rng.choice(['in_progress', 'on_hold', 'open'])},
+        )
+        return 'PATCH /api/complaints/<ticket_id>/', response
+
+    async def user(self, deadline, stats):
+        actions = list(self.mix)
+        weights = [self.mix[action] for action in actions]
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            started = time.perf_counter()
+            try:
+                endpoint, response = await getattr(self, action)()
+                stats.record(endpoint, time.perf_counter() - started, response.status_code)
+            except self.httpx.HTTPError as e:
+                stats.record(action, time.perf_counter() - started, type(e).__name__)
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def run_stage(self, concurrency, duration):
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(self.user(deadline, stats) for _ in range(concurrency)))
+        return stats.summary(time.monotonic() - started)
+
+    async def run(self, stages, duration, on_stage=None):
+        """Run one stage per concurrency level, returns [(concurrency, summary)]."""
+        await self.setup()
+        results = []
+        try:
+            for concurrency in stages:
+                summary = await self.run_stage(concurrency, duration)
+                results.append((concurrency, summary))
+                if on_stage:
+                    on_stage(concurrency, summary)
+        finally:
+            await self.close()
+        return results
+
+
+def saturation_point(results, min_gain=0.1):
+    """The concurrency after which more users stop adding throughput (None if never)."""
+    for (concurrency, summary), (_, next_summary) in zip(results, results[1:]):
+        if next_summary['rps'] < summary['rps'] * (1 + min_gain):
+            return concurrency
+    return None
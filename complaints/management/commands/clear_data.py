@@ -1,12 +1,34 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from complaints.cleanup import clear_sample_data
 from complaints.models import Department, Issue_Category, Room, Complaint, ComplaintImage
 
 class Command(BaseCommand):
     help = 'Clears all sample data from the database.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--fast', action='store_true',
+                            help='Truncate the tables (or delete in raw chunks) and remove the media directories '
+                                 'in bulk instead of deleting row by row through the ORM.')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows per DELETE when the tables cannot be truncated (--fast).')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads removing media files (--fast).')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Clearing all existing data...'))
+        started = time.monotonic()
+
+        if options['fast']:
+            timings = clear_sample_data(
+                batch_size=max(1, options['batch_size']), workers=options['workers'], log=self.stdout.write,
+            )
+            for step, seconds in timings.items():
+                self.stdout.write(f'  {step}: {seconds:.2f}s')
+            self.stdout.write(self.style.SUCCESS(f'All sample data cleared in {time.monotonic() - started:.2f}s.'))
+            return
 
         # Delete data in reverse order of dependency
         ComplaintImage.objects.all().delete()
@@ -19,4 +41,4 @@ class Command(BaseCommand):
         User = get_user_model()
         User.objects.filter(is_superuser=False).delete()
 
-        self.stdout.write(self.style.SUCCESS('All sample data cleared successfully.'))
+        self.stdout.write(self.style.SUCCESS(f'All sample data cleared successfully in {time.monotonic() - started:.2f}s.'))
@@ -0,0 +1,122 @@
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from complaintsystem.warmup import WARMUP_PATHS
+
+# Environment of each server profile, on top of gunicorn.conf.py
+PROFILES = {
+    'tuned': {'GUNICORN_PRELOAD': 'True', 'GUNICORN_WARMUP': 'True'},
+    'preload': {'GUNICORN_PRELOAD': 'True', 'GUNICORN_WARMUP': 'False'},
+    'baseline': {'GUNICORN_PRELOAD': 'False', 'GUNICORN_WARMUP': 'False'},
+}
+
+
+def time_to_first_byte(port, path, timeout=5):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    started = time.perf_counter()
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        elapsed = time.perf_counter() - started
+        response.read()
+        return elapsed, response.status
+    finally:
+        connection.close()
+
+
+def port_open(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts gunicorn with gunicorn.conf.py in each server profile and measures the time to first byte '
+        'after a deploy, and the latency of the first and second request to each endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='baseline,preload,tuned',
+                            help=f"Comma separated profiles to compare: {', '.join(PROFILES)}.")
+        parser.add_argument('--runs', type=int, default=3, help='Server starts per profile, the median is reported.')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers.')
+        parser.add_argument('--port', type=int, default=8799)
+        parser.add_argument('--paths', nargs='+', default=WARMUP_PATHS + ['/api/complaints/'],
+                            help='Endpoints requested after the server is up.')
+        parser.add_argument('--probe', default='/api/',
+                            help='Path polled until the server answers, before the endpoints are timed.')
+        parser.add_argument('--boot-timeout', type=float, default=60, help='Seconds to wait for the first response.')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise CommandError(f"Unknown profile '{profile}', choose from {', '.join(PROFILES)}.")
+
+        results = {}
+        for profile in profiles:
+            runs = [self.measure(profile, options) for _ in range(options['runs'])]
+            results[profile] = {
+                key: statistics.median(run[key] for run in runs) for key in runs[0]
+            }
+
+        columns = list(results[profiles[0]])
+        self.stdout.write(f"{'ms (median)':<52}" + ''.join(f'{profile:>12}' for profile in profiles))
+        for key in columns:
+            self.stdout.write(f'{key:<52}' + ''.join(f'{results[profile][key]:>12.1f}' for profile in profiles))
+
+    def measure(self, profile, options):
+        env = dict(os.environ, **PROFILES[profile])
+        env['GUNICORN_BIND'] = f"127.0.0.1:{options['port']}"
+        env['GUNICORN_WORKERS'] = str(options['workers'])
+        env['GUNICORN_ACCESS_LOG'] = ''
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'complaintsystem.settings')
+
+        paths = options['paths']
+        # A server still shutting down from the previous run would answer the probe
+        deadline = time.perf_counter() + 30
+        while port_open(options['port']):
+            if time.perf_counter() > deadline:
+                raise CommandError(f"Port {options['port']} is in use, pass a free one with --port.")
+            time.sleep(0.1)
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn'], cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            # Deploy to first byte: the first response to the probe, whatever its status
+            while True:
+                if server.poll() is not None:
+                    raise CommandError(f'gunicorn ({profile}) exited with {server.returncode} before answering.')
+                if time.perf_counter() - started > options['boot_timeout']:
+                    raise CommandError(f'gunicorn ({profile}) did not answer within {options["boot_timeout"]}s.')
+                try:
+                    time_to_first_byte(options['port'], options['probe'])
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            result = {'deploy to first byte': (time.perf_counter() - started) * 1000}
+            for path in paths:
+                result[f'first request {path}'] = time_to_first_byte(options['port'], path)[0] * 1000
+            for path in paths:
+                result[f'second request {path}'] = time_to_first_byte(options['port'], path)[0] * 1000
+            return result
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
@@ -0,0 +1,173 @@
+import heapq
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import FileField
+from django.db.models.functions import Collate
+from django.utils import timezone
+from complaints.models import ChunkedUpload
+
+# Collations that compare strings by code point, i.e. the order Python sorts str in
+BINARY_COLLATIONS = {
+    'postgresql': 'C',
+    'sqlite': 'BINARY',
+    'mysql': 'utf8mb4_bin',
+}
+
+QUARANTINE_DIR = '.orphaned'
+
+
+def walk_sorted(root, prefix=''):
+    """Yield (relative path, size, mtime) of every file under root, in str sort order."""
+    with os.scandir(os.path.join(root, prefix)) as it:
+        entries = [entry for entry in it if not entry.name.startswith('.')]
+    # 'a/x' must come after 'a.txt', as the full paths compare
+    entries.sort(key=lambda entry: entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name)
+    for entry in entries:
+        path = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_sorted(root, path + '/')
+        elif entry.is_file(follow_symlinks=False):
+            stat = entry.stat(follow_symlinks=False)
+            yield path, stat.st_size, stat.st_mtime
+
+
+def dedupe(iterable):
+    previous = None
+    for item in iterable:
+        if item != previous:
+            yield item
+            previous = item
+
+
+class Command(BaseCommand):
+    help = 'Finds files in MEDIA_ROOT that no database row references and quarantines or deletes them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the orphaned files and the bytes that would be reclaimed.')
+        parser.add_argument('--delete', action='store_true',
+                            help=f'Delete orphans instead of moving them to MEDIA_ROOT/{QUARANTINE_DIR}/.')
+        parser.add_argument('--min-age-minutes', type=int, default=60,
+                            help='Leave files younger than this alone, they may belong to an upload in progress.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows fetched per database round trip and files handled per worker task.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads used to move or delete orphans.')
+        parser.add_argument('--verbose-paths', action='store_true',
+                            help='Print every orphaned path.')
+
+    def handle(self, *args, **options):
+        self.media_root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(self.media_root):
+            raise CommandError(f'MEDIA_ROOT {self.media_root} does not exist.')
+        self.batch_size = max(1, options['batch_size'])
+        self.expired_before = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+        min_mtime = time.time() - options['min_age_minutes'] * 60
+        dry_run = options['dry_run']
+        workers = max(1, options['workers'])
+
+        if dry_run:
+            handle_batch = None
+        elif options['delete']:
+            handle_batch = self.delete_batch
+        else:
+            self.quarantine_root = os.path.join(
+                self.media_root, QUARANTINE_DIR, timezone.now().strftime('%Y%m%d-%H%M%S')
+            )
+            handle_batch = self.quarantine_batch
+
+        started = time.monotonic()
+        orphans = orphan_bytes = scanned = 0
+        batch = []
+        futures = []
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, size, mtime in self.find_orphans():
+                scanned += 1
+                if mtime > min_mtime:
+                    continue
+                orphans += 1
+                orphan_bytes += size
+                if options['verbose_paths']:
+                    self.stdout.write(f'  {path} ({size} bytes)')
+                if handle_batch is None:
+                    continue
+                batch.append(path)
+                if len(batch) >= self.batch_size:
+                    futures.append(executor.submit(handle_batch, batch))
+                    batch = []
+                    # Keep a bounded number of batches in flight
+                    if len(futures) >= 2 * workers:
+                        futures.pop(0).result()
+            if batch:
+                futures.append(executor.submit(handle_batch, batch))
+            for future in futures:
+                future.result()
+
+        if not dry_run:
+            # Their files were just collected as orphans
+            ChunkedUpload.objects.filter(created_at__lt=self.expired_before).delete()
+
+        elapsed = time.monotonic() - started
+        if dry_run:
+            action = 'Would reclaim'
+        elif options['delete']:
+            action = 'Deleted, reclaiming'
+        else:
+            action = f'Quarantined to {self.quarantine_root}, reclaiming'
+        self.stdout.write(self.style.SUCCESS(
+            f'{orphans} orphaned files. {action} {orphan_bytes} bytes '
+            f'({scanned} unreferenced files scanned in {elapsed:.1f}s).'
+        ))
+
+    def find_orphans(self):
+        referenced = dedupe(heapq.merge(*self.referenced_streams()))
+        reference = next(referenced, None)
+        for path, size, mtime in walk_sorted(self.media_root):
+            while reference is not None and reference < path:
+                reference = next(referenced, None)
+            if reference != path:
+                yield path, size, mtime
+
+    def referenced_streams(self):
+        collation = BINARY_COLLATIONS.get(connection.vendor)
+        if collation is None:
+            raise CommandError(f'No binary collation known for the {connection.vendor} backend.')
+
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, FileField):
+                    continue
+                queryset = model._default_manager.exclude(**{f'{field.name}__isnull': True}).exclude(**{field.name: ''})
+                if model is ChunkedUpload:
+                    # Abandoned uploads are collected too
+                    queryset = queryset.filter(created_at__gte=self.expired_before)
+                yield (
+                    queryset.order_by(Collate(field.name, collation))
+                    .values_list(field.name, flat=True)
+                    .iterator(chunk_size=self.batch_size)
+                )
+
+    def delete_batch(self, paths):
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.media_root, path))
+            except FileNotFoundError:
+                pass
+
+    def quarantine_batch(self, paths):
+        for path in paths:
+            target = os.path.join(self.quarantine_root, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                shutil.move(os.path.join(self.media_root, path), target)
+            except FileNotFoundError:
+                pass
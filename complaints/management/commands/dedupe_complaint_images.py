@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from complaints.images import VARIANT_FIELDS, generate_variants
+from complaints.models import ComplaintImage, MediaBlob
+from complaints.storage import complaint_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Moves complaint images stored before content addressing into the deduplicated, sharded layout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many files would be moved and how many bytes reclaimed.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = complaint_image_storage()
+        already_hashed = set(MediaBlob.objects.values_list('path', flat=True))
+
+        moved = missing = reclaimed = 0
+        seen = set()
+        queryset = ComplaintImage.objects.exclude(image='').order_by('pk')
+        for complaint_image in queryset.iterator(chunk_size=500):
+            old_name = complaint_image.image.name
+            if old_name in already_hashed:
+                continue
+            if not storage.exists(old_name):
+                missing += 1
+                continue
+
+            size = storage.size(old_name)
+            old_variants = [getattr(complaint_image, field_name).name for field_name in VARIANT_FIELDS.values()]
+            with storage.open(old_name) as content:
+                new_name = storage.hashed_name(old_name, storage.content_hash(content))
+                if new_name in seen or storage.exists(new_name):
+                    reclaimed += size
+                seen.add(new_name)
+                moved += 1
+                if dry_run:
+                    continue
+
+                # The file is saved in the transaction counting its reference, see ContentAddressedStorage._save
+                with transaction.atomic():
+                    new_name = storage.save(old_name, content)
+                    complaint_image.image.name = new_name
+                    for field_name in VARIANT_FIELDS.values():
+                        setattr(complaint_image, field_name, None)
+                    generate_variants(complaint_image)
+                    # update() skips the save signals, so count the reference here
+                    ComplaintImage.objects.filter(pk=complaint_image.pk).update(
+                        image=new_name,
+                        **{field_name: getattr(complaint_image, field_name).name for field_name in VARIANT_FIELDS.values()}
+                    )
+                    MediaBlob.acquire(new_name)
+            for name in [old_name, *old_variants]:
+                if name:
+                    storage.delete(name)
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} images into content-addressed storage, reclaiming {reclaimed} bytes of duplicates.'
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} images reference files that no longer exist.'))
@@ -0,0 +1,82 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from complaints.images import generate_variants
+from complaints.models import ComplaintImage
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's database connections
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _process_batch(pks, force):
+    done = failed = 0
+    for complaint_image in ComplaintImage.objects.filter(pk__in=pks):
+        if generate_variants(complaint_image, force=force):
+            complaint_image.save(update_fields=['thumbnail_small', 'thumbnail_medium'])
+            done += 1
+        else:
+            failed += 1
+    connections.close_all()
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = 'Generates the small and medium thumbnails of existing complaint images, in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: number of CPU cores).')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of images handed to a worker at a time.')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render variants that already exist.')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        force = options['force']
+
+        queryset = ComplaintImage.objects.exclude(image='')
+        if not force:
+            queryset = queryset.filter(
+                Q(thumbnail_small__isnull=True) | Q(thumbnail_small='') |
+                Q(thumbnail_medium__isnull=True) | Q(thumbnail_medium='')
+            )
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+        if not pks:
+            self.stdout.write(self.style.SUCCESS('All complaint images already have their variants.'))
+            return
+
+        batches = [pks[i:i + batch_size] for i in range(0, len(pks), batch_size)]
+        self.stdout.write(f'Rendering variants for {len(pks)} images with {workers} worker(s)...')
+        started = time.monotonic()
+        done = failed = 0
+
+        if workers == 1:
+            for batch in batches:
+                batch_done, batch_failed = _process_batch(batch, force)
+                done += batch_done
+                failed += batch_failed
+        else:
+            # Don't let the workers inherit open connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = [executor.submit(_process_batch, batch, force) for batch in batches]
+                for future in as_completed(futures):
+                    batch_done, batch_failed = future.result()
+                    done += batch_done
+                    failed += batch_failed
+                    self.stdout.write(f'  {done + failed}/{len(pks)} processed')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rendered variants for {done} images in {elapsed:.1f}s.'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} images could not be decoded and were skipped.'))
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from complaints.loadtest import DEFAULT_MIX, LoadTest, saturation_point
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        action, _, weight = item.partition('=')
+        if action not in DEFAULT_MIX:
+            raise CommandError(f"Unknown action '{action}', choose from {', '.join(DEFAULT_MIX)}.")
+        try:
+            mix[action] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight '{weight}' for {action}.")
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays QR complaint submissions, catalog fetches, dashboard polling and staff status updates '
+        'against a running server and reports throughput and p50/p95/p99 latency per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of concurrent virtual users.')
+        parser.add_argument('--ramp', default=None,
+                            help='Comma separated concurrency levels to run one after the other, e.g. 5,10,20,40, '
+                                 'to find the saturation point.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds per concurrency level.')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean pause of a user between requests in seconds (0 = closed loop at full speed).')
+        parser.add_argument('--mix', default=None,
+                            help=f"Action weights, default {','.join(f'{a}={w}' for a, w in DEFAULT_MIX.items())}.")
+        parser.add_argument('--username', default='admin', help='Master admin polling the dashboards.')
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--staff-username', default=None, help='Staff user updating statuses (default: the admin).')
+        parser.add_argument('--staff-password', default='password123')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the traffic.')
+        parser.add_argument('--timeout', type=float, default=30, help='Request timeout in seconds.')
+        parser.add_argument('--async-dashboards', action='store_true',
+                            help='Poll the async dashboard endpoints under /api/async/ instead of the DRF ones.')
+        parser.add_argument('--output', default=None, help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+        except ImportError:
+            raise CommandError('The load test needs httpx, install it with: pip install httpx')
+
+        try:
+            stages = [int(level) for level in options['ramp'].split(',')] if options['ramp'] else [options['concurrency']]
+        except ValueError:
+            raise CommandError('--ramp takes comma separated integers.')
+
+        staff = None
+        if options['staff_username']:
+            staff = {'username': options['staff_username'], 'password': options['staff_password']}
+        load_test = LoadTest(
+            httpx, options['url'].rstrip('/'),
+            admin={'username': options['username'], 'password': options['password']},
+            staff=staff,
+            mix=parse_mix(options['mix']) if options['mix'] else None,
+            think_time=options['think_time'],
+            seed=options['seed'],
+            timeout=options['timeout'],
+            async_dashboards=options['async_dashboards'],
+        )
+        try:
+            results = asyncio.run(load_test.run(stages, options['duration'], on_stage=self.report_stage))
+        except (RuntimeError, httpx.HTTPError) as e:
+            raise CommandError(str(e))
+
+        if len(results) > 1:
+            self.stdout.write(f"{'users':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            for concurrency, summary in results:
+                self.stdout.write(
+                    f"{concurrency:>6}{summary['rps']:>10.1f}{summary['p50_ms']:>10.1f}"
+                    f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['errors']:>8}"
+                )
+            saturated = saturation_point(results)
+            if saturated:
+                self.stdout.write(self.style.WARNING(
+                    f'Throughput stops growing beyond {saturated} concurrent users.'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('Throughput still grows at the highest concurrency tested.'))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'url': options['url'],
+                    'duration': options['duration'],
+                    'stages': [{'concurrency': concurrency, **summary} for concurrency, summary in results],
+                    'saturation_concurrency': saturation_point(results),
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def report_stage(self, concurrency, summary):
+        self.stdout.write(self.style.SUCCESS(
+            f"{concurrency} users: {summary['requests']} requests, {summary['rps']} req/s, "
+            f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, {summary['rejected']} 4xx, {summary['errors']} errors"
+        ))
+        self.stdout.write(f"  {'endpoint':<48}{'reqs':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'4xx':>6}{'errors':>8}")
+        for endpoint, result in summary['endpoints'].items():
+            self.stdout.write(
+                f"  {endpoint:<48}{result['requests']:>7}{result['rps']:>9.1f}{result['p50_ms']:>9.1f}"
+                f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['rejected']:>6}{result['errors']:>8}"
+            )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from complaints.qr_codes import render_qr_codes
+
+
+class Command(BaseCommand):
+    help = ("Re-renders the room QR codes whose payload is out of date, e.g. after a worker died "
+            "before rendering the codes of a bulk status change or import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ward', help='Only the rooms of this ward.')
+        parser.add_argument('--block', help='Only the rooms of this block.')
+        parser.add_argument('--floor', type=int, help='Only the rooms of this floor.')
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['ward']:
+            filters['ward'] = options['ward']
+        if options['block']:
+            filters['Block'] = options['block']
+        if options['floor'] is not None:
+            filters['Floor_no'] = options['floor']
+
+        started = time.monotonic()
+        rendered = render_qr_codes(filters)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {rendered} stale room QR codes in {elapsed:.1f}s.'))
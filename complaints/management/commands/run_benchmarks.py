@@ -0,0 +1,88 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from complaints.benchmarks import compare, run_benchmarks, seed_dataset
+from complaints.models import Complaint, Room
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a test database and benchmarks the complaint list, search, filter, report, TAT and '
+        'create endpoints. Writes the results as JSON and compares them against a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10000, help='Rooms to seed.')
+        parser.add_argument('--complaints', type=int, default=1000000, help='Complaints to seed.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset.')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario.')
+        parser.add_argument('--only', nargs='+', help='Run only these scenarios.')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the test database, and its seeded data, for the next run (set DATABASES['default']['TEST']['NAME'] on SQLite).",
+        )
+        parser.add_argument('--output', default=None, help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', default=None, help='Compare against this JSON file and fail on regressions.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p50 slowdown against the baseline (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        # Never touch the real database: benchmark against a seeded test database
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.prepare_dataset(options)
+            self.stdout.write(f"{'scenario':<36}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}")
+            results = run_benchmarks(
+                iterations=options['iterations'], warmup=options['warmup'], only=options['only'], log=self.log_result,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+        results['dataset']['seed'] = options['seed']
+        results['dataset']['debug'] = settings.DEBUG
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if baseline is not None:
+            if baseline.get('dataset', {}).get('complaints') != results['dataset']['complaints']:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was measured on {baseline.get('dataset', {}).get('complaints')} complaints, "
+                    f"this run on {results['dataset']['complaints']}."
+                ))
+            regressions = compare(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(self.style.ERROR(regression))
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def prepare_dataset(self, options):
+        if options['keepdb'] and Complaint.objects.count() == options['complaints'] and Room.objects.count() == options['rooms']:
+            self.stdout.write('Reusing the seeded test database.')
+            return
+        if Complaint.objects.exists() or Room.objects.exists():
+            raise CommandError('The kept test database holds a dataset of another size, run once without --keepdb.')
+        self.stdout.write(f"Seeding {options['rooms']} rooms and {options['complaints']} complaints...")
+        seed_dataset(rooms=options['rooms'], complaints=options['complaints'], seed=options['seed'], log=self.stdout.write)
+
+    def log_result(self, name, result):
+        self.stdout.write(
+            f"{name:<36}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['max_ms']:>10.1f}{result['queries']:>9}"
+        )
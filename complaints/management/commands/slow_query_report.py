@@ -0,0 +1,81 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Aggregates the slow query log by query shape, slowest total time first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Slow query log to read (default: SLOW_QUERY_LOG_FILE).')
+        parser.add_argument('--top', type=int, default=20, help='Number of shapes to show.')
+        parser.add_argument('--json', action='store_true', help='Print the aggregate as JSON.')
+
+    def handle(self, *args, **options):
+        path = options['file'] or str(settings.SLOW_QUERY_LOG_FILE)
+        if not os.path.exists(path):
+            raise CommandError(f'No slow query log at {path}.')
+
+        shapes = {}
+        plans = {}
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('type') == 'explain':
+                    plans[entry['shape_id']] = entry['plan']
+                    continue
+                shape = shapes.setdefault(entry['shape_id'], {
+                    'shape_id': entry['shape_id'],
+                    'shape': entry['shape'],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'views': {},
+                    'stacks': {},
+                    'example_sql': entry['sql'],
+                    'example_params': entry['params'],
+                })
+                shape['count'] += 1
+                shape['total_ms'] += entry['duration_ms']
+                if entry['duration_ms'] > shape['max_ms']:
+                    shape['max_ms'] = entry['duration_ms']
+                    shape['example_sql'] = entry['sql']
+                    shape['example_params'] = entry['params']
+                view = entry.get('view') or '-'
+                shape['views'][view] = shape['views'].get(view, 0) + 1
+                if entry.get('stack'):
+                    shape['stacks'][entry['stack_id']] = entry['stack']
+
+        ranked = sorted(shapes.values(), key=lambda shape: shape['total_ms'], reverse=True)[:options['top']]
+        for shape in ranked:
+            shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 3)
+            shape['total_ms'] = round(shape['total_ms'], 3)
+            shape['plan'] = plans.get(shape['shape_id'])
+            shape['stacks'] = list(shape['stacks'].values())
+
+        if options['json']:
+            self.stdout.write(json.dumps(ranked, indent=2))
+            return
+
+        if not ranked:
+            self.stdout.write(self.style.SUCCESS('No slow queries recorded.'))
+            return
+        for shape in ranked:
+            self.stdout.write(self.style.WARNING(
+                f"[{shape['shape_id']}] {shape['count']}x, total {shape['total_ms']} ms, "
+                f"avg {shape['avg_ms']} ms, max {shape['max_ms']} ms"
+            ))
+            self.stdout.write(f"  {shape['shape']}")
+            self.stdout.write('  views: ' + ', '.join(f'{view} ({count})' for view, count in shape['views'].items()))
+            if shape['stacks']:
+                self.stdout.write(f"  from: {shape['stacks'][0][-1]}")
+            if shape['plan']:
+                self.stdout.write('  plan:')
+                for row in shape['plan'] if isinstance(shape['plan'], list) else [shape['plan']]:
+                    self.stdout.write(f'    {row}')
+            self.stdout.write('')
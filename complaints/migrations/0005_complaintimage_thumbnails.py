@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_alter_department_department_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaintimage',
+            name='thumbnail_medium',
+            field=models.ImageField(blank=True, null=True, upload_to='complaint_images/'),
+        ),
+        migrations.AddField(
+            model_name='complaintimage',
+            name='thumbnail_small',
+            field=models.ImageField(blank=True, null=True, upload_to='complaint_images/'),
+        ),
+    ]
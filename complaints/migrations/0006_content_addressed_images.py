@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:03
+
+import complaints.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0005_complaintimage_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('path', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='complaintimage',
+            name='image',
+            field=models.ImageField(storage=complaints.storage.complaint_image_storage, upload_to='complaint_images/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0007_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.CharField(max_length=12)),
+                ('department_code', models.CharField(blank=True, max_length=6, null=True)),
+                ('event_type', models.CharField(choices=[('created', 'Created'), ('status_changed', 'Status changed')], max_length=20)),
+                ('status', models.CharField(max_length=15)),
+                ('priority', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['department_code', 'id'], name='complaints__departm_4fc17c_idx')],
+            },
+        ),
+    ]
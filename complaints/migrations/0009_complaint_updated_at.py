@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:54
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # The last write we know of, instead of the time of the migration
+    Complaint = apps.get_model('complaints', 'Complaint')
+    Complaint.objects.update(updated_at=Coalesce('resolved_at', 'submitted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0008_complaintevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='complaintevent',
+            name='previous_department_code',
+            field=models.CharField(blank=True, max_length=6, null=True),
+        ),
+        migrations.AlterField(
+            model_name='complaintevent',
+            name='event_type',
+            field=models.CharField(choices=[('created', 'Created'), ('status_changed', 'Status changed'), ('reassigned', 'Reassigned'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='complaintevent',
+            index=models.Index(fields=['previous_department_code', 'id'], name='complaints__previou_19dedf_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+def create_namespaces(apps, schema_editor):
+    # complaints.generations.NAMESPACES at the time of this migration
+    CacheGeneration = apps.get_model('complaints', 'CacheGeneration')
+    CacheGeneration.objects.bulk_create([
+        CacheGeneration(namespace=namespace)
+        for namespace in ['departments', 'issue_categories', 'rooms', 'users', 'complaints']
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0009_complaint_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('namespace', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_namespaces, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0010_cachegeneration'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='complaint',
+            name='submitted_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Room.KEY_FIELDS at the time of this migration
+KEY_FIELDS = ('bed_no', 'room_no', 'Block', 'Floor_no', 'ward', 'speciality', 'room_type')
+
+
+def check_duplicate_rooms(apps, schema_editor):
+    # Fail with the rooms to merge rather than with the IntegrityError of the constraint
+    Room = apps.get_model('complaints', 'Room')
+    duplicates = Room.objects.values(*KEY_FIELDS).annotate(count=Count('pk')).filter(count__gt=1).order_by(*KEY_FIELDS)
+    groups = []
+    for key in duplicates:
+        key.pop('count')
+        ids = list(Room.objects.filter(**key).order_by('pk').values_list('pk', flat=True))
+        groups.append(f"  {', '.join(map(str, ids))} ({', '.join(f'{field}={value!r}' for field, value in key.items())})")
+    if groups:
+        raise RuntimeError(
+            f"{len(groups)} rooms exist more than once, each line lists the ids of one room. Move their "
+            "complaints to one of the ids and delete the others, then migrate again:\n" + '\n'.join(groups)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0011_complaint_submitted_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_rooms, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='room',
+            constraint=models.UniqueConstraint(fields=('bed_no', 'room_no', 'Block', 'Floor_no', 'ward', 'speciality', 'room_type'), name='unique_room'),
+        ),
+    ]
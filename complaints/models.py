@@ -1,18 +1,22 @@
-from django.db import models
-import qrcode
+from django.db import models, transaction
+from django.db.models import F
 from io import BytesIO
 from django.core.files import File
-from PIL import Image
 import uuid
 import base64
 import json
 import hmac
 import hashlib
 from django.conf import settings
+from complaintsystem.metrics import QR_RENDER_SECONDS
+from .images import VARIANT_FIELDS, generate_variants, variant_name
+from .storage import complaint_image_storage
 
 # Create your models here.
 class Room(models.Model):
     STATUS_CHOICES = [('active', 'Active'), ('inactive', 'Inactive')]
+    # The fields that identify a room, unique together (everything but status and the QR code)
+    KEY_FIELDS = ('bed_no', 'room_no', 'Block', 'Floor_no', 'ward', 'speciality', 'room_type')
     
     bed_no = models.CharField(max_length=10)
     room_no = models.CharField(max_length=20)
@@ -26,6 +30,14 @@ class Room(models.Model):
     # QR Code
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
     dataenc = models.CharField(max_length=500, blank=True, null=True)  # Store base64 encoded data
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bed_no', 'room_no', 'Block', 'Floor_no', 'ward', 'speciality', 'room_type'],
+                name='unique_room',
+            ),
+        ]
     
     def __str__(self):
         return f"Room {self.room_no} - Bed {self.bed_no} - {self.Block}"
@@ -51,7 +63,17 @@ class Room(models.Model):
         # Save the instance first to ensure it has an ID
         super().save(*args, **kwargs)
 
-        # Generate base64 encoded data (now self.id is available)
+        with QR_RENDER_SECONDS.time():
+            self.render_qr_code()
+
+        # Save again to update qr_code and dataenc fields
+        super().save(update_fields=['qr_code', 'dataenc'])
+
+    def render_qr_code(self):
+        # Imported here: qrcode pulls in Pillow, which nothing else needs at startup
+        import qrcode
+
+        # Generate base64 encoded data (self.id must be set)
         self.dataenc = self.get_room_data()
 
         # Generate HMAC signature
@@ -82,9 +104,6 @@ class Room(models.Model):
         filename = f'qr_code_{self.room_no}_{self.bed_no}.png'
         self.qr_code.save(filename, File(buffer), save=False)
 
-        # Save again to update qr_code and dataenc fields
-        super().save(update_fields=['qr_code', 'dataenc'])
-
 
 class Complaint(models.Model):
     PRIORITY_CHOICES = [('low', 'Low'), ('medium', 'Medium'), ('high', 'High')]
@@ -92,7 +111,7 @@ class Complaint(models.Model):
 
     # Make ticket_id the primary key
     ticket_id = models.CharField(max_length=12, primary_key=True, editable=False)
-    submitted_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     # Room details
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='complaints', null=True, blank=True)
@@ -110,11 +129,17 @@ class Complaint(models.Model):
     resolved_by = models.CharField(max_length=100, blank=True, null=True)
     resolved_at = models.DateTimeField(blank=True, null=True)
     remarks = models.TextField(blank=True, null=True)
+    # Bumped on every save, see also ComplaintEvent for the changes feed
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.ticket_id:
             # Generate ticket ID
             self.ticket_id = "SVN" + str(uuid.uuid4().int)[:5].zfill(5)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            # A partial save is still a change clients have to sync
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -123,11 +148,104 @@ class Complaint(models.Model):
 
 class ComplaintImage(models.Model):
     complaint = models.ForeignKey('Complaint', related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='complaint_images/')
+    # Stored once per unique content, see complaints.storage and MediaBlob
+    image = models.ImageField(upload_to='complaint_images/', storage=complaint_image_storage)
+
+    # Downscaled JPEG variants for list views, see complaints.images
+    thumbnail_small = models.ImageField(upload_to='complaint_images/', blank=True, null=True)
+    thumbnail_medium = models.ImageField(upload_to='complaint_images/', blank=True, null=True)
+
+    def save(self, *args, **kwargs):
+        # One transaction from storing the file to counting its reference (the
+        # post_save signal), see ContentAddressedStorage._save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if self.image and not (self.thumbnail_small and self.thumbnail_medium):
+                if generate_variants(self):
+                    super().save(update_fields=['thumbnail_small', 'thumbnail_medium'])
 
     def __str__(self):
         return f"Image for Complaint {self.complaint.ticket_id}"
 
+
+class ChunkedUpload(models.Model):
+    """An image uploaded in parts, later attached to a complaint by its upload_id."""
+    STATUS_CHOICES = [('uploading', 'Uploading'), ('complete', 'Complete')]
+
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)  # Bytes received so far
+    file = models.FileField(upload_to='chunked_uploads/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Upload {self.upload_id} ({self.offset}/{self.total_size} bytes)"
+
+    def append(self, offset, chunk):
+        # Writes at the given offset, so a re-sent chunk simply overwrites itself
+        with open(self.file.path, 'r+b') as f:
+            f.seek(offset)
+            for data in chunk.chunks():
+                f.write(data)
+            self.offset = max(self.offset, f.tell())
+
+
+class MediaBlob(models.Model):
+    """Reference count of a content-addressed file in complaint_image_storage."""
+    path = models.CharField(max_length=255, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, path):
+        storage = complaint_image_storage()
+        with transaction.atomic():
+            cls.objects.get_or_create(path=path, defaults={'size': storage.size(path) if storage.exists(path) else 0})
+            cls.objects.filter(path=path).update(ref_count=F('ref_count') + 1)
+
+    @classmethod
+    def lock(cls, path):
+        """Lock the blob row of path until the end of the transaction, return it (None without one).
+
+        The files of a blob are only reused (complaints.storage) or deleted
+        (delete_files()) under this lock.
+        """
+        return cls.objects.select_for_update().filter(path=path).first()
+
+    @classmethod
+    def release(cls, path):
+        with transaction.atomic():
+            blob = cls.lock(path)
+            if blob is None:
+                # Stored before content addressing, nothing to count
+                return
+            cls.objects.filter(path=path).update(ref_count=F('ref_count') - 1)
+            if blob.ref_count <= 1:
+                # The row stays, at no references, until the files are gone
+                transaction.on_commit(lambda: cls.delete_files(path))
+
+    @classmethod
+    def delete_files(cls, path):
+        storage = complaint_image_storage()
+        with transaction.atomic():
+            blob = cls.lock(path)
+            if blob is None or blob.ref_count > 0:
+                # Uploaded again since it was released, or already deleted
+                return
+            storage.delete(path)
+            for variant in VARIANT_FIELDS:
+                storage.delete(variant_name(path, variant))
+            blob.delete()
+
+
 class Department(models.Model):
     department_code = models.CharField(max_length=6, primary_key=True)
     department_name = models.CharField(max_length=255, unique=True)
@@ -137,6 +255,60 @@ class Department(models.Model):
     def __str__(self):
         return self.department_name
     
+class ComplaintEvent(models.Model):
+    """A complaint write, fanned out to the live dashboards by complaints.events.
+
+    The auto-incrementing id orders the events and is the SSE event id clients
+    resume from. Department and ticket are plain values so events outlive them.
+    """
+    TYPE_CHOICES = [
+        ('created', 'Created'), ('status_changed', 'Status changed'), ('reassigned', 'Reassigned'),
+        ('updated', 'Updated'), ('deleted', 'Deleted'),
+    ]
+
+    ticket_id = models.CharField(max_length=12)
+    department_code = models.CharField(max_length=6, blank=True, null=True)
+    # Set on reassignment, so the old department learns the ticket left it
+    previous_department_code = models.CharField(max_length=6, blank=True, null=True)
+    event_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    status = models.CharField(max_length=15)
+    priority = models.CharField(max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['department_code', 'id']),
+            models.Index(fields=['previous_department_code', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.ticket_id} ({self.status})"
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'type': self.event_type,
+            'ticket_id': self.ticket_id,
+            'department': self.department_code,
+            'previous_department': self.previous_department_code,
+            'status': self.status,
+            'priority': self.priority,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+class CacheGeneration(models.Model):
+    """Version of a namespace of cached data, bumped by every write to it.
+
+    Workers compare the versions to drop their in-process caches, see complaints.generations.
+    """
+    namespace = models.CharField(max_length=30, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.namespace} v{self.version}"
+
+
 class Issue_Category(models.Model):
     issue_category_code = models.CharField(max_length=6,primary_key=True)
     department = models.ForeignKey('Department', related_name='issue_categories', on_delete=models.CASCADE)
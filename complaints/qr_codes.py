@@ -0,0 +1,69 @@
+"""Background re-rendering of room QR codes after bulk writes.
+
+A room's QR code encodes Room.get_room_data(), which includes its status. The
+bulk status action changes the rooms with one UPDATE and leaves their QR codes to
+a single thread per process, started after the commit. The thread reads the rooms
+as they are by then, so the last change wins. It only renders the rooms whose
+payload differs from the stored one; a room toggled back before its turn keeps
+its code. Renders still queued when a worker exits are lost: the
+render_room_qr_codes command catches up on them.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+from complaintsystem.metrics import QR_RENDER_SECONDS
+from .bulk_writes import bulk_write
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_qr_codes(filters):
+    """Re-render the QR codes of the rooms matching ``filters`` whose payload is stale.
+
+    Returns the number of rooms rendered.
+    """
+    rendered = 0
+    last_pk = 0
+    while True:
+        rooms = list(Room.objects.filter(**filters).filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not rooms:
+            return rendered
+        last_pk = rooms[-1].pk
+        stale = [room for room in rooms if room.get_room_data() != room.dataenc]
+        for room in stale:
+            with QR_RENDER_SECONDS.time():
+                room.render_qr_code()
+        if stale:
+            with bulk_write('rooms'):
+                Room.objects.bulk_update(stale, ['qr_code', 'dataenc'])
+            rendered += len(stale)
+
+
+def _render_in_background(filters):
+    try:
+        render_qr_codes(filters)
+    except Exception:
+        logger.exception("Rendering room QR codes failed")
+    finally:
+        connections.close_all()
+
+
+def schedule_qr_render(filters):
+    """Re-render the QR codes of the rooms matching ``filters`` once the transaction commits."""
+    def submit():
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                # One thread: renders run in the order of the writes
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qr-render')
+        _executor.submit(_render_in_background, filters)
+    transaction.on_commit(submit)
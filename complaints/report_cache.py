@@ -0,0 +1,72 @@
+"""Response cache of the report and TAT endpoints.
+
+Every admin who opens the reports page asks for the same aggregates with the
+same filters. The responses are kept in the ``reports`` cache (settings.CACHES)
+under a key made of the endpoint, the normalized query params, the user's
+department scope and the versions of the complaint and department data
+(complaints.generations). A write served by any worker moves the versions on, so
+the entries of the old ones are no longer asked for and expire after
+REPORT_CACHE_TIMEOUT; nothing is deleted, which also works with the per-process
+locmem backend.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from complaintsystem.metrics import record_cache
+from .events import department_scope
+from .generations import generations, request_key
+
+
+def report_cache():
+    return caches['reports']
+
+
+def generation():
+    return '.'.join(str(version) for version in generations.versions('complaints', 'departments'))
+
+
+def cache_key(request, endpoint, generation):
+    all_departments, department_code = department_scope(request.user)
+    scope = 'all' if all_departments else f'dept:{department_code}'
+    digest = hashlib.sha256(repr(request_key(request)).encode()).hexdigest()
+    return f'reports:{endpoint}:{scope}:{generation}:{digest}'
+
+
+def cached_report(endpoint):
+    """Serve the successful responses of a report action from the cache."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = report_cache()
+            key = cache_key(request, endpoint, generation())
+            data = cache.get(key)
+            record_cache(f'reports.{endpoint}', data is not None)
+            if data is not None:
+                return Response(data, headers={'X-Cache': 'HIT'})
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+async def acached_report(request, endpoint, build):
+    """cached_report() for the async views: ``build`` makes the JsonResponse on a miss."""
+    cache = report_cache()
+    key = cache_key(request, endpoint, generation())
+    content = await cache.aget(key)
+    record_cache(f'reports.{endpoint}', content is not None)
+    if content is not None:
+        return HttpResponse(content, content_type='application/json', headers={'X-Cache': 'HIT'})
+    response = await build()
+    if response.status_code == status.HTTP_200_OK:
+        await cache.aset(key, response.content)
+    response['X-Cache'] = 'MISS'
+    return response
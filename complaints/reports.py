@@ -0,0 +1,204 @@
+"""Filtering and aggregation of the report and TAT endpoints.
+
+Shared by the DRF views (complaints.views) and their async variants
+(complaints.async_views). Everything here only builds querysets, so the
+callers decide whether they are evaluated synchronously or with the async ORM.
+"""
+from datetime import time
+
+from dateutil.parser import parse
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+
+from .models import Complaint
+
+CLOSED_STATUSES = ['resolved', 'closed']
+
+
+def scope_to_user(queryset, user):
+    # Department admins and staff only see the complaints of their own department
+    if user.is_authenticated:
+        if user.role == 'dept_admin' or user.role == 'staff':
+            return queryset.filter(assigned_department_id=user.department_id)
+    return queryset
+
+
+def department_stats(queryset, params):
+    """Complaint counts per department and priority, filtered by the query params.
+
+    Returns (stats queryset, filters applied). Raises ValueError for an invalid priority.
+    """
+    priority = params.get('priority')
+    department = params.get('department')
+    status_filter = params.get('status')
+    submitted_at = params.get('submitted_at')
+
+    if priority:
+        if priority not in dict(Complaint.PRIORITY_CHOICES):
+            raise ValueError('Invalid priority value')
+        queryset = queryset.filter(priority=priority)
+
+    if department:
+        queryset = queryset.filter(assigned_department=department)
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    if submitted_at:
+        queryset = queryset.filter(submitted_at__date=submitted_at)
+
+    # Get all combinations of department and priority with their counts
+    stats = queryset.annotate(
+        department_name=F('assigned_department__department_name')
+    ).values(
+        'assigned_department',
+        'department_name',
+        'priority'
+    ).annotate(
+        resolved_tickets=Count('ticket_id', filter=Q(status__in=CLOSED_STATUSES)),
+        pending_tickets=Count('ticket_id', filter=~Q(status__in=CLOSED_STATUSES)),
+        total_tickets=Count('ticket_id')
+    ).order_by('assigned_department', 'priority')
+
+    filters_applied = {
+        'priority': priority,
+        'department': department,
+        'status': status_filter,
+        'submitted_at': submitted_at
+    }
+    return stats, filters_applied
+
+
+def parse_hour_minute(value):
+    hour, minute = map(int, value.split(':'))
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError("Invalid time format")
+    return hour, minute
+
+
+def filter_tat(queryset, params):
+    """Apply the priority, date and start_time/end_time filters of the TAT report.
+
+    Raises ValueError with a message for the client on invalid values.
+    """
+    priority = params.get('priority')
+    date = params.get('date')  # Format: YYYY-MM-DD
+    start_time = params.get('start_time')  # Format: HH:MM (24-hour)
+    end_time = params.get('end_time')  # Format: HH:MM (24-hour)
+
+    if priority:
+        if priority not in dict(Complaint.PRIORITY_CHOICES):
+            raise ValueError('Invalid priority value')
+        queryset = queryset.filter(priority=priority)
+
+    if date:
+        parsed_date = parse(date)
+        if not parsed_date:
+            raise ValueError("Invalid date format")
+
+        if start_time or end_time:
+            if start_time:
+                try:
+                    start_hour, start_minute = parse_hour_minute(start_time)
+                except ValueError:
+                    raise ValueError("Invalid start time format. Use HH:MM (24-hour)")
+                start_datetime = parsed_date.replace(hour=start_hour, minute=start_minute)
+            else:
+                # If no start time, use start of day
+                start_datetime = parsed_date.replace(hour=0, minute=0)
+
+            if end_time:
+                try:
+                    end_hour, end_minute = parse_hour_minute(end_time)
+                except ValueError:
+                    raise ValueError("Invalid end time format. Use HH:MM (24-hour)")
+                end_datetime = parsed_date.replace(hour=end_hour, minute=end_minute)
+            else:
+                # If no end time, use end of day
+                end_datetime = parsed_date.replace(hour=23, minute=59)
+
+            queryset = queryset.filter(
+                submitted_at__gte=start_datetime,
+                submitted_at__lte=end_datetime
+            )
+        else:
+            # If no time range, filter for the entire day
+            queryset = queryset.filter(submitted_at__date=parsed_date)
+    elif start_time or end_time:
+        # Only time filtering, across all dates
+        if start_time:
+            start_hour, start_minute = map(int, start_time.split(':'))
+            start_time_obj = time(start_hour, start_minute)
+        else:
+            start_time_obj = time(0, 0)
+        if end_time:
+            end_hour, end_minute = map(int, end_time.split(':'))
+            end_time_obj = time(end_hour, end_minute)
+        else:
+            end_time_obj = time(23, 59)
+        queryset = queryset.filter(
+            submitted_at__time__gte=start_time_obj,
+            submitted_at__time__lte=end_time_obj
+        )
+    return queryset
+
+
+def tat_filters_applied(params):
+    return {
+        'priority': params.get('priority'),
+        'date': params.get('date'),
+        'start_time': params.get('start_time'),
+        'end_time': params.get('end_time')
+    }
+
+
+def tat_error(message):
+    # Body of the 400 response for invalid TAT filters
+    return {
+        'error': message,
+        'message': 'Please use the following formats:',
+        'example': {
+            'date_only': '/api/tat/all_department_TATS/?date=2025-06-16',
+            'with_time_range': '/api/tat/all_department_TATS/?date=2025-06-16&start_time=09:00&end_time=17:00'
+        },
+        'format_guide': {
+            'date': 'YYYY-MM-DD (e.g., 2025-06-16)',
+            'time': 'HH:MM in 24-hour format (e.g., 09:00, 17:30)'
+        }
+    }
+
+
+# Average turnaround time of resolved tickets, use as .aggregate(avg_tat=AVERAGE_TAT)
+AVERAGE_TAT = Avg(
+    ExpressionWrapper(
+        F('resolved_at') - F('submitted_at'),
+        output_field=DurationField()
+    )
+)
+
+
+def resolved_tickets(queryset):
+    return queryset.filter(status__in=CLOSED_STATUSES, resolved_at__isnull=False)
+
+
+def format_timedelta(delta):
+    if not delta:
+        return "-"
+
+    total_seconds = int(delta.total_seconds())
+    total_hours = total_seconds // 3600
+    days = total_hours // 24
+    hours = total_hours % 24
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+
+    parts = []
+    if days > 0:
+        parts.append(f"{days} day{'s' if days != 1 else ''}")
+    if hours > 0:
+        parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes > 0:
+        parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    if seconds > 0:
+        parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+
+    return ', '.join(parts) or "0 minutes"
@@ -0,0 +1,92 @@
+"""Bulk import of rooms, POST /api/rooms/import/.
+
+The rows (a CSV file or a JSON list) are validated in memory: each with
+RoomImportSerializer, which checks the fields without a query, and all of them
+against the keys (Room.KEY_FIELDS) of the existing rooms with the same room
+numbers, read in one query. Rows with errors are reported by their number, the
+valid ones are inserted with one bulk_create, and their QR codes are rendered in
+the background after the commit (complaints.qr_codes). The unique_room
+constraint catches rooms added since the keys were read, in which case nothing is
+inserted.
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .bulk_writes import bulk_write
+from .models import Room
+from .qr_codes import schedule_qr_render
+from .serializers import DUPLICATE_ROOM, RoomImportSerializer
+
+
+class RoomImportError(ValueError):
+    """The request doesn't hold rows that can be imported."""
+
+
+def read_rows(request):
+    """The rows of an import request, a list of dicts with the Room field names as keys."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            reader = csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+            # Blank cells fall back to the field defaults, like a missing key in JSON
+            rows = [
+                {name.strip(): value.strip() for name, value in row.items() if name and value and value.strip()}
+                for row in reader
+            ]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise RoomImportError(f'Invalid CSV file: {e}')
+    elif isinstance(request.data, list):
+        rows = request.data
+    else:
+        raise RoomImportError('Send a CSV file as "file" or a JSON list of rooms')
+    if not rows:
+        raise RoomImportError('No rooms to import')
+    if len(rows) > settings.ROOM_IMPORT_MAX_ROWS:
+        raise RoomImportError(f'At most {settings.ROOM_IMPORT_MAX_ROWS} rooms can be imported at once')
+    return rows
+
+
+def room_key(data):
+    return tuple(data[field] for field in Room.KEY_FIELDS)
+
+
+def validate_rows(rows):
+    """(Rooms to create, errors) of the rows; errors are {'row': number from 1, 'errors': ...}."""
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        serializer = RoomImportSerializer(data=row) if isinstance(row, dict) else None
+        if serializer is None:
+            errors.append({'row': number, 'errors': {'non_field_errors': ['Expected an object of room fields.']}})
+        elif serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+
+    room_numbers = {data['room_no'] for _, data in valid}
+    seen = set(Room.objects.filter(room_no__in=room_numbers).values_list(*Room.KEY_FIELDS))
+    rooms = []
+    for number, data in valid:
+        key = room_key(data)
+        if key in seen:
+            errors.append({'row': number, 'errors': {'non_field_errors': [DUPLICATE_ROOM]}})
+            continue
+        # A room repeated in the batch is imported from its first row, the others are errors
+        seen.add(key)
+        rooms.append(Room(**data))
+    errors.sort(key=lambda error: error['row'])
+    return rooms, errors
+
+
+def create_rooms(rooms):
+    """Insert the rooms in one transaction, their QR codes are rendered once it commits."""
+    with transaction.atomic(), bulk_write('rooms'):
+        last_pk = Room.objects.aggregate(last=Max('pk'))['last'] or 0
+        created = Room.objects.bulk_create(rooms)
+        # Rendering takes tens of milliseconds a room, too long for the request. The
+        # rooms inserted by others in the meantime are skipped if their codes are current
+        schedule_qr_render({'pk__gt': last_pk})
+    return created
@@ -0,0 +1,16 @@
+"""Helpers shared by the bulk loaders of sample data: populate_realistic_data and
+the benchmark seeding (complaints.benchmarks)."""
+from contextlib import contextmanager
+
+from .models import Complaint
+
+
+@contextmanager
+def explicit_submitted_at():
+    # bulk_create would otherwise stamp every complaint with the same auto_now_add time
+    field = Complaint._meta.get_field('submitted_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
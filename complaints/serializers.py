@@ -1,21 +1,32 @@
 import hmac
+import logging
 import hashlib
 from django.conf import settings
 from rest_framework import serializers
-from .models import Room, Complaint, ComplaintImage, Department,Issue_Category
+from .models import Room, Complaint, ComplaintImage, Department,Issue_Category, ChunkedUpload
 from django.db import models
 from datetime import timedelta
 from django.utils import timezone
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+logger = logging.getLogger(__name__)
 
 class ComplaintImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ComplaintImage
-        fields = ['image']  # you can also include 'id' if needed
+        # List views should render the thumbnails and only load 'image' on the detail view
+        fields = ['image', 'thumbnail_small', 'thumbnail_medium']
+        read_only_fields = ('thumbnail_small', 'thumbnail_medium')
 
     def to_internal_value(self, data):
         return super().to_internal_value(data)
 
 
+DUPLICATE_ROOM = "A room with these exact details already exists. All fields (except status) must be unique together."
+
+
 class RoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = Room
@@ -50,10 +61,24 @@ class RoomSerializer(serializers.ModelSerializer):
                 existing_room = existing_room.exclude(pk=self.instance.pk)
 
             if existing_room.exists():
-                raise serializers.ValidationError(
-                    "A room with these exact details already exists. All fields (except status) must be unique together."
-                )
+                raise serializers.ValidationError(DUPLICATE_ROOM)
+
+        return data
+
+    def save(self, **kwargs):
+        # The check above races with concurrent writes, the unique_room constraint doesn't
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError(DUPLICATE_ROOM)
+
 
+class RoomImportSerializer(RoomSerializer):
+    """A row of POST /api/rooms/import/: the duplicates of the whole batch are checked
+    at once (complaints.room_import), not with a query per row."""
+
+    def validate(self, data):
         return data
 
 
@@ -128,34 +153,83 @@ class IssueCatSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Cannot assign issue category to an inactive department")
         return value
 
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ['upload_id', 'filename', 'total_size', 'offset', 'status', 'created_at', 'completed_at']
+        read_only_fields = ('upload_id', 'offset', 'status', 'created_at', 'completed_at')
+
+    def validate_total_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("total_size must be greater than zero.")
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Uploads are limited to {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.")
+        return value
+
+
+class UploadChunkSerializer(serializers.Serializer):
+    offset = serializers.IntegerField(min_value=0)
+    chunk = serializers.FileField()
+
+    def validate(self, data):
+        upload = self.context['upload']
+        if upload.status != 'uploading':
+            raise serializers.ValidationError("This upload is already complete.")
+        if data['offset'] > upload.offset:
+            # A gap would leave a hole in the file, the client must resume from upload.offset
+            raise serializers.ValidationError({'offset': f"Expected offset {upload.offset} or lower."})
+        if data['offset'] + data['chunk'].size > upload.total_size:
+            raise serializers.ValidationError({'chunk': "Chunk goes past the declared total_size."})
+        return data
+
+
 class ComplaintCreateSerializer(serializers.ModelSerializer):
     images = ComplaintImageSerializer(many=True,write_only=True,required=False)
+    # Completed chunked uploads to attach instead of (or in addition to) raw 'images' files
+    upload_ids = serializers.ListField(child=serializers.UUIDField(), write_only=True, required=False)
     room = serializers.PrimaryKeyRelatedField(queryset=Room.objects.all())
 
     def create(self, validated_data):
-        print("--- ComplaintCreateSerializer: create method ---")
-        print("Validated data:", validated_data)
         images_data = self.context['request'].FILES.getlist('images')
-        print("Images data:", images_data)
+        logger.debug("ComplaintCreateSerializer.create: validated data %s, images %s", validated_data, images_data)
         validated_data.pop('images', None)
+        uploads = validated_data.pop('upload_ids', [])
 
-        complaint = Complaint.objects.create(**validated_data)
+        with transaction.atomic():
+            complaint = Complaint.objects.create(**validated_data)
 
-        for image_file in images_data:
-            ComplaintImage.objects.create(complaint=complaint, image=image_file)
+            for image_file in images_data:
+                ComplaintImage.objects.create(complaint=complaint, image=image_file)
+
+            for upload in uploads:
+                # Claim the upload so a retried create can't attach it twice
+                claimed, _ = ChunkedUpload.objects.filter(pk=upload.pk, status='complete').delete()
+                if not claimed:
+                    raise serializers.ValidationError({'upload_ids': f"Upload {upload.upload_id} was already used."})
+                with upload.file.open('rb') as assembled:
+                    ComplaintImage.objects.create(complaint=complaint, image=File(assembled, name=upload.filename))
+                transaction.on_commit(lambda name=upload.file.name: default_storage.delete(name))
 
         return complaint
 
+    def validate_upload_ids(self, value):
+        upload_ids = list(dict.fromkeys(value))
+        uploads = list(ChunkedUpload.objects.filter(upload_id__in=upload_ids, status='complete'))
+        if len(uploads) != len(upload_ids):
+            found = {upload.upload_id for upload in uploads}
+            missing = [str(upload_id) for upload_id in upload_ids if upload_id not in found]
+            raise serializers.ValidationError(f"Uploads not found or not complete: {', '.join(missing)}")
+        return uploads
+
     def validate(self, data):
-        print("--- ComplaintCreateSerializer: validate method ---")
-        print("Initial data:", data)
+        logger.debug("ComplaintCreateSerializer.validate: initial data %s", data)
         issue_type = data.get('issue_type')
         room = data.get('room')
 
         try:
             issue_category = Issue_Category.objects.get(issue_category_name=issue_type, status='active')
             data['assigned_department'] = issue_category.department
-            print("Assigned department:", data['assigned_department'])
+            logger.debug("ComplaintCreateSerializer.validate: assigned department %s", data['assigned_department'])
         except Issue_Category.DoesNotExist:
             raise serializers.ValidationError({
                 'issue_type': 'Invalid or inactive issue category. Please select a valid issue category.'
@@ -175,12 +249,11 @@ class ComplaintCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'A complaint with the same issue type is already open or in progress for this room.'
                 )
-        print("Final data before return:", data)
         return data
 
     class Meta:
         model = Complaint
-        fields = ['room', 'issue_type', 'description', 'priority', 'images']
+        fields = ['room', 'issue_type', 'description', 'priority', 'images', 'upload_ids']
 
 
 from auth_app.models import CustomUser
@@ -197,6 +270,24 @@ class ComplaintSerializer(serializers.ModelSerializer):
         read_only_fields = ('ticket_id',)
 
 
+def status_transition(current_status, new_status, assigned_staff, now=None):
+    """The resolution fields to set when a ticket moves to new_status.
+
+    Raises ValidationError if the ticket can't move there from current_status.
+    """
+    if new_status == 'closed' and current_status != 'resolved':
+        raise serializers.ValidationError("A ticket can only be closed if it is already resolved.")
+
+    if new_status == 'resolved':
+        return {
+            'resolved_by': assigned_staff.username if assigned_staff else None,
+            'resolved_at': now or timezone.now(),
+        }
+    if new_status in ['open', 'in_progress', 'on_hold']:
+        return {'resolved_by': None, 'resolved_at': None}
+    return {}
+
+
 class ComplaintUpdateSerializer(serializers.ModelSerializer):
     images = ComplaintImageSerializer(many=True, write_only=True, required=False)
     assigned_department = serializers.SlugRelatedField(
@@ -223,24 +314,8 @@ class ComplaintUpdateSerializer(serializers.ModelSerializer):
 
         # If status is being updated
         if 'status' in validated_data:
-            new_status = validated_data['status']
-
-            if new_status == 'closed' and instance.status != 'resolved':
-                raise serializers.ValidationError("A ticket can only be closed if it is already resolved.")
-            
-            if new_status == 'resolved':
-                assigned_staff = validated_data.get('assigned_staff', instance.assigned_staff)
-
-                if assigned_staff:
-                    validated_data['resolved_by'] = assigned_staff.username
-                else:
-                    validated_data['resolved_by'] = None
-                
-                validated_data['resolved_at'] = timezone.now()
-            
-            elif new_status in ['open', 'in_progress', 'on_hold']:
-                validated_data['resolved_by'] = None
-                validated_data['resolved_at'] = None
+            assigned_staff = validated_data.get('assigned_staff', instance.assigned_staff)
+            validated_data.update(status_transition(instance.status, validated_data['status'], assigned_staff))
 
         complaint = super().update(instance, validated_data)
 
@@ -249,10 +324,29 @@ class ComplaintUpdateSerializer(serializers.ModelSerializer):
 
         return complaint
 
-class ComplaintImageSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ComplaintImage
-        fields = ['image']
+class BulkStatusSerializer(serializers.Serializer):
+    ticket_ids = serializers.ListField(child=serializers.CharField(max_length=12), allow_empty=False)
+    status = serializers.ChoiceField(choices=Complaint.STATUS_CHOICES)
+
+    def validate_ticket_ids(self, value):
+        if len(value) > settings.COMPLAINT_BULK_MAX_TICKETS:
+            raise serializers.ValidationError(f"At most {settings.COMPLAINT_BULK_MAX_TICKETS} tickets per request.")
+        # Duplicates are reported once
+        return list(dict.fromkeys(value))
+
+
+class RoomBulkStatusSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Room.STATUS_CHOICES)
+    ward = serializers.CharField(max_length=20, required=False)
+    Block = serializers.CharField(max_length=10, required=False)
+    Floor_no = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        # Without a filter every room in the hospital would change
+        if not data.keys() - {'status'}:
+            raise serializers.ValidationError("Give at least one of ward, Block or Floor_no.")
+        return data
+
 
 class ReportDepartment(serializers.ModelSerializer):
     room = RoomSerializer(read_only=True)
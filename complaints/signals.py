@@ -0,0 +1,108 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from auth_app.models import CustomUser
+from .bulk_writes import bulk_write
+from .events import record_event
+from .generations import bump
+from .models import Complaint, ComplaintImage, Department, Issue_Category, MediaBlob, Room
+
+
+@receiver(pre_save, sender=ComplaintImage)
+def remember_previous_image(sender, instance, update_fields=None, **kwargs):
+    # Only a new or replaced image changes the blob references
+    instance._previous_image = None
+    instance._image_changed = instance.pk is None or instance._state.adding
+    if not instance._image_changed and (update_fields is None or 'image' in update_fields):
+        instance._previous_image = (
+            ComplaintImage.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        )
+        instance._image_changed = instance._previous_image != instance.image.name
+
+
+@receiver(post_save, sender=ComplaintImage)
+def acquire_image_blob(sender, instance, **kwargs):
+    if not getattr(instance, '_image_changed', False):
+        return
+    instance._image_changed = False
+    if instance.image:
+        MediaBlob.acquire(instance.image.name)
+    if instance._previous_image:
+        MediaBlob.release(instance._previous_image)
+
+
+@receiver(post_delete, sender=ComplaintImage)
+def release_image_blob(sender, instance, **kwargs):
+    if instance.image:
+        MediaBlob.release(instance.image.name)
+
+
+@receiver(pre_save, sender=Complaint)
+def remember_previous_state(sender, instance, **kwargs):
+    instance._previous_state = None
+    if not instance._state.adding:
+        instance._previous_state = (
+            Complaint.objects.filter(pk=instance.pk).values_list('status', 'assigned_department_id').first()
+        )
+
+
+@receiver(post_save, sender=Complaint)
+def publish_complaint_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None:
+        record_event(instance, 'created')
+    elif previous[1] != instance.assigned_department_id:
+        record_event(instance, 'reassigned', previous_department_code=previous[1])
+    elif previous[0] != instance.status:
+        record_event(instance, 'status_changed')
+    else:
+        record_event(instance, 'updated')
+    instance._previous_state = (instance.status, instance.assigned_department_id)
+
+
+@receiver(post_delete, sender=Complaint)
+def publish_complaint_deleted(sender, instance, **kwargs):
+    record_event(instance, 'deleted')
+
+
+@receiver(pre_delete, sender=CustomUser)
+def unassign_deleted_staff(sender, instance, **kwargs):
+    # Done by Complaint.assigned_staff's SET_NULL otherwise, with an UPDATE that
+    # neither bumps updated_at nor records the change for the syncing clients
+    complaints = list(Complaint.objects.filter(assigned_staff=instance))
+    if not complaints:
+        return
+    with bulk_write() as write:
+        Complaint.objects.filter(pk__in=[complaint.pk for complaint in complaints]).update(
+            assigned_staff=None, updated_at=timezone.now()
+        )
+        write.record_events(complaints, 'updated')
+
+
+# Cache namespace of each model's data, see complaints.generations
+CACHE_NAMESPACES = {
+    Department: 'departments',
+    Issue_Category: 'issue_categories',
+    Room: 'rooms',
+    CustomUser: 'users',
+    Complaint: 'complaints',
+}
+
+
+# Connected per model: a receiver for every sender would stop Django from
+# fast-deleting the rows of the other models
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Issue_Category)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Complaint)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Issue_Category)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Complaint)
+def bump_cache_generation(sender, raw=False, **kwargs):
+    if not raw:
+        bump(CACHE_NAMESPACES[sender])
@@ -0,0 +1,51 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names every file after the SHA-256 of its content.
+
+    ``complaint_images/photo.gif`` is stored as ``complaint_images/ab/cd/abcd...ef.gif``,
+    so identical uploads end up as a single file and no directory holds more than
+    a few hundred entries. Reference counting of the stored blobs is done by
+    ``complaints.models.MediaBlob``.
+    """
+
+    def content_hash(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def hashed_name(self, name, digest):
+        depth = settings.CONTENT_ADDRESSED_SHARD_DEPTH
+        width = settings.CONTENT_ADDRESSED_SHARD_WIDTH
+        shards = [digest[i * width:(i + 1) * width] for i in range(depth)]
+        ext = os.path.splitext(name)[1].lower()[:6]
+        return '/'.join([os.path.dirname(name), *shards, digest + ext]).lstrip('/')
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        name = self.hashed_name(name, self.content_hash(content))
+        # Files without references are deleted under the lock of their blob row
+        # (MediaBlob.delete_files): hold it until the caller's transaction has counted
+        # the new reference, so the file can't go away under it
+        MediaBlob.lock(name)
+        if self.exists(name):
+            # Same bytes already stored, just point at them
+            return name
+        return super()._save(name, content)
+
+
+_complaint_image_storage = ContentAddressedStorage()
+
+
+def complaint_image_storage():
+    return _complaint_image_storage
@@ -1,10 +1,68 @@
-from django.test import TestCase
+import base64
+import csv
+import gc
+import json
+import os
+from io import BytesIO, StringIO
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from xml.etree import ElementTree
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.generics import GenericAPIView
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from auth_app.models import CustomUser
-from complaints.models import Complaint, Department
+from complaints.bulk_writes import bulk_write
+from complaints.benchmarks import BENCHMARK_ADMIN, BENCHMARK_DEPT_ADMIN, compare, run_benchmarks, seed_dataset
+from complaints.checks import check_directories
+from complaints.events import (
+    EventBus, Subscription, astream, decode_cursor, latest_event_id, release_connections, scoped_events, stream,
+)
+from complaints.loadtest import Stats, saturation_point
+from complaints.generations import generations
+from complaints.qr_codes import render_qr_codes
+from complaints.models import CacheGeneration, ChunkedUpload, Complaint, ComplaintEvent, ComplaintImage, Department, Issue_Category, MediaBlob, Room
+from complaints.report_cache import report_cache
 from complaints.serializers import ComplaintSerializer
+from complaintsystem.instrumentation import RequestStats, TimedSerializerMixin, current_request_stats
+from complaintsystem.metrics import REQUEST_LATENCY, registry
+from complaintsystem import slow_queries, warmup
+
+# 1x1 GIF, the same placeholder populate_realistic_data attaches
+GIF_BYTES = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+
+class TempMediaMixin:
+    """Points MEDIA_ROOT at a throwaway directory for the duration of the test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
 
 class DepartmentComplaintModelTest(TestCase):
     def test_department_creation(self):
@@ -157,3 +215,1267 @@ class ComplaintViewsTest(TestCase):
         response = self.client.delete(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Complaint.objects.count(), 2) # 3 from setup - 1 deleted
+
+
+class ComplaintImageVariantTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(department_code="IMG", department_name="Imaging")
+        self.complaint = Complaint.objects.create(
+            issue_type="Broken Light",
+            description="The light is broken.",
+            priority="low",
+            assigned_department=self.department,
+        )
+
+    def test_variants_generated_on_upload(self):
+        image = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='photo.gif'))
+        self.assertTrue(image.thumbnail_small.name.endswith('_small.jpg'))
+        self.assertTrue(image.thumbnail_medium.name.endswith('_medium.jpg'))
+        self.assertTrue(image.thumbnail_small.storage.exists(image.thumbnail_small.name))
+
+        data = ComplaintSerializer(self.complaint).data
+        self.assertIn('thumbnail_small', data['images'][0])
+        self.assertIn('thumbnail_medium', data['images'][0])
+
+    def test_backfill_command(self):
+        image = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='photo.gif'))
+        ComplaintImage.objects.filter(pk=image.pk).update(thumbnail_small=None, thumbnail_medium=None)
+
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+
+        image.refresh_from_db()
+        self.assertTrue(image.thumbnail_small)
+        self.assertTrue(image.thumbnail_medium)
+
+
+class ContentAddressedImageTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(department_code="CAS", department_name="Storage")
+        self.complaint = Complaint.objects.create(
+            issue_type="Leak",
+            description="Water on the floor.",
+            priority="medium",
+            assigned_department=self.department,
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='a.gif'))
+        second = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='b.gif'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^complaint_images/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(MediaBlob.objects.get(path=first.image.name).ref_count, 2)
+
+    def test_blob_deleted_with_last_reference(self):
+        first = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='a.gif'))
+        second = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='b.gif'))
+        name = first.image.name
+        storage = first.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(path=name).exists())
+
+    def test_upload_between_release_and_file_delete_keeps_file(self):
+        first = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='a.gif'))
+        name = first.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        # The same bytes are uploaded before the release's transaction deletes the file
+        second = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='b.gif'))
+        self.assertEqual(second.image.name, name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(second.image.storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(path=name).ref_count, 1)
+
+    def test_dedupe_command_moves_legacy_files(self):
+        storage = ComplaintImage._meta.get_field('image').storage
+        legacy = [FileSystemStorage().save(f'complaint_images/legacy{i}.gif', ContentFile(GIF_BYTES)) for i in range(2)]
+        images = [ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='c.gif')) for _ in legacy]
+        for image, name in zip(images, legacy):
+            ComplaintImage.objects.filter(pk=image.pk).update(image=name)
+        MediaBlob.objects.all().delete()
+
+        call_command('dedupe_complaint_images', stdout=StringIO())
+
+        for image in images:
+            image.refresh_from_db()
+        self.assertRegex(images[0].image.name, r'^complaint_images/[0-9a-f]{2}/')
+        self.assertEqual(images[0].image.name, images[1].image.name)
+        self.assertFalse(storage.exists(legacy[0]))
+        self.assertEqual(MediaBlob.objects.get(path=images[0].image.name).ref_count, 2)
+
+
+class ChunkedUploadTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.department = Department.objects.create(department_code="MNT", department_name="Maintenance", status="active")
+        Issue_Category.objects.create(
+            issue_category_code="ISC001", department=self.department, issue_category_name="Plumbing", status="active"
+        )
+        self.room = Room.objects.create(
+            bed_no="B1", room_no="101", Block="A", Floor_no=1, ward="General",
+            speciality="General", room_type="Single", status="active"
+        )
+
+    def put_chunk(self, upload_id, offset, data):
+        url = reverse('chunkedupload-chunk', kwargs={'pk': upload_id})
+        return self.client.put(url, {'offset': offset, 'chunk': ContentFile(data, name='part')}, format='multipart')
+
+    def test_resumable_upload_attached_to_complaint(self):
+        response = self.client.post(reverse('chunkedupload-list'), {'filename': 'leak.gif', 'total_size': len(GIF_BYTES)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data['upload_id']
+
+        self.assertEqual(self.put_chunk(upload_id, 0, GIF_BYTES[:20]).data['offset'], 20)
+        # A chunk past the received bytes is rejected with the offset to resume from
+        response = self.put_chunk(upload_id, 30, GIF_BYTES[30:])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 20)
+
+        response = self.put_chunk(upload_id, 20, GIF_BYTES[20:])
+        self.assertEqual(response.data['status'], 'complete')
+
+        response = self.client.post('/api/complaints/', {
+            'room': self.room.pk, 'issue_type': 'Plumbing', 'description': 'Leaking tap',
+            'priority': 'low', 'upload_ids': [upload_id],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        complaint = Complaint.objects.get()
+        self.assertEqual(complaint.images.count(), 1)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_incomplete_upload_cannot_be_attached(self):
+        response = self.client.post(reverse('chunkedupload-list'), {'filename': 'leak.gif', 'total_size': len(GIF_BYTES)}, format='json')
+        self.put_chunk(response.data['upload_id'], 0, GIF_BYTES[:10])
+
+        response = self.client.post('/api/complaints/', {
+            'room': self.room.pk, 'issue_type': 'Plumbing', 'description': 'Leaking tap',
+            'priority': 'low', 'upload_ids': [response.data['upload_id']],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('upload_ids', response.data)
+
+
+class ProtectedMediaTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.department = Department.objects.create(department_code="NUR", department_name="Nursing")
+        self.other_department = Department.objects.create(department_code="LAB", department_name="Laboratory")
+        self.complaint = Complaint.objects.create(
+            issue_type="Noise", description="Too loud.", priority="low", assigned_department=self.department,
+        )
+        self.image = ComplaintImage.objects.create(complaint=self.complaint, image=ContentFile(GIF_BYTES, name='a.gif'))
+        self.url = '/media/' + self.image.image.name
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+        self.outsider = CustomUser.objects.create_staffuser(
+            email="lab@example.com", username="lab", password="password123", department=self.other_department
+        )
+
+    def test_anonymous_rejected(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_department_cannot_see_image(self):
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_range_and_conditional_requests(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), GIF_BYTES)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(GIF_BYTES)}')
+        self.assertEqual(b''.join(response.streaming_content), GIF_BYTES[:10])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(MEDIA_SERVE_BACKEND='x-accel-redirect')
+    def test_accel_redirect(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.image.image.name)
+
+
+class OrphanedMediaTest(TempMediaMixin, TestCase):
+    def test_only_unreferenced_files_collected(self):
+        department = Department.objects.create(department_code="HOU", department_name="Housekeeping")
+        complaint = Complaint.objects.create(issue_type="Dust", description="Dusty.", priority="low", assigned_department=department)
+        image = ComplaintImage.objects.create(complaint=complaint, image=ContentFile(GIF_BYTES, name='a.gif'))
+        storage = FileSystemStorage()
+        orphan = storage.save('complaint_images/zz/orphan.gif', ContentFile(GIF_BYTES))
+        # Sorts between 'complaint_images/..' and 'complaint_images/' prefixed paths
+        sibling = storage.save('complaint_images.gif', ContentFile(GIF_BYTES))
+
+        output = StringIO()
+        call_command('collect_orphaned_media', dry_run=True, min_age_minutes=0, stdout=output)
+        self.assertIn(f'2 orphaned files. Would reclaim {2 * len(GIF_BYTES)} bytes', output.getvalue())
+        self.assertTrue(storage.exists(orphan))
+
+        call_command('collect_orphaned_media', delete=True, min_age_minutes=0, stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(storage.exists(sibling))
+        self.assertTrue(storage.exists(image.image.name))
+        self.assertTrue(storage.exists(image.thumbnail_small.name))
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn('serialize;dur=', timing)
+
+    def test_server_timing_header_is_off_by_default(self):
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_serialize_time_covers_view_serializers(self):
+        class SlowSerializer(serializers.Serializer):
+            name = serializers.SerializerMethodField()
+
+            def get_name(self, obj):
+                time.sleep(0.02)
+                return obj
+
+        class View(TimedSerializerMixin, GenericAPIView):
+            serializer_class = SlowSerializer
+
+        view = View(request=None, format_kwarg=None)
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            view.get_serializer(['a', 'b'], many=True).data
+            view.get_serializer('c').data
+            # Serializers built outside the views, and DRF itself, are left alone
+            SlowSerializer('d').data
+        finally:
+            current_request_stats.reset(token)
+        self.assertGreaterEqual(stats.serialize_time, 0.06)
+        self.assertLess(stats.serialize_time, 0.08)
+        self.assertEqual(serializers.Serializer.data.fget.__module__, 'rest_framework.serializers')
+
+    def test_structured_log_names_view_and_action(self):
+        with self.assertLogs('complaintsystem.performance', level='INFO') as logs:
+            self.client.get('/api/departments/')
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry['view'], 'DepartmentViewSet.list')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['db_queries'], 0)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self._metrics_dir = tempfile.mkdtemp()
+        self._metrics_override = override_settings(METRICS_DIR=self._metrics_dir)
+        self._metrics_override.enable()
+        registry.values = {}
+        self.client = APIClient()
+        self.department = Department.objects.create(department_code="ITS", department_name="IT Support", status="active")
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+
+    def tearDown(self):
+        self._metrics_override.disable()
+        shutil.rmtree(self._metrics_dir, ignore_errors=True)
+
+    def test_scrape_requires_master_admin(self):
+        staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff", password="password123", department=self.department
+        )
+        self.client.force_authenticate(user=staff)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_latency_histogram_aggregated_across_workers(self):
+        self.client.get('/api/departments/')
+        # Another worker process that served the same view twice
+        with open(os.path.join(self._metrics_dir, 'metrics_999999.json'), 'w') as f:
+            json.dump({'http_request_duration_seconds': {
+                'metric': REQUEST_LATENCY.describe(),
+                'samples': [[['DepartmentViewSet', 'list'], [2] + [0] * len(REQUEST_LATENCY.buckets) + [0.002, 2]]],
+            }}, f)
+
+        self.client.force_authenticate(user=self.admin)
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="DepartmentViewSet",action="list"} 3', body)
+        self.assertIn('# TYPE http_request_db_queries histogram', body)
+
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0.05)
+    def test_updates_of_an_idle_process_are_flushed(self):
+        counter = registry.counter('test_idle_updates_total', 'Updates made right before a process went idle.')
+        registry.flush()
+        path = os.path.join(self._metrics_dir, registry.filename)
+        counter.inc()
+
+        def written():
+            with open(path) as f:
+                return json.load(f).get('test_idle_updates_total')
+        # Within the interval of the last flush: the timer writes it
+        self.assertIsNone(written())
+        time.sleep(0.3)
+        self.assertEqual(written()['samples'], [[[], 1]])
+
+    def test_files_are_named_per_process_start(self):
+        # A later worker reusing a pid doesn't overwrite the dead one's counters
+        filename = registry.filename
+        self.assertTrue(filename.startswith(f'metrics_{os.getpid()}_'))
+        try:
+            registry.start_process()
+            self.assertNotEqual(registry.filename, filename)
+        finally:
+            registry.filename = filename
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self._profile_dir = tempfile.mkdtemp()
+        self._profile_override = override_settings(PROFILE_DIR=self._profile_dir)
+        self._profile_override.enable()
+        self.client = APIClient()
+        self.department = Department.objects.create(department_code="ITS", department_name="IT Support", status="active")
+
+    def tearDown(self):
+        self._profile_override.disable()
+        shutil.rmtree(self._profile_dir, ignore_errors=True)
+
+    def login(self, user):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+
+    def test_master_admin_request_is_profiled(self):
+        self.login(CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123"))
+        response = self.client.get('/api/report/all_department_stats/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_id = response['X-Profile-Id']
+        self.assertIn('ReportViewSet.all_department_stats', profile_id)
+        for suffix in ('.prof', '.txt', '.sql.json'):
+            self.assertTrue(os.path.exists(os.path.join(self._profile_dir, profile_id + suffix)))
+        with open(os.path.join(self._profile_dir, profile_id + '.sql.json')) as f:
+            self.assertGreater(json.load(f)['query_count'], 0)
+
+    def test_other_roles_are_not_profiled(self):
+        self.login(CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff", password="password123", department=self.department
+        ))
+        response = self.client.get('/api/report/all_department_stats/?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self._profile_dir), [])
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        fd, self._log_file = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self._override = override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN=False, SLOW_QUERY_LOG_FILE=self._log_file,
+        )
+        self._override.enable()
+
+    def tearDown(self):
+        self._override.disable()
+        os.remove(self._log_file)
+
+    def read_log(self):
+        with open(self._log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            slow_queries.fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b = 42 AND c IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)",
+        )
+
+    def test_slow_queries_are_logged_and_reported(self):
+        Department.objects.filter(department_code="ITS").count()
+        Department.objects.filter(department_code="ENG").count()
+        entries = [entry for entry in self.read_log() if 'complaints_department' in entry['sql']]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['shape_id'], entries[1]['shape_id'])
+        self.assertTrue(any('tests.py' in frame for frame in entries[0]['stack']))
+
+        out = StringIO()
+        call_command('slow_query_report', file=self._log_file, json=True, stdout=out)
+        shape = next(s for s in json.loads(out.getvalue()) if s['shape_id'] == entries[0]['shape_id'])
+        self.assertEqual(shape['count'], 2)
+
+    def test_explain_returns_plan(self):
+        plan = slow_queries.explain('default', 'SELECT * FROM complaints_department WHERE department_code = %s', ['ITS'])
+        self.assertTrue(plan)
+
+
+class BenchmarkTest(TestCase):
+    def test_benchmarks_run_and_compare(self):
+        seed_dataset(rooms=10, complaints=200)
+        self.assertEqual(Complaint.objects.count(), 200)
+        self.assertEqual(ComplaintEvent.objects.filter(event_type='created').count(), 200)
+
+        results = run_benchmarks(iterations=2, warmup=0, only=['complaint_list', 'report_all_department_stats', 'complaint_create'])
+        self.assertEqual(set(results['results']), {'complaint_list', 'report_all_department_stats', 'complaint_create'})
+        self.assertGreater(results['results']['complaint_list']['queries'], 0)
+        # The created complaints are rolled back
+        self.assertEqual(Complaint.objects.count(), 200)
+
+        self.assertEqual(compare(results, results), [])
+        baseline = json.loads(json.dumps(results))
+        baseline['results']['complaint_list']['queries'] -= 1
+        self.assertEqual(len(compare(results, baseline)), 1)
+
+
+class PopulateRealisticDataTest(TempMediaMixin, TestCase):
+    def populate(self, **options):
+        call_command('populate_realistic_data', rooms=6, complaints=40, users=5, seed=7, workers=1, stdout=StringIO(), **options)
+        return list(Complaint.objects.order_by('ticket_id').values_list('ticket_id', 'room__room_no', 'description', 'status'))
+
+    def test_bulk_population_is_deterministic(self):
+        first = self.populate(skip_qr=True)
+        self.assertEqual(len(first), 40)
+        self.assertEqual(first[0][0], 'HOS000000000')
+        self.assertFalse(Room.objects.exclude(qr_code='').exclude(qr_code__isnull=True).exists())
+        self.assertEqual(first, self.populate(skip_qr=True))
+        # The bulk inserts are in the changes feed, the cleared run's events are gone
+        events = list(ComplaintEvent.objects.order_by('ticket_id').values_list('ticket_id', 'event_type'))
+        self.assertEqual(events, [(row[0], 'created') for row in first])
+
+    def test_images_share_one_blob_and_rooms_get_qr_codes(self):
+        self.populate(image_ratio=1)
+        images = ComplaintImage.objects.count()
+        self.assertGreaterEqual(images, 40)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, images)
+        self.assertEqual(Room.objects.filter(qr_code__startswith='qr_codes/').count(), 6)
+        self.assertTrue(CustomUser.objects.get(username='admin').check_password('password123'))
+
+
+class ClearDataTest(TempMediaMixin, TestCase):
+    def test_fast_clear_removes_rows_and_media(self):
+        department = Department.objects.create(department_code="NUR", department_name="Nursing")
+        room = Room.objects.create(room_no="101", bed_no="B1", Block="A", Floor_no=1, ward="General", speciality="General", room_type="Single", status="active")
+        complaint = Complaint.objects.create(room=room, issue_type="Leak", description="Leak", priority="low", assigned_department=department)
+        ComplaintImage.objects.create(complaint=complaint, image=ContentFile(GIF_BYTES, name='leak.gif'))
+        staff = CustomUser.objects.create_staffuser(email="staff@example.com", username="staff", password="password123", department=department)
+        admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123", department=department)
+        media_root = FileSystemStorage().location
+        self.assertTrue(os.listdir(os.path.join(media_root, 'complaint_images')))
+
+        out = StringIO()
+        call_command('clear_data', fast=True, batch_size=1, stdout=out)
+        self.assertIn('tables:', out.getvalue())
+        for model in (ComplaintImage, MediaBlob, Complaint, Room, Department):
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertFalse(CustomUser.objects.filter(pk=staff.pk).exists())
+        admin.refresh_from_db()
+        self.assertIsNone(admin.department)
+        self.assertEqual(os.listdir(os.path.join(media_root, 'complaint_images')), [])
+        self.assertEqual(os.listdir(os.path.join(media_root, 'qr_codes')), [])
+
+    @override_settings(COMPLAINT_CHANGES_SETTLE_SECONDS=0)
+    def test_fast_clear_expires_change_cursors(self):
+        department = Department.objects.create(department_code="NUR", department_name="Nursing")
+        admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+        client = APIClient()
+        client.cookies['access_token'] = str(AccessToken.for_user(admin))
+        Complaint.objects.create(issue_type="Leak", description="Leak", priority="low", assigned_department=department)
+        cursor = client.get('/api/complaints/changes/').json()['cursor']
+
+        call_command('clear_data', fast=True, stdout=StringIO())
+        self.assertFalse(ComplaintEvent.objects.exists())
+        # No deletion events were recorded: the client has to reload its list
+        response = client.get('/api/complaints/changes/', {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.json()['reset'])
+
+        cursor = client.get('/api/complaints/changes/').json()['cursor']
+        department = Department.objects.create(department_code="NUR", department_name="Nursing")
+        complaint = Complaint.objects.create(issue_type="Leak", description="Leak", priority="low", assigned_department=department)
+        response = client.get('/api/complaints/changes/', {'cursor': cursor})
+        self.assertEqual([c['ticket_id'] for c in response.json()['changed']], [complaint.ticket_id])
+
+
+class LoadTestReportTest(TestCase):
+    def test_summary_and_saturation(self):
+        stats = Stats()
+        for latency in (0.01, 0.02, 0.03, 0.04):
+            stats.record('GET /api/complaints/', latency, 200)
+        stats.record('POST /api/complaints/', 0.05, 400)
+        stats.record('POST /api/complaints/', 0.06, 'ReadTimeout')
+        summary = stats.summary(duration=2)
+        self.assertEqual(summary['requests'], 6)
+        self.assertEqual(summary['rps'], 3)
+        self.assertEqual(summary['endpoints']['GET /api/complaints/']['p50_ms'], 30)
+        self.assertEqual(summary['endpoints']['POST /api/complaints/']['rejected'], 1)
+        self.assertEqual(summary['errors'], 1)
+
+        stages = [(5, {'rps': 100}), (10, {'rps': 180}), (20, {'rps': 185}), (40, {'rps': 150})]
+        self.assertEqual(saturation_point(stages), 10)
+        self.assertIsNone(saturation_point(stages[:2]))
+
+
+class WarmupTest(TestCase):
+    def test_preload_and_worker_warmup(self):
+        Department.objects.create(department_name='Housekeeping')
+        try:
+            warmup.preload()
+        finally:
+            gc.unfreeze()
+        with self.assertNoLogs('complaintsystem.warmup', 'WARNING'):
+            warmup.worker()
+
+    def test_hooks_without_preload(self):
+        # The hooks in the order gunicorn runs them in a worker when the master
+        # didn't load the app, in a fresh interpreter where Django isn't set up
+        script = (
+            "import os, runpy\n"
+            "from gunicorn.util import import_app\n"
+            "conf = runpy.run_path('gunicorn.conf.py')\n"
+            "assert not conf['preload_app'] and conf['warmup']\n"
+            "conf['when_ready'](None)\n"
+            "conf.get('post_fork', lambda server, worker: None)(None, None)\n"
+            "import_app(conf['wsgi_app'])\n"
+            "conf['post_worker_init'](None)\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='complaintsystem.settings', GUNICORN_PRELOAD='False', GUNICORN_WARMUP='True')
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn('AppRegistryNotReady', result.stderr)
+
+
+class StartupTest(TestCase):
+    # Seconds django.setup() may take in a fresh interpreter (about 0.3s on a developer machine)
+    STARTUP_BUDGET = 3.0
+
+    def test_setup_skips_heavy_imports_within_budget(self):
+        script = (
+            "import os, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import django\n"
+            "django.setup()\n"
+            "print(time.perf_counter() - started)\n"
+            "print(','.join(name for name in ('qrcode', 'PIL') if name in sys.modules))\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='complaintsystem.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True,
+        )
+        seconds, heavy = result.stdout.splitlines()
+        self.assertEqual(heavy, '', 'imported at startup, load it lazily')
+        self.assertLess(float(seconds), self.STARTUP_BUDGET)
+
+    def test_check_creates_directories(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        media_root = os.path.join(root, 'media')
+        with override_settings(MEDIA_ROOT=media_root, STATICFILES_DIRS=[os.path.join(root, 'static')]):
+            self.assertEqual(check_directories(None), [])
+        self.assertTrue(os.path.isdir(os.path.join(media_root, 'complaint_images')))
+        self.assertTrue(os.path.isdir(os.path.join(root, 'static')))
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        seed_dataset(rooms=10, complaints=60)
+        # Some resolved tickets for the average TAT
+        Complaint.objects.filter(status__in=['resolved', 'closed'], resolved_at__isnull=True).update(resolved_at=F('submitted_at'))
+        self.client = APIClient()
+
+    def login(self, username):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(CustomUser.objects.get(username=username)))
+
+    def assertSameAsSync(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        response = self.client.get(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Same body, apart from the next/previous links pointing at the async endpoint
+        self.assertEqual(
+            json.loads(response.content.decode().replace('/api/async/', '/api/')),
+            json.loads(json.dumps(expected.data)),
+        )
+
+    def test_matches_sync_views(self):
+        for username in (BENCHMARK_ADMIN, BENCHMARK_DEPT_ADMIN):
+            self.login(username)
+            for query in ('', '?limit=5&offset=5', '?status=open&ordering=priority', '?search=10'):
+                self.assertSameAsSync(f'/api/complaints/{query}', f'/api/async/complaints/{query}')
+            for query in ('', '?priority=high', '?priority=urgent'):
+                self.assertSameAsSync(f'/api/report/all_department_stats/{query}', f'/api/async/report/all_department_stats/{query}')
+            for query in ('', '?priority=low&limit=3', '?start_time=25:00'):
+                self.assertSameAsSync(f'/api/TATView/all_department_TATS/{query}', f'/api/async/TATView/all_department_TATS/{query}')
+
+    def test_department_scoping(self):
+        self.login(BENCHMARK_DEPT_ADMIN)
+        department = CustomUser.objects.get(username=BENCHMARK_DEPT_ADMIN).department
+        response = self.client.get('/api/async/complaints/?limit=100')
+        self.assertEqual(response.json()['count'], Complaint.objects.filter(assigned_department=department).count())
+
+    def test_requires_authentication(self):
+        response = self.client.get('/api/async/complaints/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.cookies['access_token'] = 'invalid'
+        response = self.client.get('/api/async/report/all_department_stats/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_served_under_asgi(self):
+        user = await CustomUser.objects.aget(username=BENCHMARK_ADMIN)
+        client = AsyncClient()
+        client.cookies['access_token'] = str(AccessToken.for_user(user))
+        response = await client.get('/api/async/TATView/all_department_TATS/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_tickets'], 60)
+        # PerformanceMiddleware counts the queries run on the ORM's worker thread
+        with self.settings(PERFORMANCE_SERVER_TIMING=True):
+            response = await client.get('/api/async/TATView/all_department_TATS/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+
+class RoomImportTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.admin))
+        Room.objects.create(
+            room_no="101", bed_no="B1", Block="A", Floor_no=1, ward="General", speciality="General", room_type="Single"
+        )
+
+    def room(self, **fields):
+        return {'room_no': '102', 'bed_no': 'B1', 'Block': 'A', 'Floor_no': 1, 'ward': 'General',
+                'speciality': 'General', 'room_type': 'Single', **fields}
+
+    def test_json_import_reports_row_errors(self):
+        rows = [self.room(), self.room(room_no='101'), self.room(Floor_no='first'), self.room(bed_no='B2', status='active'), self.room()]
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/rooms/import/', rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 5])
+        self.assertIn('Floor_no', response.data['errors'][1]['errors'])
+        self.assertEqual(Room.objects.filter(room_no='102').count(), 2)
+        self.assertEqual(Room.objects.get(room_no='102', bed_no='B2').status, 'active')
+        # QR codes are rendered after the commit, outside the request
+        self.assertTrue(any(callback.__module__ == 'complaints.qr_codes' for callback in callbacks))
+        self.assertFalse(Room.objects.filter(room_no='102', dataenc__isnull=False).exists())
+        self.assertEqual(render_qr_codes({'room_no': '102'}), 2)
+        self.assertTrue(all(room.qr_code and room.dataenc for room in Room.objects.filter(room_no='102')))
+        # No query per row: the existing keys are read once
+        self.assertEqual(sum('"complaints_room"."room_no" IN' in query['sql'] for query in context.captured_queries), 1)
+
+    def test_csv_import(self):
+        content = 'room_no,bed_no,Block,Floor_no,ward,speciality,room_type,status\n201,B1,B,2,ICU,ICU,ICU,\n201,B2,B,2,ICU,ICU,ICU,active\n'
+        upload = ContentFile(content.encode('utf-8-sig'), name='rooms.csv')
+        response = self.client.post('/api/rooms/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'created': 2, 'errors': []})
+        self.assertEqual(dict(Room.objects.filter(room_no='201').values_list('bed_no', 'status')), {'B1': 'inactive', 'B2': 'active'})
+
+    @override_settings(ROOM_IMPORT_MAX_ROWS=2)
+    def test_invalid_imports(self):
+        self.assertEqual(self.client.post('/api/rooms/import/', [], format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/api/rooms/import/', {'room_no': '1'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = [self.room(bed_no=f'B{i}') for i in range(3)]
+        self.assertEqual(self.client.post('/api/rooms/import/', too_many, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/rooms/import/', [self.room(room_no='101')], format='json')
+        self.assertEqual((response.status_code, response.data['created']), (status.HTTP_400_BAD_REQUEST, 0))
+
+    def test_constraint_backs_the_serializer(self):
+        # RoomSerializer.validate skips its query for a ground floor (Floor_no=0), the constraint doesn't
+        self.assertEqual(self.client.post('/api/rooms/', self.room(Floor_no=0), format='json').status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/rooms/', self.room(Floor_no=0), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Room.objects.filter(room_no='102').count(), 1)
+
+
+class RoomBulkStatusTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.admin))
+        for i, (ward, floor) in enumerate([('General', 1), ('General', 1), ('General', 2), ('ICU', 1)]):
+            Room.objects.create(
+                room_no=str(100 + i), bed_no="B1", Block="A", Floor_no=floor, ward=ward, speciality="General", room_type="Single"
+            )
+
+    def test_single_update_and_background_render(self):
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/rooms/bulk_status/', {'status': 'active', 'ward': 'General', 'Floor_no': 1}, format='json')
+        self.assertEqual(response.data, {'updated': 2, 'status': 'active'})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "complaints_room"') for query in context.captured_queries), 1)
+        self.assertTrue(any(callback.__module__ == 'complaints.qr_codes' for callback in callbacks))
+        self.assertEqual(
+            sorted(Room.objects.filter(status='active').values_list('room_no', flat=True)), ['100', '101'],
+        )
+
+        # The QR codes still hold the old status until the background render
+        stale = Room.objects.get(room_no='100')
+        self.assertNotEqual(stale.dataenc, stale.get_room_data())
+        self.assertEqual(render_qr_codes({'ward': 'General'}), 2)
+        stale.refresh_from_db()
+        self.assertEqual(stale.dataenc, stale.get_room_data())
+        self.assertEqual(render_qr_codes({'ward': 'General'}), 0)
+
+    def test_command_renders_stale_rooms(self):
+        # A bulk change whose background render was lost with its worker
+        Room.objects.filter(ward='General').update(status='active')
+        out = StringIO()
+        call_command('render_room_qr_codes', ward='General', floor=1, stdout=out)
+        self.assertIn('Re-rendered 2 stale', out.getvalue())
+        self.assertEqual(
+            [room.dataenc == room.get_room_data() for room in Room.objects.filter(ward='General').order_by('room_no')],
+            [True, True, False],
+        )
+        call_command('render_room_qr_codes', stdout=out)
+        self.assertIn('Re-rendered 1 stale', out.getvalue())
+
+    def test_unchanged_rooms_schedule_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/rooms/bulk_status/', {'status': 'inactive', 'Block': 'A'}, format='json')
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual(callbacks, [])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post('/api/rooms/bulk_status/', {'status': 'active'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/rooms/bulk_status/', {'status': 'closed', 'ward': 'ICU'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchRetrieveTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pharmacy = Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+        self.laundry = Department.objects.create(department_code="LAU", department_name="Laundry", status="active")
+        self.staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff", password="password123", department=self.pharmacy,
+        )
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.staff))
+
+    def complaint(self, department):
+        return Complaint.objects.create(
+            issue_type="Leak", description="Tap leaking", priority="high", assigned_department=department
+        )
+
+    def test_request_order_scoping_and_missing(self):
+        first, second = self.complaint(self.pharmacy), self.complaint(self.pharmacy)
+        elsewhere = self.complaint(self.laundry)
+        response = self.client.get(
+            f'/api/complaints/batch/?ticket_ids={second.ticket_id},SVN00000&ticket_ids={first.ticket_id},{elsewhere.ticket_id},{second.ticket_id}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['ticket_id'] for c in response.data['results']], [second.ticket_id, first.ticket_id])
+        self.assertEqual(response.data['results'][0], ComplaintSerializer(second, context={'request': response.wsgi_request}).data)
+        self.assertEqual(response.data['missing'], ['SVN00000', elsewhere.ticket_id])
+
+    def test_queries_dont_grow_with_the_batch(self):
+        def queries(count):
+            ticket_ids = ','.join(self.complaint(self.pharmacy).ticket_id for _ in range(count))
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(f'/api/complaints/batch/?ticket_ids={ticket_ids}')
+            self.assertEqual(len(response.data['results']), count)
+            return len(context)
+        self.assertEqual(queries(2), queries(20))
+
+    @override_settings(COMPLAINT_BATCH_MAX_TICKETS=2)
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/complaints/batch/').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/complaints/batch/?ticket_ids=SVN1,SVN2,SVN3')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkStatusTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pharmacy = Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+        self.laundry = Department.objects.create(department_code="LAU", department_name="Laundry", status="active")
+        self.admin = CustomUser.objects.create_user(
+            email="dept@example.com", username="dept", password="password123", role='dept_admin', department=self.pharmacy,
+        )
+        self.staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="nurse", password="password123", department=self.pharmacy,
+        )
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.admin))
+
+    def complaint(self, department=None, **kwargs):
+        return Complaint.objects.create(
+            issue_type="Leak", description="Tap leaking", priority="high", assigned_department=department or self.pharmacy, **kwargs
+        )
+
+    def bulk(self, ticket_ids, new_status):
+        return self.client.post('/api/complaints/bulk_status/', {'ticket_ids': ticket_ids, 'status': new_status}, format='json')
+
+    def test_per_ticket_results(self):
+        resolved = self.complaint(status='resolved')
+        still_open = self.complaint()
+        closed = self.complaint(status='closed')
+        elsewhere = self.complaint(self.laundry, status='resolved')
+        ticket_ids = [resolved.ticket_id, still_open.ticket_id, closed.ticket_id, elsewhere.ticket_id, 'SVN00000', resolved.ticket_id]
+
+        response = self.bulk(ticket_ids, 'closed')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(
+            [(r['ticket_id'], r['result']) for r in response.data['results']],
+            [(resolved.ticket_id, 'updated'), (still_open.ticket_id, 'rejected'), (closed.ticket_id, 'unchanged'),
+             (elsewhere.ticket_id, 'not_found'), ('SVN00000', 'not_found')],
+        )
+        self.assertEqual(response.data['results'][1]['error'], "A ticket can only be closed if it is already resolved.")
+        self.assertEqual(Complaint.objects.get(pk=resolved.pk).status, 'closed')
+        self.assertEqual(Complaint.objects.get(pk=elsewhere.pk).status, 'resolved')
+        self.assertTrue(ComplaintEvent.objects.filter(ticket_id=resolved.ticket_id, event_type='status_changed').exists())
+
+    def test_resolution_bookkeeping(self):
+        assigned = self.complaint(assigned_staff=self.staff)
+        unassigned = self.complaint()
+        before = Complaint.objects.get(pk=assigned.pk).updated_at
+        self.bulk([assigned.ticket_id, unassigned.ticket_id], 'resolved')
+        assigned.refresh_from_db()
+        unassigned.refresh_from_db()
+        self.assertEqual((assigned.resolved_by, unassigned.resolved_by), ('nurse', None))
+        self.assertIsNotNone(unassigned.resolved_at)
+        self.assertGreater(assigned.updated_at, before)
+
+        self.bulk([assigned.ticket_id], 'in_progress')
+        assigned.refresh_from_db()
+        self.assertEqual((assigned.status, assigned.resolved_by, assigned.resolved_at), ('in_progress', None, None))
+
+    def test_queries_dont_grow_with_the_batch(self):
+        def queries(count):
+            ticket_ids = [self.complaint(status='resolved').ticket_id for _ in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.bulk(ticket_ids, 'closed').data['updated'], count)
+            return len(context)
+        self.assertEqual(queries(2), queries(20))
+
+    @override_settings(COMPLAINT_BULK_MAX_TICKETS=2)
+    def test_invalid_requests(self):
+        self.assertEqual(self.bulk(['SVN1'], 'done').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk([], 'closed').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk(['SVN1', 'SVN2', 'SVN3'], 'closed').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pharmacy = Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+        self.laundry = Department.objects.create(department_code="LAU", department_name="Laundry", status="active")
+        room = Room.objects.create(
+            room_no="101", bed_no="B1", Block="A", Floor_no=1, ward="General", speciality="General", room_type="General"
+        )
+        self.resolved = Complaint.objects.create(
+            room=room, issue_type="Leak", description="=HYPERLINK(\"x\")", priority="high",
+            assigned_department=self.pharmacy, status="resolved",
+        )
+        Complaint.objects.filter(pk=self.resolved.pk).update(resolved_at=F('submitted_at') + timedelta(hours=2))
+        Complaint.objects.create(issue_type="Noise", description="Loud fan", priority="low", assigned_department=self.pharmacy)
+        Complaint.objects.create(issue_type="Linen", description="Dirty sheets", priority="low", assigned_department=self.laundry)
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", username="admin", password="password123")
+        self.staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff", password="password123", department=self.pharmacy,
+        )
+
+    def download(self, url, user=None):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user or self.admin))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment; filename=', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def csv_rows(self, url, user=None):
+        return list(csv.reader(StringIO(self.download(url, user).decode())))
+
+    def test_complaints_csv_honors_filters_and_scope(self):
+        rows = self.csv_rows('/api/complaints/export/')
+        self.assertEqual(rows[0][:2], ['Ticket ID', 'Submitted at'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len(self.csv_rows('/api/complaints/export/?priority=low')), 3)
+        staff_rows = self.csv_rows('/api/complaints/export/', user=self.staff)
+        self.assertEqual({row[11] for row in staff_rows[1:]}, {"Pharmacy"})
+        # Formulas typed into a description come out as text
+        resolved = next(row for row in rows if row[0] == self.resolved.ticket_id)
+        self.assertEqual(resolved[8], "'=HYPERLINK(\"x\")")
+        self.assertEqual(resolved[2:4], ["101", "B1"])
+
+    def test_complaints_xlsx(self):
+        content = self.download('/api/complaints/export/?file_type=xlsx')
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        rows = sheet.findall(f'{namespace}sheetData/{namespace}row')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0].find(f'{namespace}c/{namespace}is/{namespace}t').text, 'Ticket ID')
+
+    def test_tat_export(self):
+        rows = self.csv_rows('/api/TATView/export/?priority=high')
+        self.assertEqual(rows[0][5], 'TAT')
+        self.assertEqual(rows[1][0], self.resolved.ticket_id)
+        self.assertEqual(rows[1][5], '2 hours')
+
+    def test_invalid_parameters(self):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.admin))
+        response = self.client.get('/api/complaints/export/?file_type=pdf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/TATView/export/?date=2025-06-16&start_time=25:00')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReportCacheTest(TestCase):
+    def setUp(self):
+        report_cache().clear()
+        seed_dataset(rooms=10, complaints=60)
+        self.client = APIClient()
+
+    def login(self, username):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(CustomUser.objects.get(username=username)))
+
+    def cache_requests(self, endpoint, result):
+        return registry.values.get('cache_requests_total', {}).get((f'reports.{endpoint}', result), 0)
+
+    def test_hit_for_the_same_filters_in_any_order(self):
+        self.login(BENCHMARK_ADMIN)
+        hits = self.cache_requests('all_department_stats', 'hit')
+        first = self.client.get('/api/report/all_department_stats/?priority=high&limit=5')
+        second = self.client.get('/api/report/all_department_stats/?limit=5&priority=high')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.cache_requests('all_department_stats', 'hit'), hits + 1)
+        # Errors aren't cached
+        self.client.get('/api/report/all_department_stats/?priority=urgent')
+        self.assertEqual(self.client.get('/api/report/all_department_stats/?priority=urgent')['X-Cache'], 'MISS')
+
+    def test_complaint_write_invalidates(self):
+        self.login(BENCHMARK_ADMIN)
+        before = self.client.get('/api/TATView/all_department_TATS/').json()['total_tickets']
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.create(
+                issue_type="Leak", description="Tap leaking", priority="high",
+                assigned_department=Department.objects.first(),
+            )
+        response = self.client.get('/api/TATView/all_department_TATS/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['total_tickets'], before + 1)
+
+    def test_scoped_by_department(self):
+        self.login(BENCHMARK_ADMIN)
+        everything = self.client.get('/api/TATView/all_department_TATS/').json()
+        self.login(BENCHMARK_DEPT_ADMIN)
+        response = self.client.get('/api/TATView/all_department_TATS/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        department = CustomUser.objects.get(username=BENCHMARK_DEPT_ADMIN).department
+        self.assertEqual(response.json()['total_tickets'], Complaint.objects.filter(assigned_department=department).count())
+        self.assertLess(response.json()['total_tickets'], everything['total_tickets'])
+
+    def test_async_views_are_cached(self):
+        self.login(BENCHMARK_ADMIN)
+        first = self.client.get('/api/async/report/all_department_stats/')
+        second = self.client.get('/api/async/report/all_department_stats/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.json(), first.json())
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.filter(pk=first.json()['results'][0]['assigned_department']).get().save()
+        self.assertEqual(self.client.get('/api/async/report/all_department_stats/')['X-Cache'], 'MISS')
+
+
+class CacheGenerationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.department = Department.objects.create(department_code="ITS", department_name="IT Support", status="active")
+        generations.last_check = None
+
+    def version(self, namespace):
+        return CacheGeneration.objects.get(namespace=namespace).version
+
+    def test_writes_bump_their_namespace(self):
+        departments, rooms = self.version('departments'), self.version('rooms')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.department.department_name = "IT"
+            self.department.save()
+            # Not before the commit
+            self.assertEqual(self.version('departments'), departments)
+        self.assertGreater(self.version('departments'), departments)
+        self.assertEqual(self.version('rooms'), rooms)
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.create(issue_type="Leak", description="x", priority="low", assigned_department=self.department)
+            user = CustomUser.objects.create_staffuser(
+                email="staff@example.com", username="staff", password="password123", department=self.department
+            )
+        self.assertGreater(self.version('complaints'), 0)
+        versions = self.version('users')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertGreater(self.version('users'), versions)
+
+    def test_bulk_writes_bump_and_record_events(self):
+        rooms, complaints = self.version('rooms'), self.version('complaints')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic(), bulk_write('rooms'):
+                Room.objects.update(status='inactive')
+                raise IntegrityError
+        # A rolled back write bumps nothing
+        self.assertEqual(self.version('rooms'), rooms)
+
+        complaint = Complaint(ticket_id="BLK00001", issue_type="Leak", description="x", priority="low", assigned_department=self.department)
+        with self.captureOnCommitCallbacks(execute=True):
+            with bulk_write('rooms') as write:
+                Complaint.objects.bulk_create([complaint])
+                write.record_events([complaint], 'created')
+                self.assertEqual(self.version('complaints'), complaints)
+        self.assertGreater(self.version('rooms'), rooms)
+        # Recording events writes to the complaints
+        self.assertGreater(self.version('complaints'), complaints)
+        self.assertEqual(list(ComplaintEvent.objects.values_list('ticket_id', 'event_type')), [("BLK00001", 'created')])
+
+    def test_catalog_follows_writes_of_other_workers(self):
+        self.assertEqual(self.client.get('/api/departments/')['X-Cache'], 'MISS')
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        # Another worker renames the department: the row and the counter change, no signal runs here
+        Department.objects.filter(pk="ITS").update(department_name="IT Helpdesk")
+        CacheGeneration.objects.filter(namespace='departments').update(version=F('version') + 1)
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['department_name'], "IT Helpdesk")
+
+    @override_settings(CACHE_GENERATION_CHECK_INTERVAL=3600)
+    def test_check_interval(self):
+        self.client.get('/api/issue-category/')
+        CacheGeneration.objects.filter(namespace='issue_categories').update(version=F('version') + 1)
+        # Not checked again within the interval
+        self.assertEqual(self.client.get('/api/issue-category/')['X-Cache'], 'HIT')
+        # The worker's own writes are seen right away
+        generations.written(['issue_categories'])
+        self.assertEqual(self.client.get('/api/issue-category/')['X-Cache'], 'MISS')
+
+
+@override_settings(COMPLAINT_EVENTS_POLL_INTERVAL=3600, COMPLAINT_EVENTS_HEARTBEAT=0.05, COMPLAINT_EVENTS_STREAM_SECONDS=0.2)
+class ComplaintEventTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pharmacy = Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+        self.laundry = Department.objects.create(department_code="LAU", department_name="Laundry", status="active")
+        self.staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff@example.com", password="password123", department=self.pharmacy,
+        )
+
+    def complaint(self, department, **kwargs):
+        return Complaint.objects.create(
+            issue_type="Leak", description="Tap leaking", priority="high", assigned_department=department, **kwargs
+        )
+
+    def stream(self, **headers):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.staff))
+        response = self.client.get('/api/complaints/events/', HTTP_ACCEPT='text/event-stream', **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+
+    def test_writes_record_events(self):
+        complaint = self.complaint(self.pharmacy)
+        complaint.description = "Still leaking"
+        complaint.save()
+        complaint.status = 'in_progress'
+        complaint.save()
+        events = list(ComplaintEvent.objects.filter(ticket_id=complaint.ticket_id).values_list('event_type', 'status'))
+        self.assertEqual(events, [('created', 'open'), ('updated', 'open'), ('status_changed', 'in_progress')])
+
+    def test_reassign_and_delete_record_events(self):
+        complaint = self.complaint(self.pharmacy)
+        complaint.assigned_department = self.laundry
+        complaint.save()
+        ticket_id = complaint.ticket_id
+        complaint.delete()
+        events = list(ComplaintEvent.objects.filter(ticket_id=ticket_id).values_list(
+            'event_type', 'department_code', 'previous_department_code'
+        ))
+        self.assertEqual(events, [('created', 'PHA', None), ('reassigned', 'LAU', 'PHA'), ('deleted', 'LAU', None)])
+        # The old department is told the ticket left it
+        self.assertEqual(scoped_events(False, 'PHA').filter(event_type='reassigned').count(), 1)
+
+    def test_stream_replays_department_events_after_last_event_id(self):
+        seen = self.complaint(self.pharmacy)
+        since = latest_event_id()
+        mine = self.complaint(self.pharmacy)
+        self.complaint(self.laundry)
+        mine.status = 'resolved'
+        mine.save()
+
+        events = self.stream(HTTP_LAST_EVENT_ID=str(since))
+        self.assertEqual([(e['ticket_id'], e['type']) for e in events], [(mine.ticket_id, 'created'), (mine.ticket_id, 'status_changed')])
+        self.assertNotIn(seen.ticket_id, [e['ticket_id'] for e in events])
+        # Without Last-Event-ID only new events are sent
+        self.assertEqual(self.stream(), [])
+
+    @override_settings(COMPLAINT_EVENTS_REPLAY_LIMIT=2)
+    def test_stream_ends_when_the_replay_is_cut_off(self):
+        since = latest_event_id()
+        tickets = [self.complaint(self.pharmacy).ticket_id for _ in range(3)]
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.staff))
+        response = self.client.get('/api/complaints/events/', HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=str(since))
+        body = b''.join(response.streaming_content).decode()
+        # Ends right after the replay, with the id of the last replayed event to resume from
+        self.assertTrue(body.endswith('retry: 0\n\n'))
+        self.assertNotIn('keep-alive', body)
+        last_id = [line for line in body.splitlines() if line.startswith('id: ')][-1][len('id: '):]
+        events = self.stream(HTTP_LAST_EVENT_ID=last_id)
+        self.assertEqual([e['ticket_id'] for e in events], tickets[2:])
+
+        async def astream_body():
+            return ''.join([chunk async for chunk in astream(False, 'PHA', since)])
+        self.assertEqual(async_to_sync(astream_body)(), body)
+
+    @override_settings(COMPLAINT_EVENTS_HEARTBEAT=0.01)
+    def test_streams_release_the_connection_while_waiting(self):
+        released = []
+
+        def record_release():
+            # True if the thread releasing holds the connection the replay opened
+            released.append(any(c.alias == 'default' for c in connections.all(initialized_only=True)))
+            release_connections()
+
+        def until_keep_alive(chunks):
+            for chunk in chunks:
+                if chunk == ": keep-alive\n\n":
+                    return list(released)
+
+        async def auntil_keep_alive(chunks):
+            try:
+                async for chunk in chunks:
+                    if chunk == ": keep-alive\n\n":
+                        return list(released)
+            finally:
+                await chunks.aclose()
+
+        self.complaint(self.pharmacy)
+        with mock.patch('complaints.events.release_connections', record_release):
+            chunks = stream(False, 'PHA', 0)
+            self.assertEqual(until_keep_alive(chunks), [True])
+            chunks.close()
+            self.assertEqual(async_to_sync(auntil_keep_alive)(astream(False, 'PHA', 0)), [True, True])
+
+    def test_stream_requires_authentication(self):
+        response = self.client.get('/api/complaints/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bus_fans_out_by_department(self):
+        bus = EventBus()
+        pharmacy = bus.subscribe(Subscription(False, 'PHA'))
+        everything = bus.subscribe(Subscription(True, None))
+        try:
+            complaint = self.complaint(self.laundry)
+            bus.poll()
+        finally:
+            bus.unsubscribe(pharmacy)
+            bus.unsubscribe(everything)
+        self.assertIsNone(pharmacy.get(timeout=0))
+        self.assertEqual(everything.get(timeout=0)['ticket_id'], complaint.ticket_id)
+
+
+@override_settings(COMPLAINT_CHANGES_SETTLE_SECONDS=0)
+class ComplaintChangesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pharmacy = Department.objects.create(department_code="PHA", department_name="Pharmacy", status="active")
+        self.laundry = Department.objects.create(department_code="LAU", department_name="Laundry", status="active")
+        self.staff = CustomUser.objects.create_staffuser(
+            email="staff@example.com", username="staff@example.com", password="password123", department=self.pharmacy,
+        )
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.staff))
+
+    def complaint(self, department):
+        return Complaint.objects.create(
+            issue_type="Leak", description="Tap leaking", priority="high", assigned_department=department
+        )
+
+    def changes(self, cursor=None):
+        response = self.client.get('/api/complaints/changes/', {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_cursor_flow(self):
+        before = self.complaint(self.pharmacy)
+        start = self.changes()
+        self.assertTrue(start['reset'])
+        self.assertEqual(start['changed'], [])
+
+        updated = self.complaint(self.pharmacy)
+        before.description = "Fixed washer"
+        before.save()
+        self.complaint(self.laundry)
+        moved = self.complaint(self.pharmacy)
+        moved.assigned_department = self.laundry
+        moved.save()
+
+        delta = self.changes(start['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertFalse(delta['has_more'])
+        self.assertEqual([c['ticket_id'] for c in delta['changed']], [updated.ticket_id, before.ticket_id])
+        self.assertEqual(delta['changed'][1]['description'], "Fixed washer")
+        # Out of the staff member's department now
+        self.assertEqual(delta['deleted'], [moved.ticket_id])
+
+        ticket_id = updated.ticket_id
+        updated.delete()
+        delta = self.changes(delta['cursor'])
+        self.assertEqual((delta['changed'], delta['deleted']), ([], [ticket_id]))
+        self.assertEqual(self.changes(delta['cursor'])['deleted'], [])
+
+    def test_deleting_assigned_staff_is_a_change(self):
+        colleague = CustomUser.objects.create_staffuser(
+            email="colleague@example.com", username="colleague@example.com", password="password123", department=self.pharmacy,
+        )
+        complaint = self.complaint(self.pharmacy)
+        complaint.assigned_staff = colleague
+        complaint.save()
+        updated_at = Complaint.objects.get(pk=complaint.pk).updated_at
+        cursor = self.changes()['cursor']
+
+        colleague.delete()
+        complaint.refresh_from_db()
+        self.assertIsNone(complaint.assigned_staff)
+        self.assertGreater(complaint.updated_at, updated_at)
+        delta = self.changes(cursor)
+        self.assertEqual([c['ticket_id'] for c in delta['changed']], [complaint.ticket_id])
+
+    @override_settings(COMPLAINT_CHANGES_LIMIT=2)
+    def test_pages_through_a_burst(self):
+        cursor = self.changes()['cursor']
+        created = [self.complaint(self.pharmacy).ticket_id for _ in range(3)]
+        first = self.changes(cursor)
+        self.assertTrue(first['has_more'])
+        second = self.changes(first['cursor'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual([c['ticket_id'] for c in first['changed'] + second['changed']], created)
+
+    @override_settings(COMPLAINT_CHANGES_SETTLE_SECONDS=3600)
+    def test_recent_events_are_sent_again(self):
+        cursor = self.changes()['cursor']
+        complaint = self.complaint(self.pharmacy)
+        delta = self.changes(cursor)
+        self.assertEqual([c['ticket_id'] for c in delta['changed']], [complaint.ticket_id])
+        # The cursor doesn't move past events a late commit could still precede
+        self.assertEqual(decode_cursor(delta['cursor'])[0], decode_cursor(cursor)[0])
+        self.assertEqual([c['ticket_id'] for c in self.changes(delta['cursor'])['changed']], [complaint.ticket_id])
+
+    def test_invalid_and_expired_cursors(self):
+        response = self.client.get('/api/complaints/changes/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+        issued_two_days_ago = json.dumps({'v': 1, 'id': 0, 't': int(time.time()) - 48 * 3600})
+        response = self.client.get('/api/complaints/changes/', {
+            'cursor': base64.urlsafe_b64encode(issued_two_days_ago.encode()).decode()
+        })
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.json()['reset'])
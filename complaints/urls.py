@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'rooms', views.RoomViewSet)
@@ -9,7 +9,12 @@ router.register(r'report',views.ReportViewSet)
 router.register(r'departments', views.DepartmentViewSet)
 router.register(r'issue-category', views.IssueCatViewset)
 router.register(r'TATView', views.TATViewSet)
+router.register(r'uploads', views.ChunkedUploadViewSet)
 
 urlpatterns = [
+    # Async variants of the dashboard reads, see complaints.async_views
+    path('async/complaints/', async_views.complaint_list, name='async_complaint_list'),
+    path('async/report/all_department_stats/', async_views.all_department_stats, name='async_all_department_stats'),
+    path('async/TATView/all_department_TATS/', async_views.all_department_TATS, name='async_all_department_TATS'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,24 +1,45 @@
+import logging
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import generics, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin,DestroyModelMixin
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Room, Complaint, Department, Issue_Category
-from .serializers import RoomSerializer, ComplaintSerializer, ComplaintCreateSerializer, ComplaintUpdateSerializer, DepartmentSerializer,IssueCatSerializer,ReportDepartment,TATserializer
+from .models import Room, Complaint, ComplaintImage, Department, Issue_Category, ChunkedUpload
+from .serializers import RoomSerializer, ComplaintSerializer, ComplaintCreateSerializer, ComplaintUpdateSerializer, DepartmentSerializer,IssueCatSerializer,ReportDepartment,TATserializer, ChunkedUploadSerializer, UploadChunkSerializer, BulkStatusSerializer, RoomBulkStatusSerializer, status_transition
 from .pagination import CustomLimitOffsetPagination
+from .media import serve_media
+from .events import (
+    EventStreamRenderer, astream, changes_since, cursor_expired, decode_cursor, department_scope, encode_cursor, events_epoch,
+    initial_cursor_id, latest_event_id, stream,
+)
+from .exports import COMPLAINT_COLUMNS, FILE_TYPES, TAT_COLUMNS, complaint_rows, export_response, tat_rows
+from .bulk_writes import bulk_write
+from .generations import LocalCache, cached_response
+from .report_cache import cached_report
+from .qr_codes import schedule_qr_render
+from .room_import import RoomImportError, create_rooms, read_rows, validate_rows
+from .reports import AVERAGE_TAT, department_stats, filter_tat, format_timedelta, resolved_tickets, tat_error, tat_filters_applied
 from django.db.models import Count, Q
-from django.db.models import Avg, F, ExpressionWrapper, DurationField
-from datetime import timedelta, time
-from dateutil.parser import parse
-from django.db.models import DurationField, ExpressionWrapper
+from datetime import timedelta
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from auth_app.permissions import IsMasterAdmin, IsMasterAdminOrDeptAdmin
+from complaintsystem.instrumentation import TimedSerializerMixin
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
-class RoomViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin,DestroyModelMixin):
+class RoomViewSet(TimedSerializerMixin, GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin,DestroyModelMixin):
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
     pagination_class = CustomLimitOffsetPagination
@@ -45,8 +66,49 @@ class RoomViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveMode
         room.save()
         return Response(RoomSerializer(room).data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        # Open or close a ward, block or floor: one UPDATE, the QR codes (their payload
+        # includes the status) are rendered again in the background
+        serializer = RoomBulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        filters = dict(serializer.validated_data)
+        new_status = filters.pop('status')
+
+        with transaction.atomic(), bulk_write() as write:
+            updated = Room.objects.filter(**filters).exclude(status=new_status).update(status=new_status)
+            if updated:
+                write.wrote('rooms')
+                schedule_qr_render(filters)
+        return Response({'updated': updated, 'status': new_status})
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        # Rooms from a CSV file ("file", a header row of the field names) or a JSON list
+        try:
+            rows = read_rows(request)
+        except RoomImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rooms, errors = validate_rows(rows)
+        if not rooms:
+            return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            created = create_rooms(rooms)
+        except IntegrityError:
+            return Response(
+                {'error': 'Some of these rooms were added while importing, nothing was imported. Retry the import.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'created': len(created), 'errors': errors}, status=status.HTTP_201_CREATED)
+
 
-class DepartmentViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
+# The department and issue category lists, read by every QR submission page
+catalog_cache = LocalCache('catalog', ['departments', 'issue_categories'])
+
+
+class DepartmentViewSet(TimedSerializerMixin, GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
     pagination_class = CustomLimitOffsetPagination
@@ -62,7 +124,11 @@ class DepartmentViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, Retrie
             self.permission_classes = [IsAuthenticated, IsMasterAdmin]
         return super().get_permissions()
 
-class IssueCatViewset(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
+    @cached_response(catalog_cache)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+class IssueCatViewset(TimedSerializerMixin, GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
     queryset = Issue_Category.objects.all()
     serializer_class = IssueCatSerializer
     pagination_class = CustomLimitOffsetPagination
@@ -78,9 +144,13 @@ class IssueCatViewset(GenericViewSet, ListModelMixin, CreateModelMixin, Retrieve
             self.permission_classes = [IsAuthenticated, IsMasterAdmin]
         return super().get_permissions()
 
+    @cached_response(catalog_cache)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 from .filters import ComplaintFilter
 
-class ComplaintViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
+class ComplaintViewSet(TimedSerializerMixin, GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
     queryset = Complaint.objects.all().order_by('-submitted_at')
     lookup_field = 'ticket_id'
     pagination_class = CustomLimitOffsetPagination
@@ -110,21 +180,170 @@ class ComplaintViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, Retriev
         return ComplaintSerializer
 
     def create(self, request, *args, **kwargs):
-        print("--- ComplaintViewSet: create method ---")
-        print("Incoming request data:", request.data)
+        logger.debug("ComplaintViewSet.create: incoming request data %s", request.data)
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            print("Serializer errors:", serializer.errors)
+            logger.debug("ComplaintViewSet.create: serializer errors %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def perform_create(self, serializer):
-        print("--- ComplaintViewSet: perform_create method ---")
-        print("Serializer validated data:", serializer.validated_data)
+        logger.debug("ComplaintViewSet.perform_create: validated data %s", serializer.validated_data)
         serializer.save(submitted_by=self.request.user.username if self.request.user.is_authenticated else "Anonymous")
 
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request):
+        # Server-sent events of new complaints and status changes in the user's scope,
+        # resuming after the Last-Event-ID header (or ?last_event_id=) if given
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        if last_event_id:
+            try:
+                since = int(last_event_id)
+            except ValueError:
+                return Response({'error': 'Invalid Last-Event-ID'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            since = latest_event_id()
+
+        all_departments, department_code = department_scope(request.user)
+        if isinstance(request._request, ASGIRequest):
+            content = astream(all_departments, department_code, since)
+        else:
+            content = stream(all_departments, department_code, since)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Don't let nginx buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        # Complaints created, updated, reassigned or deleted since ?cursor=, for clients
+        # that keep a local copy of the list. Without a cursor only a starting cursor is
+        # returned (reset): load the full list, then poll with it
+        cursor = request.query_params.get('cursor')
+        # Read first: a clear after it leaves the new cursor in the old epoch
+        epoch = events_epoch()
+        if not cursor:
+            return Response({
+                'changed': [], 'deleted': [], 'cursor': encode_cursor(initial_cursor_id(), epoch),
+                'has_more': False, 'reset': True,
+            })
+        try:
+            since, issued_at, cursor_epoch = decode_cursor(cursor)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if cursor_expired(issued_at, cursor_epoch, epoch):
+            return Response(
+                {'error': 'Cursor expired, reload the complaint list', 'reset': True},
+                status=status.HTTP_410_GONE
+            )
+
+        all_departments, department_code = department_scope(request.user)
+        ticket_ids, next_id, has_more = changes_since(all_departments, department_code, since)
+        changed = self.get_queryset().filter(ticket_id__in=ticket_ids).select_related(
+            'room', 'assigned_department', 'assigned_staff'
+        ).prefetch_related('images').order_by('updated_at')
+        serializer = self.get_serializer(changed, many=True)
+        found = {complaint['ticket_id'] for complaint in serializer.data}
+        return Response({
+            'changed': serializer.data,
+            # Deleted, or moved to a department the user doesn't see
+            'deleted': [ticket_id for ticket_id in ticket_ids if ticket_id not in found],
+            'cursor': encode_cursor(next_id, epoch),
+            'has_more': has_more,
+            'reset': False,
+        })
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        # Several tickets at once (?ticket_ids=A,B or repeated), in the order asked for,
+        # with one query for the complaints and one for their images
+        ticket_ids = [
+            ticket_id.strip()
+            for value in request.query_params.getlist('ticket_ids')
+            for ticket_id in value.split(',') if ticket_id.strip()
+        ]
+        ticket_ids = list(dict.fromkeys(ticket_ids))
+        if not ticket_ids:
+            return Response({'error': 'ticket_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ticket_ids) > settings.COMPLAINT_BATCH_MAX_TICKETS:
+            return Response(
+                {'error': f'At most {settings.COMPLAINT_BATCH_MAX_TICKETS} ticket_ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        complaints = self.get_queryset().filter(ticket_id__in=ticket_ids).select_related(
+            'room', 'assigned_department', 'assigned_staff'
+        ).prefetch_related('images')
+        found = {complaint.ticket_id: complaint for complaint in complaints}
+        serializer = self.get_serializer([found[ticket_id] for ticket_id in ticket_ids if ticket_id in found], many=True)
+        return Response({
+            'results': serializer.data,
+            # Unknown, or outside the user's department
+            'missing': [ticket_id for ticket_id in ticket_ids if ticket_id not in found],
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        # Move many tickets to one status, with the rules of ComplaintUpdateSerializer,
+        # in one transaction. Each ticket gets its own result, the others still apply
+        serializer = BulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ticket_ids = serializer.validated_data['ticket_ids']
+        new_status = serializer.validated_data['status']
+
+        now = timezone.now()
+        results = {}
+        changed = []
+        with transaction.atomic():
+            complaints = self.get_queryset().filter(ticket_id__in=ticket_ids).select_related(
+                'assigned_staff'
+            ).select_for_update(of=('self',))
+            for complaint in complaints:
+                if complaint.status == new_status:
+                    results[complaint.ticket_id] = {'result': 'unchanged', 'status': complaint.status}
+                    continue
+                try:
+                    fields = status_transition(complaint.status, new_status, complaint.assigned_staff, now)
+                except ValidationError as e:
+                    results[complaint.ticket_id] = {'result': 'rejected', 'status': complaint.status, 'error': e.detail[0]}
+                    continue
+                complaint.status = new_status
+                for field, value in fields.items():
+                    setattr(complaint, field, value)
+                # bulk_update doesn't apply auto_now
+                complaint.updated_at = now
+                changed.append(complaint)
+                results[complaint.ticket_id] = {'result': 'updated', 'status': new_status}
+
+            if changed:
+                with bulk_write() as write:
+                    Complaint.objects.bulk_update(changed, ['status', 'resolved_by', 'resolved_at', 'updated_at'])
+                    write.record_events(changed, 'status_changed')
+
+        return Response({
+            'status': new_status,
+            'updated': len(changed),
+            'results': [
+                # Outside the user's department counts as not found, as for a single PATCH
+                dict(ticket_id=ticket_id, **results.get(ticket_id, {'result': 'not_found'}))
+                for ticket_id in ticket_ids
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # The filtered list as one CSV or XLSX download (?file_type=), without pagination
+        file_type = request.query_params.get('file_type', 'csv')
+        if file_type not in FILE_TYPES:
+            return Response({'error': 'Invalid file_type, use csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        headers = [header for header, _ in COMPLAINT_COLUMNS]
+        return export_response(file_type, 'complaints', headers, complaint_rows(queryset))
+
     @action(detail=False, methods=['get'])
     def by_status(self, request):
         status_filter = request.query_params.get('status')
@@ -151,7 +370,85 @@ class ComplaintViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, Retriev
         serializer = self.get_serializer(complaints, many=True)
         return Response(serializer.data)
 
-class ReportViewSet(GenericViewSet, ListModelMixin):
+class ChunkedUploadViewSet(TimedSerializerMixin, GenericViewSet, CreateModelMixin, RetrieveModelMixin):
+    """Resumable image uploads for complaints.
+
+    POST /uploads/ with filename and total_size starts an upload, PUT /uploads/{id}/chunk/
+    appends a part at the given offset and GET /uploads/{id}/ returns the offset to resume
+    from. Completed upload_ids are then passed to the complaint create instead of files.
+    """
+    queryset = ChunkedUpload.objects.all()
+    serializer_class = ChunkedUploadSerializer
+    # Patients upload anonymously from the QR form; the random upload_id is what grants access
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        # Expired uploads can no longer be resumed
+        cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+        return self.queryset.filter(created_at__gte=cutoff)
+
+    def perform_create(self, serializer):
+        upload = serializer.save()
+        upload.file.save(f'{upload.upload_id}.part', ContentFile(b''), save=False)
+        upload.save(update_fields=['file'])
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        with transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            serializer = UploadChunkSerializer(data=request.data, context={'upload': upload})
+            if not serializer.is_valid():
+                # Always tell the client where to resume from
+                response_status = status.HTTP_409_CONFLICT if 'offset' in serializer.errors else status.HTTP_400_BAD_REQUEST
+                return Response(dict(serializer.errors, offset=upload.offset), status=response_status)
+
+            upload.append(serializer.validated_data['offset'], serializer.validated_data['chunk'])
+            update_fields = ['offset']
+
+            if upload.offset == upload.total_size:
+                from PIL import Image
+                try:
+                    with Image.open(upload.file.path) as img:
+                        img.verify()
+                except Exception:
+                    upload.file.delete(save=False)
+                    upload.delete()
+                    return Response({'error': 'The uploaded file is not a valid image'}, status=status.HTTP_400_BAD_REQUEST)
+                upload.status = 'complete'
+                upload.completed_at = timezone.now()
+                update_fields += ['status', 'completed_at']
+
+            upload.save(update_fields=update_fields)
+        return Response(ChunkedUploadSerializer(upload).data)
+
+
+class ProtectedMediaView(APIView):
+    """Serves MEDIA_ROOT files to the users allowed to see them.
+
+    QR codes are only visible to master admins, complaint images (and their
+    thumbnails) to master admins and to the department the complaint is assigned to.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, path):
+        if not self.has_access(request.user, path):
+            # Don't reveal whether the file exists
+            raise Http404("File not found")
+        return serve_media(request, path)
+
+    def has_access(self, user, path):
+        if path.startswith('qr_codes/'):
+            return user.role == 'master_admin' and Room.objects.filter(qr_code=path).exists()
+
+        images = ComplaintImage.objects.filter(Q(image=path) | Q(thumbnail_small=path) | Q(thumbnail_medium=path))
+        if user.role == 'dept_admin' or user.role == 'staff':
+            images = images.filter(complaint__assigned_department=user.department)
+        elif user.role != 'master_admin':
+            return False
+        return images.exists()
+
+
+class ReportViewSet(TimedSerializerMixin, GenericViewSet, ListModelMixin):
     queryset = Complaint.objects.all()
     serializer_class = ReportDepartment
     pagination_class = CustomLimitOffsetPagination
@@ -168,6 +465,7 @@ class ReportViewSet(GenericViewSet, ListModelMixin):
         return queryset
 
     @action(detail=False, methods=['get'])
+    @cached_report('department_priority_stats')
     def department_priority_stats(self, request):
         # Get department and priority from query params
         department = request.query_params.get('department')
@@ -203,57 +501,19 @@ class ReportViewSet(GenericViewSet, ListModelMixin):
         return Response(stats)
 
     @action(detail=False, methods=['get'])
+    @cached_report('all_department_stats')
     def all_department_stats(self, request):
-        # Get filter parameters
-        priority = request.query_params.get('priority')
-        department = request.query_params.get('department')
-        status_filter = request.query_params.get('status')  # Renamed to avoid conflict
-        submitted_at = request.query_params.get('submitted_at')
-
-        # Start with base queryset
-        queryset = self.get_queryset() # Use get_queryset to apply role-based filtering
-
-        # Apply filters if provided
-        if priority:
-            if priority not in dict(Complaint.PRIORITY_CHOICES):
-                return Response(
-                    {'error': 'Invalid priority value'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            queryset = queryset.filter(priority=priority)
-
-        if department:
-            queryset = queryset.filter(assigned_department=department)
-
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-
-        if submitted_at:
-            queryset = queryset.filter(submitted_at__date=submitted_at)
-
-        # Get all combinations of department and priority with their counts
-        stats = queryset.annotate(
-            department_name=F('assigned_department__department_name')
-        ).values(
-            'assigned_department', 
-            'department_name', 
-            'priority'
-        ).annotate(
-            resolved_tickets=Count('ticket_id', filter=Q(status__in=['resolved', 'closed'])),
-            pending_tickets=Count('ticket_id', filter=~Q(status__in=['resolved', 'closed'])),
-            total_tickets=Count('ticket_id')
-        ).order_by('assigned_department', 'priority')
+        # Use get_queryset to apply role-based filtering
+        try:
+            stats, filters_applied = department_stats(self.get_queryset(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         # If no results found before pagination, return empty response with message
         if not stats.exists():
             return Response({
                 'message': 'No data found for the specified filters',
-                'filters_applied': {
-                    'priority': priority,
-                    'department': department,
-                    'status': status_filter,
-                    'submitted_at': submitted_at
-                }
+                'filters_applied': filters_applied
             }, status=status.HTTP_200_OK)
 
         # Paginate the results
@@ -261,10 +521,10 @@ class ReportViewSet(GenericViewSet, ListModelMixin):
         if page is not None:
             return self.get_paginated_response(list(page))
 
-        return Response(stats)
+        return Response(list(stats))
 
     
-class TATViewSet(GenericViewSet, ListModelMixin):
+class TATViewSet(TimedSerializerMixin, GenericViewSet, ListModelMixin):
     queryset = Complaint.objects.all()
     serializer_class = TATserializer
     pagination_class = CustomLimitOffsetPagination
@@ -280,159 +540,35 @@ class TATViewSet(GenericViewSet, ListModelMixin):
                 return queryset.filter(assigned_department=user.department)
         return queryset
 
-    def format_timedelta(self, delta):
-        if not delta:
-            return "-"
-
-        total_seconds = int(delta.total_seconds())
-        total_hours = total_seconds // 3600
-        days = total_hours // 24
-        hours = total_hours % 24
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        parts = []
-        if days > 0:
-            parts.append(f"{days} day{'s' if days != 1 else ''}")
-        if hours > 0:
-            parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-        if minutes > 0:
-            parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-        if seconds > 0:
-            parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-
-        return ', '.join(parts) or "0 minutes"
-
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # The tickets of all_department_TATS as one CSV or XLSX download (?file_type=)
+        file_type = request.query_params.get('file_type', 'csv')
+        if file_type not in FILE_TYPES:
+            return Response({'error': 'Invalid file_type, use csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = filter_tat(self.get_queryset(), request.query_params)
+        except ValueError as e:
+            return Response(tat_error(str(e)), status=status.HTTP_400_BAD_REQUEST)
+        headers = [header for header, _ in TAT_COLUMNS]
+        formatter = TATserializer()
+        return export_response(file_type, 'tat', headers, tat_rows(queryset, formatter.format_timedelta))
 
     @action(detail=False, methods=['get'])
+    @cached_report('all_department_TATS')
     def all_department_TATS(self, request):
-        # Get filter parameters
-        priority = request.query_params.get('priority')
-        date = request.query_params.get('date')  # Format: YYYY-MM-DD
-        start_time = request.query_params.get('start_time')  # Format: HH:MM (24-hour)
-        end_time = request.query_params.get('end_time')  # Format: HH:MM (24-hour)
-
-        # Start with base queryset
-        queryset = self.get_queryset() # Use get_queryset to apply role-based filtering
-
-        # Apply priority filter if provided
-        if priority:
-            if priority not in dict(Complaint.PRIORITY_CHOICES):
-                return Response(
-                    {'error': 'Invalid priority value'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            queryset = queryset.filter(priority=priority)
-
-        # Handle date and time filtering
+        # Use get_queryset to apply role-based filtering
         try:
-            if date:
-                # Parse the date
-                parsed_date = parse(date)
-                if not parsed_date:
-                    raise ValueError("Invalid date format")
-
-                # If time range is provided
-                if start_time or end_time:
-                    # Validate time format
-                    if start_time:
-                        try:
-                            # Parse start time
-                            start_hour, start_minute = map(int, start_time.split(':'))
-                            if not (0 <= start_hour <= 23 and 0 <= start_minute <= 59):
-                                raise ValueError("Invalid time format")
-                            start_datetime = parsed_date.replace(hour=start_hour, minute=start_minute)
-                        except ValueError:
-                            raise ValueError("Invalid start time format. Use HH:MM (24-hour)")
-                    else:
-                        # If no start time, use start of day
-                        start_datetime = parsed_date.replace(hour=0, minute=0)
-
-                    if end_time:
-                        try:
-                            # Parse end time
-                            end_hour, end_minute = map(int, end_time.split(':'))
-                            if not (0 <= end_hour <= 23 and 0 <= end_minute <= 59):
-                                raise ValueError("Invalid time format")
-                            end_datetime = parsed_date.replace(hour=end_hour, minute=end_minute)
-                        except ValueError:
-                            raise ValueError("Invalid end time format. Use HH:MM (24-hour)")
-                    else:
-                        # If no end time, use end of day
-                        end_datetime = parsed_date.replace(hour=23, minute=59)
-
-                    # Apply datetime range filter
-                    queryset = queryset.filter(
-                        submitted_at__gte=start_datetime,
-                        submitted_at__lte=end_datetime
-                    )
-                else:
-                    # If no time range, filter for the entire day
-                    queryset = queryset.filter(submitted_at__date=parsed_date)
-            elif start_time or end_time:
-                # Only time filtering, across all dates
-                if start_time:
-                    start_hour, start_minute = map(int, start_time.split(':'))
-                    start_time_obj = time(start_hour, start_minute)
-                else:
-                    start_time_obj = time(0, 0)
-                if end_time:
-                    end_hour, end_minute = map(int, end_time.split(':'))
-                    end_time_obj = time(end_hour, end_minute)
-                else:
-                    end_time_obj = time(23, 59)
-                queryset = queryset.filter(
-                    submitted_at__time__gte=start_time_obj,
-                    submitted_at__time__lte=end_time_obj
-                )
+            queryset = filter_tat(self.get_queryset(), request.query_params)
         except ValueError as e:
-            return Response({
-                'error': str(e),
-                'message': 'Please use the following formats:',
-                'example': {
-                    'date_only': '/api/tat/all_department_TATS/?date=2025-06-16',
-                    'with_time_range': '/api/tat/all_department_TATS/?date=2025-06-16&start_time=09:00&end_time=17:00'
-                },
-                'format_guide': {
-                    'date': 'YYYY-MM-DD (e.g., 2025-06-16)',
-                    'time': 'HH:MM in 24-hour format (e.g., 09:00, 17:30)'
-                }
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        resolved_tickets = queryset.filter(
-            status__in=['resolved', 'closed'],
-            resolved_at__isnull=False
-        )
+            return Response(tat_error(str(e)), status=status.HTTP_400_BAD_REQUEST)
+        filters_applied = tat_filters_applied(request.query_params)
 
         # Calculate average explicitly
-        avg_tat = resolved_tickets.aggregate(
-            avg_tat=Avg(
-                ExpressionWrapper(
-                    F('resolved_at') - F('submitted_at'),
-                    output_field=DurationField()
-                )
-            )
-        )['avg_tat']
+        avg_tat = resolved_tickets(queryset).aggregate(avg_tat=AVERAGE_TAT)['avg_tat']
 
         # Get total tickets count
         total_tickets = queryset.count()
-        
-        # Calculate average TAT for resolved tickets
-        # avg_tat = resolved_tickets.aggregate(
-        #     avg_tat=Avg('tat')
-        # )['avg_tat']
-
-        # Add individual ticket TATs
-        # for ticket in queryset:
-        #     ticket_data = {
-        #         'ticket_id': ticket.ticket_id,
-        #         'submitted_at': ticket.submitted_at,
-        #         'resolved_at': ticket.resolved_at,
-        #         'priority': ticket.priority,
-        #         'status': ticket.status,
-        #         'tat': str(ticket.resolved_at - ticket.submitted_at) if ticket.status == 'resolved' and ticket.resolved_at else '-'
-        #     }
-        #     response_data['tickets'].append(ticket_data)
 
         # Paginate the queryset for the 'tickets' list
         page = self.paginate_queryset(queryset)
@@ -450,13 +586,8 @@ class TATViewSet(GenericViewSet, ListModelMixin):
 
             response_data = {
                 'total_tickets': total_tickets,
-                'average_tat': self.format_timedelta(avg_tat) if avg_tat else '-',
-                'filters_applied': {
-                    'priority': priority,
-                    'date': date,
-                    'start_time': start_time,
-                    'end_time': end_time
-                },
+                'average_tat': format_timedelta(avg_tat) if avg_tat else '-',
+                'filters_applied': filters_applied,
                 'count': count,
                 'next': next_link,
                 'previous': previous_link,
@@ -469,13 +600,8 @@ class TATViewSet(GenericViewSet, ListModelMixin):
             serializer = self.get_serializer(queryset, many=True)
             response_data = {
                 'total_tickets': total_tickets,
-                'average_tat': self.format_timedelta(avg_tat) if avg_tat else '-',
-                'filters_applied': {
-                    'priority': priority,
-                    'date': date,
-                    'start_time': start_time,
-                    'end_time': end_time
-                },
+                'average_tat': format_timedelta(avg_tat) if avg_tat else '-',
+                'filters_applied': filters_applied,
                 'results': serializer.data  # Unpaginated results
             }
             return Response(response_data)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import ListSerializer
+
+# Stats of the request being handled, None outside of PerformanceMiddleware
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+class RequestStats:
+    """Timings collected for a single request by PerformanceMiddleware."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        # serializer.data, with the queries it triggers, and the rendering of the response
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def view_name(view_func, method):
+    """'ComplaintViewSet.create', 'TATViewSet.all_department_TATS', 'UserDetailView'..."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+    return cls.__name__
+
+
+class QueryTimer:
+    """Execute wrapper adding every query's count and duration to the RequestStats of
+    the current request.
+
+    Installed on every database connection, because under ASGI the queries of a
+    request run in a worker thread (with its own connection) while the middleware
+    runs in the event loop; the context variable is carried over to that thread.
+    """
+
+    def __call__(self, execute, sql, params, many, context):
+        stats = current_request_stats.get()
+        if stats is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.db_queries += 1
+            stats.db_time += time.perf_counter() - started
+
+
+_query_timer = QueryTimer()
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if _query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_timer)
+
+
+@contextmanager
+def timed_serialization():
+    """Adds the time of the block to the serialize_time of the current RequestStats."""
+    stats = current_request_stats.get()
+    # Nested serializers are part of the outermost one's time
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serialize_time += time.perf_counter() - started
+
+
+class TimedData:
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(serializer_class):
+    """A subclass of the serializer class whose ``data`` (also with many=True) is timed."""
+    timed = _timed_classes.get(serializer_class)
+    if timed is None:
+        meta = getattr(serializer_class, 'Meta', None)
+        list_class = getattr(meta, 'list_serializer_class', ListSerializer)
+        timed_list_class = type(list_class)(list_class.__name__, (TimedData, list_class), {
+            '__module__': list_class.__module__,
+        })
+        timed = type(serializer_class)(serializer_class.__name__, (TimedData, serializer_class), {
+            '__module__': serializer_class.__module__,
+            'Meta': type('Meta', (meta,) if meta else (), {'list_serializer_class': timed_list_class}),
+        })
+        _timed_classes[serializer_class] = timed
+    return timed
+
+
+class TimedSerializerMixin:
+    """For the views: counts the ``data`` of the serializers built by get_serializer() in
+    the serialization time of the request. The views build it before the response is
+    rendered, which PerformanceMiddleware times itself."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+def install():
+    """Time the queries of every new database connection, called from ComplaintsConfig.ready()."""
+    connection_created.connect(install_query_timer, dispatch_uid='request_query_timer')
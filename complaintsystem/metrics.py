@@ -0,0 +1,233 @@
+"""In-process metrics that aggregate across gunicorn workers.
+
+Every process keeps its own counters and histograms in memory and writes them to
+``METRICS_DIR/metrics_<pid>_<start time>.json`` (atomically, through a rename) at
+most every METRICS_FLUSH_INTERVAL seconds after an update, and when it exits.
+The scrape endpoint sums the files of all processes, so the numbers cover every
+worker, including the ones that were restarted. Clear the directory when the
+server starts (see gunicorn.conf.py) to reset the counters.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def describe(self):
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, self.key(labels), lambda value: (value or 0) + amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        def add(current):
+            # Per-bucket (non cumulative) counts, then sum and count
+            current = current or [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    current[i] += 1
+                    break
+            else:
+                current[len(self.buckets)] += 1
+            current[-2] += value
+            current[-1] += 1
+            return current
+        self.registry.update(self, self.key(labels), add)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def describe(self):
+        return dict(super().describe(), buckets=list(self.buckets))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.start_process()
+
+    def start_process(self):
+        self.values = {}
+        self.pid = os.getpid()
+        # Pids are reused: a later process with the same one must not overwrite
+        # (and so take back) the counters of the dead one
+        self.filename = f'metrics_{self.pid}_{time.time_ns()}.json'
+        self.last_flush = 0.0
+        self.dirty = False
+        self.timer = None
+
+    def check_fork(self):
+        # Called with the lock held
+        if os.getpid() != self.pid:
+            # Forked worker: the values copied from the parent belong to the parent's file
+            self.start_process()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, key, func):
+        interval = settings.METRICS_FLUSH_INTERVAL
+        with self.lock:
+            self.check_fork()
+            series = self.values.setdefault(metric.name, {})
+            series[key] = func(series.get(key))
+            self.dirty = True
+            due = time.monotonic() - self.last_flush > interval
+            if not due and self.timer is None:
+                # Written by the timer if no later update is, even if the process goes idle
+                self.timer = threading.Timer(interval, self.flush_pending)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def flush_pending(self):
+        """Write the updates made since the last flush, if any (timer, exit)."""
+        with self.lock:
+            self.timer = None
+            pending = self.dirty and self.pid == os.getpid()
+        if pending:
+            self.flush()
+
+    def directory(self):
+        path = str(settings.METRICS_DIR)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def flush(self):
+        with self.lock:
+            self.check_fork()
+            self.last_flush = time.monotonic()
+            self.dirty = False
+            filename = self.filename
+            data = {
+                name: {'metric': self.metrics[name].describe(), 'samples': [[list(key), value] for key, value in series.items()]}
+                for name, series in self.values.items()
+            }
+        directory = self.directory()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(directory, filename))
+
+    def collect(self):
+        """Merge the files of every process into {name: (description, {labels: value})}."""
+        self.flush()
+        merged = {}
+        directory = self.directory()
+        for filename in os.listdir(directory):
+            if not (filename.startswith('metrics_') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, entry in data.items():
+                description, series = merged.setdefault(name, (entry['metric'], {}))
+                for key, value in entry['samples']:
+                    key = tuple(key)
+                    if key not in series:
+                        series[key] = value
+                    elif description['type'] == 'histogram':
+                        series[key] = [a + b for a, b in zip(series[key], value)]
+                    else:
+                        series[key] += value
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for name, (description, series) in sorted(self.collect().items()):
+            labelnames = description['labelnames']
+            lines.append(f"# HELP {name} {description['help']}")
+            lines.append(f"# TYPE {name} {description['type']}")
+            for key, value in sorted(series.items()):
+                labels = list(zip(labelnames, key))
+                if description['type'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(description['buckets'] + ['+Inf'], value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels + [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+registry = Registry()
+# Updates since the last flush of an exiting process (gunicorn.conf.py also flushes on worker_exit)
+atexit.register(registry.flush_pending)
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by view and action.', ['view', 'action'],
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Database queries per request by view and action.', ['view', 'action'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250, 500),
+)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result'],
+)
+QR_RENDER_SECONDS = registry.histogram(
+    'qr_render_duration_seconds', 'Time spent rendering room QR codes.',
+)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
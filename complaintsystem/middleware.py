@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import RequestStats, current_request_stats, view_name
+from .metrics import REQUEST_DB_QUERIES, REQUEST_LATENCY
+
+logger = logging.getLogger('complaintsystem.performance')
+
+
+class PerformanceMiddleware:
+    """Measures wall time, DB queries/time and serialization time (the serializer.data
+    of the views, see complaintsystem.instrumentation.TimedSerializerMixin, and
+    rendering the response) of every request.
+
+    The numbers are logged as one JSON line per request on the
+    'complaintsystem.performance' logger at INFO level, and sent back in a
+    Server-Timing header if PERFORMANCE_SERVER_TIMING is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self.record(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self.record(request, response, stats)
+        return response
+
+    def record(self, request, response, stats):
+        elapsed = stats.elapsed
+        if settings.METRICS_ENABLED:
+            view, _, action = (stats.view or 'unmatched').partition('.')
+            REQUEST_LATENCY.observe(elapsed, view=view, action=action)
+            REQUEST_DB_QUERIES.observe(stats.db_queries, view=view, action=action)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={elapsed * 1000:.1f}',
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries"',
+                f'serialize;dur={stats.serialize_time * 1000:.1f}',
+            ])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'view': stats.view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 2),
+                'db_queries': stats.db_queries,
+                'db_ms': round(stats.db_time * 1000, 2),
+                'serialize_ms': round(stats.serialize_time * 1000, 2),
+            }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (serialized to JSON) right after this hook
+        stats = current_request_stats.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.serialize_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,139 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+
+from auth_app.authentication import CookieJWTAuthentication
+from .instrumentation import view_name
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = '_profile'
+
+
+class SQLRecorder:
+    """Execute wrapper keeping every query of a profiled request."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+class ProfilingMiddleware:
+    """Profiles a single request on demand, for master admins only.
+
+    Send the 'X-Profile: 1' header or add '?_profile=1' to the URL. The cProfile
+    stats (.prof, readable with pstats or snakeviz), a text summary and the SQL log
+    are written to PROFILE_DIR under the id returned in the X-Profile-Id header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not (settings.PROFILING_ENABLED and self.wants_profile(request) and self.is_master_admin(request)):
+            return self.get_response(request)
+
+        recorder = SQLRecorder()
+        profiler = cProfile.Profile()
+        request._profiled_view = None
+        with connections['default'].execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+
+        profile_id = self.save(request, profiler, recorder.queries)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    async def __acall__(self, request):
+        # Under ASGI only the event loop thread is profiled, and the queries of async
+        # views run on other threads' connections: profile with the WSGI server for the SQL
+        if not (settings.PROFILING_ENABLED and self.wants_profile(request)
+                and await sync_to_async(self.is_master_admin)(request)):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        request._profiled_view = None
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+
+        profile_id = await sync_to_async(self.save)(request, profiler, [])
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_profiled_view'):
+            request._profiled_view = view_name(view_func, request.method)
+
+    def wants_profile(self, request):
+        return request.headers.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_QUERY_PARAM) == '1'
+
+    def is_master_admin(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # API clients authenticate with the JWT cookie, which only DRF looks at
+            try:
+                user_auth = CookieJWTAuthentication().authenticate(request)
+            except (NotAuthenticated, AuthenticationFailed):
+                return False
+            user = user_auth[0] if user_auth else None
+        return user is not None and getattr(user, 'role', None) == 'master_admin'
+
+    def save(self, request, profiler, queries):
+        view = request._profiled_view or 'unmatched'
+        profile_id = f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{uuid.uuid4().hex[:8]}"
+        directory = str(settings.PROFILE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+
+        profiler.dump_stats(base + '.prof')
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(50)
+        with open(base + '.txt', 'w') as f:
+            f.write(f"{request.method} {request.get_full_path()} ({view})\n\n")
+            f.write(summary.getvalue())
+
+        with open(base + '.sql.json', 'w') as f:
+            json.dump({
+                'view': view,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'query_count': len(queries),
+                'total_ms': round(sum(query['duration_ms'] for query in queries), 3),
+                'queries': queries,
+            }, f, indent=2)
+        return profile_id
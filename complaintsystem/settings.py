@@ -14,6 +14,7 @@ load_dotenv()
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,12 +53,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'complaintsystem.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'complaints.generations.CacheGenerationMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'complaintsystem.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -135,10 +139,7 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
-# Create static and media directories if they don't exist
-os.makedirs(BASE_DIR / 'static', exist_ok=True)
-os.makedirs(BASE_DIR / 'media', exist_ok=True)
-os.makedirs(BASE_DIR / 'media/complaint_images', exist_ok=True)
+# The static and media directories are created by a system check (complaints.checks)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -208,4 +209,120 @@ CORS_ALLOW_CREDENTIALS = True
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Complaint image thumbnails (max width, max height) per variant
+COMPLAINT_IMAGE_VARIANT_SIZES = {
+    'small': (160, 160),
+    'medium': (640, 640),
+}
+COMPLAINT_IMAGE_VARIANT_QUALITY = int(os.environ.get('COMPLAINT_IMAGE_VARIANT_QUALITY', 80))
+
+# Content-addressed complaint image storage: complaint_images/<ab>/<cd>/<sha256>.<ext>
+CONTENT_ADDRESSED_SHARD_DEPTH = 2
+CONTENT_ADDRESSED_SHARD_WIDTH = 2
+
+# Chunked image uploads (see ChunkedUploadViewSet)
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(os.environ.get('CHUNKED_UPLOAD_EXPIRY_HOURS', 24))
+
+# Server-sent complaint events (see complaints.events): each worker polls the event table
+# every COMPLAINT_EVENTS_POLL_INTERVAL seconds while streams are open
+COMPLAINT_EVENTS_POLL_INTERVAL = float(os.environ.get('COMPLAINT_EVENTS_POLL_INTERVAL', 1.0))
+COMPLAINT_EVENTS_HEARTBEAT = float(os.environ.get('COMPLAINT_EVENTS_HEARTBEAT', 15))
+# Streams end after this long and the browser reconnects, so a WSGI thread is never held forever
+COMPLAINT_EVENTS_STREAM_SECONDS = float(os.environ.get('COMPLAINT_EVENTS_STREAM_SECONDS', 300))
+COMPLAINT_EVENTS_RETRY_MS = int(os.environ.get('COMPLAINT_EVENTS_RETRY_MS', 3000))
+COMPLAINT_EVENTS_REPLAY_LIMIT = int(os.environ.get('COMPLAINT_EVENTS_REPLAY_LIMIT', 500))
+COMPLAINT_EVENTS_RETENTION_HOURS = int(os.environ.get('COMPLAINT_EVENTS_RETENTION_HOURS', 24))
+
+# GET /api/complaints/changes/: tickets changed since a cursor, at most
+# COMPLAINT_CHANGES_LIMIT events per call. Events younger than the settle window
+# are sent again on the next call, in case an older transaction commits late
+COMPLAINT_CHANGES_LIMIT = int(os.environ.get('COMPLAINT_CHANGES_LIMIT', 500))
+COMPLAINT_CHANGES_SETTLE_SECONDS = float(os.environ.get('COMPLAINT_CHANGES_SETTLE_SECONDS', 10))
+
+# Workers read the cache generations (see complaints.generations) before a request at most
+# once per interval: 0 checks on every request, a longer interval saves that query but lets
+# the caches of a worker lag behind the writes of the others by up to that many seconds
+CACHE_GENERATION_CHECK_INTERVAL = float(os.environ.get('CACHE_GENERATION_CHECK_INTERVAL', 0))
+
+# Cached report and TAT responses (see complaints.report_cache). locmem keeps a cache per
+# worker process; for one cache shared by the workers on a host set REPORT_CACHE_BACKEND
+# to django.core.cache.backends.filebased.FileBasedCache and REPORT_CACHE_LOCATION to a directory
+REPORT_CACHE_TIMEOUT = int(os.environ.get('REPORT_CACHE_TIMEOUT', 300))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': os.environ.get('REPORT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('REPORT_CACHE_LOCATION', 'reports'),
+        'TIMEOUT': REPORT_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 1000))},
+    },
+}
+
+# Tickets per GET /api/complaints/batch/
+COMPLAINT_BATCH_MAX_TICKETS = int(os.environ.get('COMPLAINT_BATCH_MAX_TICKETS', 300))
+# Tickets per POST /api/complaints/bulk_status/
+COMPLAINT_BULK_MAX_TICKETS = int(os.environ.get('COMPLAINT_BULK_MAX_TICKETS', 500))
+# Rows per POST /api/rooms/import/
+ROOM_IMPORT_MAX_ROWS = int(os.environ.get('ROOM_IMPORT_MAX_ROWS', 5000))
+
+# Rows fetched per query and sent per chunk by the streaming CSV/XLSX exports
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# How ProtectedMediaView hands files over: 'python' streams them itself (with Range
+# support), 'x-accel-redirect' delegates to nginx and 'x-sendfile' to Apache/lighttpd.
+MEDIA_SERVE_BACKEND = os.environ.get('MEDIA_SERVE_BACKEND', 'python')
+# nginx 'internal' location aliased to MEDIA_ROOT, used with x-accel-redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 3600))
+
+# Per-request timings (see complaintsystem.middleware.PerformanceMiddleware). The
+# Server-Timing header shows every caller, anonymous ones included, the query counts
+# and timings: only turn it on where the clients are trusted (e.g. staging)
+PERFORMANCE_INSTRUMENTATION = os.environ.get('PERFORMANCE_INSTRUMENTATION', 'True') == 'True'
+PERFORMANCE_SERVER_TIMING = os.environ.get('PERFORMANCE_SERVER_TIMING', 'False') == 'True'
+
+# Logging
+# Set PERFORMANCE_LOG_LEVEL=INFO to get one JSON line per request, LOG_LEVEL=DEBUG for the
+# request/serializer debug output. Disabled levels cost a single isEnabledFor() check.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'complaints': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+        'auth_app': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+        'complaintsystem': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+        'complaintsystem.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Metrics (see complaintsystem.metrics), shared by all worker processes through METRICS_DIR
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'complaintsystem_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+# On-demand profiling of single requests by master admins (see complaintsystem.profiling)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles')
+
+# Slow query log (see complaintsystem.slow_queries), an empty threshold disables it
+SLOW_QUERY_THRESHOLD_MS = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '500')
+SLOW_QUERY_THRESHOLD_MS = float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', BASE_DIR / 'slow_queries.jsonl')
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'True') == 'True'
+# EXPLAIN ANALYZE runs the query a second time, PostgreSQL/MySQL only
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', 'False') == 'True'
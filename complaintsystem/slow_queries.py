@@ -0,0 +1,163 @@
+"""Slow query log.
+
+Every query slower than SLOW_QUERY_THRESHOLD_MS is appended as a JSON line to
+SLOW_QUERY_LOG_FILE with its parameters, the view/action that ran it, the
+application stack that issued it and a fingerprint of its shape (literals
+stripped). The first time a shape is seen in a process, a background thread
+runs EXPLAIN (optionally ANALYZE) for it and logs the plan as well.
+``manage.py slow_query_report`` aggregates the log by shape.
+"""
+import hashlib
+import json
+import logging
+import queue
+import re
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from .instrumentation import current_request_stats
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_explained_shapes = set()
+_explain_queue = queue.Queue(maxsize=100)
+_explain_thread = None
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise a query to its shape: literals and IN lists collapse to placeholders."""
+    shape = STRING_RE.sub('?', sql)
+    shape = NUMBER_RE.sub('?', shape)
+    shape = IN_LIST_RE.sub('IN (...)', shape)
+    return WHITESPACE_RE.sub(' ', shape).strip()
+
+
+def shape_id(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def application_stack():
+    # Only our own frames: where in the views/serializers the query came from
+    base_dir = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack():
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename and not frame.filename.endswith('slow_queries.py'):
+            frames.append(f"{frame.filename[len(base_dir) + 1:]}:{frame.lineno} {frame.name}")
+    return frames
+
+
+def write_entry(entry):
+    with _write_lock:
+        with open(settings.SLOW_QUERY_LOG_FILE, 'a') as f:
+            f.write(json.dumps(entry, default=str) + '\n')
+
+
+class SlowQueryLogger:
+    """Execute wrapper installed on every connection."""
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is None or getattr(_local, 'suppressed', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= threshold:
+                try:
+                    self.record(sql, params, many, duration_ms, context['connection'].alias)
+                except Exception:
+                    # Never let the logging break the query
+                    logger.exception("Could not record slow query")
+
+    def record(self, sql, params, many, duration_ms, alias):
+        shape = fingerprint(sql)
+        stack = application_stack()
+        stats = current_request_stats.get()
+        entry = {
+            'type': 'query',
+            'time': timezone.now().isoformat(),
+            'alias': alias,
+            'shape_id': shape_id(shape),
+            'shape': shape,
+            'sql': sql,
+            'params': repr(params),
+            'many': many,
+            'duration_ms': round(duration_ms, 3),
+            'view': stats.view if stats else None,
+            'stack': stack,
+            'stack_id': hashlib.sha1('\n'.join(stack).encode()).hexdigest()[:12],
+        }
+        write_entry(entry)
+
+        if settings.SLOW_QUERY_EXPLAIN and not many and sql.lstrip()[:6].upper() == 'SELECT':
+            if entry['shape_id'] not in _explained_shapes:
+                _explained_shapes.add(entry['shape_id'])
+                schedule_explain(alias, sql, params, entry['shape_id'])
+
+
+def explain(alias, sql, params):
+    """Return the EXPLAIN output of a query as a list of rows."""
+    connection = connections[alias]
+    options = {}
+    if settings.SLOW_QUERY_EXPLAIN_ANALYZE and connection.vendor in ('postgresql', 'mysql'):
+        options['analyze'] = True
+    prefix = connection.ops.explain_query_prefix(**options)
+    _local.suppressed = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [list(row) for row in cursor.fetchall()]
+    finally:
+        _local.suppressed = False
+
+
+def schedule_explain(alias, sql, params, query_shape_id):
+    global _explain_thread
+    if _explain_thread is None or not _explain_thread.is_alive():
+        _explain_thread = threading.Thread(target=_explain_worker, name='slow-query-explain', daemon=True)
+        _explain_thread.start()
+    try:
+        _explain_queue.put_nowait((alias, sql, params, query_shape_id))
+    except queue.Full:
+        # Let the shape be retried the next time it is slow
+        _explained_shapes.discard(query_shape_id)
+
+
+def _explain_worker():
+    while True:
+        alias, sql, params, query_shape_id = _explain_queue.get()
+        try:
+            plan = explain(alias, sql, params)
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+        finally:
+            connections.close_all()
+        write_entry({'type': 'explain', 'time': timezone.now().isoformat(), 'shape_id': query_shape_id, 'plan': plan})
+
+
+_slow_query_logger = SlowQueryLogger()
+
+
+def install_wrapper(sender, connection, **kwargs):
+    if _slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _slow_query_logger)
+
+
+def install():
+    """Wrap every new database connection, called from ComplaintsConfig.ready()."""
+    connection_created.connect(install_wrapper, dispatch_uid='slow_query_logger')
@@ -14,9 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from auth_app.views import CookieTokenObtainPairView, CookieTokenRefreshView, DepartmentStaffListView
+from complaints.views import ProtectedMediaView
+from complaintsystem.views import MetricsView
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -27,8 +30,10 @@ urlpatterns = [
     path('api/auth/', include('auth_app.urls')),
     path('api/', include('complaints.urls')),
     path('api/departments/<str:department_name>/staff/', DepartmentStaffListView.as_view(), name='department_staff_list'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    # Media is served with access checks in every environment, see ProtectedMediaView
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), ProtectedMediaView.as_view(), name='protected_media'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
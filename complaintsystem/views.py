@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from auth_app.permissions import IsMasterAdmin
+from .metrics import registry
+
+
+class MetricsView(APIView):
+    """Prometheus scrape endpoint, aggregated over every worker process."""
+    permission_classes = [IsAuthenticated, IsMasterAdmin]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
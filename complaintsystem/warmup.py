@@ -0,0 +1,90 @@
+"""Server warm-up, called from gunicorn.conf.py.
+
+``preload()`` runs once in the gunicorn master after the application is loaded
+(``preload_app``): it imports the lazily loaded libraries, resolves the URLconf
+and builds the serializers, then freezes the garbage collector so those objects
+stay in pages shared copy-on-write with every worker (without preload_app, each
+worker runs it for itself). ``worker()`` runs in each worker once it has loaded
+the application, before it accepts traffic: it opens the database connection and
+sends the catalog requests through the views once, filling the per-process
+caches.
+"""
+import gc
+import io
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Requests a worker serves once before accepting traffic: the public catalogs the
+# complaint form loads for every QR scan
+WARMUP_PATHS = [
+    '/api/departments/?status=active',
+    '/api/issue-category/?status=active',
+]
+
+
+def preload():
+    started = time.perf_counter()
+
+    # Imaging libraries, only imported when the first QR or thumbnail is rendered
+    import qrcode
+    from PIL import Image
+    Image.init()
+    qr = qrcode.QRCode(version=1, box_size=1, border=1)
+    qr.add_data('warmup')
+    qr.make(fit=True)
+    qr.make_image(fill_color="black", back_color="white").save(io.BytesIO(), format='PNG')
+
+    # URL patterns, views and their filter/serializer classes
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+    # Serializer fields are built from the model fields on first use
+    from rest_framework.serializers import Serializer
+    from auth_app import serializers as auth_serializers
+    from complaints import serializers as complaint_serializers
+    for module in (complaint_serializers, auth_serializers):
+        for serializer_class in vars(module).values():
+            if isinstance(serializer_class, type) and issubclass(serializer_class, Serializer):
+                if serializer_class.__module__ == module.__name__:
+                    try:
+                        serializer_class().fields
+                    except Exception:
+                        logger.debug("warmup: could not build %s", serializer_class.__name__, exc_info=True)
+
+    # Never share a database connection with the forked workers
+    connections.close_all()
+
+    # Everything allocated so far lives as long as the process: keep the collector
+    # from touching (and so copying) those pages in the workers
+    gc.collect()
+    gc.freeze()
+    logger.info("warmup: preloaded in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def worker():
+    started = time.perf_counter()
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except Exception:
+            logger.warning("warmup: could not connect to database %s", connection.alias, exc_info=True)
+
+    from django.urls import resolve
+    from rest_framework.test import APIRequestFactory
+
+    host = next((host for host in settings.ALLOWED_HOSTS if host and host != '*' and not host.startswith('.')), 'localhost')
+    factory = APIRequestFactory()
+    for path in WARMUP_PATHS:
+        try:
+            request = factory.get(path, HTTP_HOST=host)
+            response = resolve(request.path_info).func(request)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            logger.warning("warmup: request %s failed", path, exc_info=True)
+    logger.info("warmup: worker ready in %.0f ms", (time.perf_counter() - started) * 1000)
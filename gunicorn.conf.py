@@ -0,0 +1,65 @@
+"""Production gunicorn settings: gunicorn picks this file up from the working directory.
+
+    gunicorn complaintsystem.wsgi
+
+Every setting can be overridden from the environment (GUNICORN_*) or the command line.
+"""
+import multiprocessing
+import os
+import shutil
+
+# For the async views under ASGI: GUNICORN_APP=complaintsystem.asgi:application
+# and GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker
+wsgi_app = os.environ.get('GUNICORN_APP', 'complaintsystem.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so fragmentation can't grow the memory forever
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+# Heartbeat files in memory instead of on a possibly slow disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Load Django once in the master and fork the workers from it: they share the
+# imported code copy-on-write and start serving immediately
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+warmup = os.environ.get('GUNICORN_WARMUP', 'True') == 'True'
+
+# An empty GUNICORN_ACCESS_LOG turns the access log off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Per-process metric files of the previous run (see complaintsystem.metrics)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'complaintsystem.settings')
+    from django.conf import settings
+    shutil.rmtree(str(settings.METRICS_DIR), ignore_errors=True)
+
+
+def when_ready(server):
+    # Runs in the master before the first worker is forked
+    if preload_app and warmup:
+        from complaintsystem import warmup as server_warmup
+        server_warmup.preload()
+
+
+def post_worker_init(worker):
+    # Runs in the new worker once it has loaded the application (so Django is set
+    # up, with or without preload_app) and before it accepts connections
+    if warmup:
+        from complaintsystem import warmup as server_warmup
+        if not preload_app:
+            server_warmup.preload()
+        server_warmup.worker()
+
+
+def worker_exit(server, worker):
+    # The metric updates since the worker's last flush (see complaintsystem.metrics)
+    from complaintsystem.metrics import registry
+    registry.flush_pending()